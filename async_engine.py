@@ -0,0 +1,446 @@
+"""Asyncio fetch engine (``--engine async``).
+
+Runs all network I/O for a site on a single event loop using ``httpx.AsyncClient``
+so that thousands of requests can be in flight without one OS thread each.
+Page processing (parsing, extraction, SQLite writes, MinHash) is blocking and
+CPU-bound, so it is handed to a thread pool executor and never runs on the loop.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from connection_pool import get_ssl_context
+from fetchers import http_error_message, httpx_accept_encoding, is_ssl_error
+from utils import (
+    RETRIABLE_STATUS_CODES,
+    build_request_headers,
+    decode_response_text,
+    is_text_content_type,
+    parse_retry_after,
+    record_validators,
+    render_if_javascript_required,
+)
+
+
+async def _read_response_body_async(response, content_type, content_policy=None):
+    """Read a streamed httpx response, enforcing the content policy (see ``read_response_body``)."""
+    if content_policy is not None:
+        rejection = content_policy.check_headers(response.headers)
+        if rejection:
+            return None, rejection
+
+    buffer = bytearray()
+    async for chunk in response.aiter_bytes():
+        buffer += chunk
+        if content_policy is not None:
+            rejection = content_policy.check_size(content_type, len(buffer))
+            if rejection:
+                return None, rejection
+    return bytes(buffer), None
+
+
+async def _probe_with_head_async(client, url, headers, timeout, content_policy, logger):
+    """Async HEAD probe; returns a rejection reason or None (probe failures are ignored)."""
+    import httpx
+
+    try:
+        response = await client.head(url, headers=headers, timeout=timeout)
+    except httpx.HTTPError as e:
+        logger.info(f"HEAD probe failed for {url}, falling back to GET: {e}")
+        return None
+    if not response.is_success:
+        return None
+    return content_policy.check_headers(response.headers)
+
+
+async def fetch_page_async(
+    url,
+    client,
+    max_retries=3,
+    initial_timeout=60,
+    proxies=None,
+    logger=None,
+    js_driver="auto",
+    auto_detect_js=True,
+    executor=None,
+    defer_retries=False,
+    response_meta=None,
+    etag=None,
+    last_modified=None,
+    content_policy=None,
+):
+    """
+    Asynchronous counterpart of ``utils.fetch_page`` built on an ``httpx.AsyncClient``.
+
+    Retries 429s, 503s, 504s, timeouts, SSL errors and connection errors with exponential
+    backoff, produces the same error descriptions, and applies the same
+    Content-Type handling (text is decoded, binary is returned as raw bytes).
+
+    Args:
+        url (str): The URL to fetch.
+        client: An ``httpx.AsyncClient`` instance shared by all workers of a site.
+        max_retries (int): Maximum number of retries (default: 3).
+        initial_timeout (int): Initial timeout in seconds (default: 60).
+        proxies (dict): Proxy mapping, only used for the JS rendering upgrade.
+        logger: Optional logger instance. Falls back to module-level logger.
+        js_driver (str): Browser engine to use for the JS rendering upgrade.
+        auto_detect_js (bool): Dynamically upgrade to JS rendering if page appears JS-dependent.
+        executor: Executor used to run the (blocking) JS detection and rendering.
+        defer_retries (bool): Return retriable failures immediately so the caller can
+                              reschedule the URL (see ``fetch_page``).
+        response_meta (dict): Optional dict filled with response details (see ``fetch_page``).
+        etag (str): ETag of the stored copy; sent as If-None-Match.
+        last_modified (str): Last-Modified of the stored copy; sent as If-Modified-Since.
+        content_policy: Optional ContentPolicy applied while streaming (see ``fetch_page``).
+
+    Returns:
+        tuple: (content, content_type, error_description), as for ``fetch_page``.
+    """
+    import httpx
+
+    if logger is None:
+        logger = logging.getLogger(__name__)
+
+    retry_count = 0
+    timeout = initial_timeout
+    loop = asyncio.get_running_loop()
+    headers = build_request_headers(
+        etag=etag, last_modified=last_modified, accept_encoding=httpx_accept_encoding()
+    )
+
+    if content_policy is not None and content_policy.should_probe(url):
+        rejection = await _probe_with_head_async(
+            client, url, headers, initial_timeout, content_policy, logger
+        )
+        if rejection:
+            logger.info(f"Skipping download of {url}: {rejection}")
+            if response_meta is not None:
+                response_meta["rejected"] = True
+            return None, None, rejection
+
+    while retry_count < max_retries:
+        retry_after = None
+        try:
+            async with client.stream(
+                "GET", url, headers=headers, timeout=timeout
+            ) as response:
+                if response_meta is not None:
+                    response_meta["status_code"] = response.status_code
+                if response.status_code == 304:
+                    logger.info(f"Not modified since last crawl: {url}")
+                    if response_meta is not None:
+                        response_meta["not_modified"] = True
+                    return None, None, None
+
+                response.raise_for_status()
+                record_validators(response.headers, response_meta)
+
+                content_type = response.headers.get("Content-Type", "").lower()
+                body, rejection = await _read_response_body_async(
+                    response, content_type, content_policy
+                )
+                if rejection:
+                    logger.info(f"Skipping download of {url}: {rejection}")
+                    if response_meta is not None:
+                        response_meta["rejected"] = True
+                    return None, content_type, rejection
+
+                # Body bytes as received (possibly compressed) vs. after decoding
+                if response_meta is not None:
+                    response_meta["wire_bytes"] = response.num_bytes_downloaded
+                    response_meta["decoded_bytes"] = len(body)
+
+                if is_text_content_type(content_type):
+                    html_text = decode_response_text(body, response.charset_encoding)
+                    body = None
+                    if auto_detect_js and "text/html" in content_type:
+                        rendered_content = await loop.run_in_executor(
+                            executor,
+                            lambda: render_if_javascript_required(
+                                url,
+                                html_text,
+                                js_driver=js_driver,
+                                timeout_secs=initial_timeout,
+                                proxies=proxies,
+                                logger=logger,
+                            ),
+                        )
+                        if rendered_content is not None:
+                            return rendered_content, "text/html", None
+                    return html_text, content_type, None
+                else:
+                    # Return binary content as raw bytes (stored as a BLOB)
+                    return body, content_type, None
+
+        except httpx.HTTPStatusError as e:
+            status_code = e.response.status_code
+            # Same wording as requests, so both engines store the same errors.
+            message = http_error_message(
+                status_code, e.response.reason_phrase, e.response.url
+            )
+            if status_code not in RETRIABLE_STATUS_CODES:
+                error_description = f"HTTP Error {status_code}: {message}"
+                logger.error(f"Failed to fetch {url}: {error_description}")
+                return None, None, error_description
+            retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
+            if response_meta is not None and retry_after is not None:
+                response_meta["retry_after"] = retry_after
+            label = RETRIABLE_STATUS_CODES[status_code]
+            retry_label, error_label, error = label, label, message
+
+        except httpx.TimeoutException as e:
+            retry_label, error_label, error = "Timeout occurred", "Timeout", e
+
+        except httpx.TransportError as e:
+            # Transient SSL failures and dropped/refused connections are retriable,
+            # exactly as in the synchronous fetcher.
+            if is_ssl_error(e):
+                retry_label, error_label, error = "SSL error", "SSL error", e
+            else:
+                retry_label, error_label, error = (
+                    "Connection error",
+                    "Connection error",
+                    e,
+                )
+
+        except (httpx.RequestError, httpx.InvalidURL) as e:
+            # Non-retriable errors (e.g. invalid URL, unsupported scheme).
+            error_description = str(e)
+            logger.error(f"Failed to fetch {url}: {error_description}")
+            return None, None, error_description
+
+        if defer_retries:
+            error_description = f"{error_label}: {error}"
+            if response_meta is not None:
+                response_meta["retriable"] = True
+            logger.warning(
+                f"{retry_label} for {url}. Deferring retry to the scheduler."
+            )
+            return None, None, error_description
+
+        retry_count += 1
+        if retry_count < max_retries:
+            logger.warning(
+                f"{retry_label} for {url}. Retrying in {timeout} seconds... (Attempt {retry_count}/{max_retries})"
+            )
+            # Yields the loop to other fetches; waits at least any Retry-After
+            await asyncio.sleep(max(timeout, retry_after or 0))
+            timeout *= 2  # Exponential backoff
+        else:
+            error_description = f"{error_label} after {max_retries} retries: {error}"
+            logger.error(f"Failed to fetch {url}: {error_description}")
+            return None, None, error_description
+
+    return None, None, "Max retries reached without success"
+
+
+class AsyncCrawlRunner:
+    """Drives a ``SiteCrawler`` with asyncio fetch workers instead of worker threads.
+
+    The crawler's ``workers`` setting is the number of concurrent fetch
+    coroutines. The feeder, robots.txt checks, crawl delay and shutdown event
+    behave as in the thread-pool engine; only the network wait moves onto the loop.
+    """
+
+    def __init__(self, crawler, parse_workers=None):
+        self.crawler = crawler
+        self.parse_workers = parse_workers
+        self._clients = {}  # proxy URL (None = direct) -> AsyncClient
+        self._frontier_changed = None
+
+    def run(self):
+        """Run the crawl to completion (or until shutdown) on a fresh event loop."""
+        asyncio.run(self._run())
+
+    def _build_client(self, httpx, proxy_url=None):
+        """Create an AsyncClient for one proxy honouring the site's keep-alive settings."""
+        crawler = self.crawler
+        concurrency = max(1, crawler.workers)
+        keepalive = concurrency if crawler.session is not None else 0
+        http2 = crawler.config.fetcher == "http2"
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                crawler.logger.error(
+                    "h2 package not installed, using HTTP/1.1. Try running: pip install httpx[http2]"
+                )
+                http2 = False
+        return httpx.AsyncClient(
+            proxy=proxy_url,
+            verify=get_ssl_context(resume_sessions=proxy_url is None),
+            http2=http2,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=concurrency, max_keepalive_connections=keepalive
+            ),
+        )
+
+    def _client_for(self, httpx, proxies):
+        """Return the AsyncClient for ``proxies``; httpx binds proxies to the client."""
+        proxy_url = (proxies.get("https") or proxies.get("http")) if proxies else None
+        client = self._clients.get(proxy_url)
+        if client is None:
+            client = self._clients[proxy_url] = self._build_client(httpx, proxy_url)
+        return client
+
+    async def _run(self):
+        try:
+            import httpx
+        except ImportError:
+            self.crawler.logger.error(
+                "httpx package not installed. Try running: pip install httpx[socks]"
+            )
+            raise
+
+        crawler = self.crawler
+        q = asyncio.Queue(maxsize=crawler.batch_size * 2)
+        # Set to wake the feeder (see SiteCrawler.notify_frontier).
+        self._frontier_changed = asyncio.Event()
+        executor = ThreadPoolExecutor(
+            max_workers=self.parse_workers, thread_name_prefix="async-parse"
+        )
+        try:
+            feeder = asyncio.create_task(self._feeder(q, executor))
+            workers = [
+                asyncio.create_task(self._worker(q, httpx, executor))
+                for _ in range(max(1, crawler.workers))
+            ]
+            crawler.logger.info(
+                f"Async engine started with {len(workers)} concurrent fetchers."
+            )
+            await asyncio.gather(feeder, *workers)
+        finally:
+            for client in self._clients.values():
+                await client.aclose()
+            self._clients.clear()
+            # Executor threads exit here; their thread-local SQLite connections
+            # are released together with the thread-local storage.
+            executor.shutdown(wait=True)
+
+    async def _feeder(self, q, executor):
+        """Producer coroutine: mirror of ``SiteCrawler._feeder_loop`` on the event loop."""
+        crawler = self.crawler
+        loop = asyncio.get_running_loop()
+
+        # Frontier notifications come from executor threads (saved links,
+        # released URLs); hop them onto the loop to wake this task.
+        def listener():
+            loop.call_soon_threadsafe(self._frontier_changed.set)
+
+        crawler.frontier_listeners.append(listener)
+        crawler.logger.info("Starting database queue feeder task.")
+        try:
+            while not crawler.shutdown_event.is_set():
+                await loop.run_in_executor(executor, crawler.renew_leases)
+                await loop.run_in_executor(executor, crawler.requeue_due_links)
+                current_queued = q.qsize()
+                if current_queued < crawler.batch_size:
+                    limit = crawler.batch_size * 2 - current_queued
+                    new_urls = await loop.run_in_executor(
+                        executor, crawler.claim_pending_urls, limit
+                    )
+                    if new_urls:
+                        for url in new_urls:
+                            await q.put(url)
+                        crawler.logger.info(
+                            f"Queued {len(new_urls)} new URLs. Queue size: {q.qsize()}"
+                        )
+                    elif await loop.run_in_executor(
+                        executor, crawler.is_crawl_complete
+                    ):
+                        crawler.logger.info(
+                            "No pending links remaining and all workers finished. Crawl complete."
+                        )
+                        crawler.shutdown_event.set()
+                        break
+                try:
+                    await asyncio.wait_for(
+                        self._frontier_changed.wait(), crawler.feeder_idle_timeout()
+                    )
+                except asyncio.TimeoutError:
+                    # Rescan from the top, as after a timeout of the threaded feeder.
+                    crawler.notify_frontier(rewind=True)
+                self._frontier_changed.clear()
+        finally:
+            crawler.frontier_listeners.remove(listener)
+            crawler.logger.info("Database queue feeder task stopped.")
+
+    async def _worker(self, q, httpx, executor):
+        """Consumer coroutine: fetch on the loop, process in the executor."""
+        crawler = self.crawler
+        loop = asyncio.get_running_loop()
+        while not crawler.shutdown_event.is_set():
+            try:
+                url = await asyncio.wait_for(q.get(), timeout=1.0)
+            except asyncio.TimeoutError:
+                continue
+            if q.qsize() < crawler.batch_size:
+                self._frontier_changed.set()
+
+            try:
+                # A disallowed URL is recorded in SQLite, so check off the loop.
+                if not await loop.run_in_executor(
+                    executor, crawler.is_allowed_by_robots, url
+                ):
+                    continue
+                if not await crawler.acquire_fetch_permit_async():
+                    continue
+
+                response_meta = {}
+                if (
+                    crawler.config.js_rendering
+                    or crawler.config.http_cache != "off"
+                    or crawler.config.warc_dir
+                ):
+                    # Forced browser rendering, the HTTP cache and the WARC writer
+                    # go through the synchronous fetch path; keep it off the loop.
+                    result = await loop.run_in_executor(
+                        executor, crawler.timed_fetch, url, response_meta
+                    )
+                else:
+                    result = await self._fetch(url, httpx, executor, response_meta)
+                await loop.run_in_executor(
+                    executor, crawler.complete_page, url, *result, response_meta
+                )
+            except Exception as e:
+                crawler.logger.error(
+                    f"Critical error during crawl execution for {url}: {e}"
+                )
+            finally:
+                await loop.run_in_executor(executor, crawler.release_url, url)
+                q.task_done()
+        # Wake the feeder so it sees the shutdown.
+        self._frontier_changed.set()
+
+    async def _fetch(self, url, httpx, executor, response_meta):
+        """Fetch ``url`` on the loop holding a permit; report its latency to AutoThrottle."""
+        crawler = self.crawler
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            validators = await loop.run_in_executor(
+                executor, crawler.get_validators, url
+            )
+            proxies = crawler.get_proxies(url, worker=asyncio.current_task().get_name())
+            crawler.logger.info(f"Crawling: {url}")
+            result = await fetch_page_async(
+                url,
+                self._client_for(httpx, proxies),
+                proxies=proxies,
+                logger=crawler.logger,
+                js_driver=crawler.config.js_driver,
+                auto_detect_js=crawler.config.auto_detect_js,
+                executor=executor,
+                defer_retries=True,
+                response_meta=response_meta,
+                content_policy=crawler.content_policy,
+                **validators,
+            )
+        finally:
+            crawler.release_fetch_permit()
+        latency = loop.time() - started
+        crawler.report_proxy_result(proxies, latency, result[2], response_meta)
+        crawler.record_fetch_outcome(latency, result[2], response_meta)
+        return result
@@ -0,0 +1,158 @@
+import fnmatch
+import re
+from typing import Optional
+from urllib.parse import quote, unquote_plus, urlsplit, urlunsplit
+
+# Canonicalization rules used when a site configures none. "strip_params"
+# lists query parameters (shell-style patterns, matched case-insensitively)
+# that only track the visitor and never change the page; a site's own list
+# is added to these. "keep_params" exempts parameters from stripping.
+# "trailing_slash" is 'keep', 'strip' or 'add' (the root path keeps its '/').
+DEFAULT_CANONICAL_RULES = {
+    "strip_params": [
+        "utm_*",
+        "fbclid",
+        "gclid",
+        "gclsrc",
+        "dclid",
+        "gbraid",
+        "wbraid",
+        "msclkid",
+        "yclid",
+        "twclid",
+        "ttclid",
+        "igshid",
+        "li_fat_id",
+        "mc_cid",
+        "mc_eid",
+        "_ga",
+        "_gl",
+        "_hsenc",
+        "_hsmi",
+        "mkt_tok",
+        "oly_anon_id",
+        "oly_enc_id",
+        "vero_id",
+        "wickedid",
+        "rb_clickid",
+        "s_cid",
+    ],
+    "keep_params": [],
+    "sort_query": True,
+    "trailing_slash": "keep",
+    "lowercase_path": False,
+}
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# RFC 3986 unreserved characters never need percent-encoding.
+_UNRESERVED = frozenset(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~"
+)
+_ESCAPE_RE = re.compile(r"%([0-9A-Fa-f]{2})")
+# Characters left as they are in a path / query once escapes are normalized.
+_PATH_SAFE = "/:@!$&'()*+,;=%~"
+_QUERY_SAFE = "/?:@!$'()*+,;=%~"
+
+
+def _normalize_escapes(value, safe):
+    """Decode escaped unreserved characters, upper-case the other escapes and
+    percent-encode characters that must not appear raw."""
+
+    def fix(match):
+        char = chr(int(match.group(1), 16))
+        return char if char in _UNRESERVED else f"%{match.group(1).upper()}"
+
+    return quote(_ESCAPE_RE.sub(fix, value), safe=safe)
+
+
+class UrlCanonicalizer:
+    """Rewrites URLs to one canonical form, so variants of a page share a row.
+
+    Always applied: lower-case scheme and host, no default port, no fragment,
+    '/' for an empty path and normalized percent-encoding. Configurable (see
+    ``DEFAULT_CANONICAL_RULES``): tracking parameters removed, query
+    parameters sorted, trailing slashes and path case.
+
+    Args:
+        rules (dict): Overrides of ``DEFAULT_CANONICAL_RULES``.
+                      ``strip_params`` extends the default list.
+    """
+
+    def __init__(self, rules: Optional[dict] = None):
+        rules = dict(rules or {})
+        self.strip_params = [
+            pattern.lower()
+            for pattern in DEFAULT_CANONICAL_RULES["strip_params"]
+            + list(rules.get("strip_params", []))
+        ]
+        self.keep_params = {name.lower() for name in rules.get("keep_params", [])}
+        self.sort_query = rules.get("sort_query", DEFAULT_CANONICAL_RULES["sort_query"])
+        self.trailing_slash = rules.get(
+            "trailing_slash", DEFAULT_CANONICAL_RULES["trailing_slash"]
+        )
+        if self.trailing_slash not in ("keep", "strip", "add"):
+            raise ValueError(
+                f"Unknown trailing_slash rule '{self.trailing_slash}'. "
+                f"Available rules: keep, strip, add"
+            )
+        self.lowercase_path = rules.get(
+            "lowercase_path", DEFAULT_CANONICAL_RULES["lowercase_path"]
+        )
+        self._stripped = {}  # parameter name -> strip?
+
+    @classmethod
+    def from_config(cls, config) -> "UrlCanonicalizer":
+        """Build a canonicalizer from a CrawlerConfig."""
+        return cls(config.canonical_rules)
+
+    def _strip(self, name):
+        verdict = self._stripped.get(name)
+        if verdict is None:
+            key = unquote_plus(name).lower()
+            verdict = key not in self.keep_params and any(
+                fnmatch.fnmatchcase(key, pattern) for pattern in self.strip_params
+            )
+            self._stripped[name] = verdict
+        return verdict
+
+    def canonicalize(self, url) -> str:
+        """Return the canonical form of ``url`` (non-HTTP URLs are returned as is)."""
+        try:
+            parts = urlsplit(url.strip())
+            port = parts.port
+        except ValueError:
+            return url
+        scheme = parts.scheme.lower()
+        if scheme not in _DEFAULT_PORTS:
+            return url
+
+        host = (parts.hostname or "").rstrip(".")
+        if ":" in host:
+            host = f"[{host}]"  # IPv6 literal
+        netloc = host if port in (None, _DEFAULT_PORTS[scheme]) else f"{host}:{port}"
+        if parts.username or parts.password:
+            userinfo = parts.netloc.rpartition("@")[0]
+            netloc = f"{userinfo}@{netloc}"
+
+        path = _normalize_escapes(parts.path or "/", _PATH_SAFE)
+        if self.lowercase_path:
+            path = path.lower()
+        if path != "/":
+            if self.trailing_slash == "strip":
+                path = path.rstrip("/") or "/"
+            elif self.trailing_slash == "add" and not path.endswith("/"):
+                last_segment = path.rsplit("/", 1)[-1]
+                if "." not in last_segment:  # Leave file names alone
+                    path += "/"
+
+        params = []
+        for pair in parts.query.split("&"):
+            if not pair:
+                continue
+            name = pair.split("=", 1)[0]
+            if not self._strip(name):
+                params.append(_normalize_escapes(pair, _QUERY_SAFE + "="))
+        if self.sort_query:
+            params.sort()
+        return urlunsplit((scheme, netloc, path, "&".join(params), ""))
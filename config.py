@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 
 
@@ -8,8 +8,29 @@ class CrawlerConfig:
     respect_robots: bool = True
     no_duplicates: bool = True
     crawl_delay: int = 30
+    # AutoThrottle: adapt crawl_delay and concurrency to the server's latency and errors
+    auto_throttle: bool = False
+    min_crawl_delay: float = 1.0
+    max_crawl_delay: float = 120.0
+    min_workers: int = (
+        1  # the concurrency never drops below this; workers is the maximum
+    )
     resume: bool = False
-    re_crawl_time: float = 3.0
+    re_crawl_time: float = 3.0  # Hours until a page's first re-crawl
+    # Adaptive re-crawl: the interval halves when a page changed and doubles
+    # when it did not, within these bounds (hours)
+    adaptive_recrawl: bool = True
+    min_re_crawl_time: float = 0.5
+    max_re_crawl_time: float = 720.0
+    robots_ttl: float = 24.0  # Hours before robots.txt is fetched again
+    # Discovery mode: poll feeds and sitemaps (robots.txt 'Sitemap:' lines,
+    # discovery_feeds, <link rel="alternate"> feeds) every
+    # discovery_min_interval to discovery_max_interval minutes and crawl only
+    # the new or updated links they list; runs until stopped
+    discovery: bool = False
+    discovery_feeds: Optional[list] = None
+    discovery_min_interval: float = 5.0
+    discovery_max_interval: float = 360.0
 
     # Path settings
     logs_dir: str = "logs"
@@ -18,6 +39,17 @@ class CrawlerConfig:
     # Execution tuning
     batch_size: int = 100
     workers: int = 1
+    seen_filter: bool = True  # Drop known links before they reach SQLite
+    seen_filter_capacity: int = 1_000_000  # Links the filter is first sized for
+    max_retries: int = 3
+    lease_timeout: int = 300  # Seconds before a claimed URL may be claimed again
+    retry_backoff: int = 60
+    engine: str = "threads"  # 'threads' or 'async'
+    fetcher: str = "requests"  # 'requests' (HTTP/1.1) or 'http2'
+    http_cache: str = "off"  # 'off', 'record' or 'replay'
+    http_cache_dir: str = "http_cache"
+    warc_dir: Optional[str] = None  # Write a WARC archive of the fetches there
+    warc_max_size: int = 1024**3  # Rotate WARC files at this size (bytes)
     parser_engine: str = "auto"
     normalize_whitespace: bool = True
 
@@ -26,11 +58,52 @@ class CrawlerConfig:
     plagiarism_threshold: float = 0.8
 
     # Network settings
-    proxy: Optional[str] = None
+    proxy: Optional[
+        str
+    ] = None  # a URL, 'tor', or several URLs (list / comma-separated)
+    proxy_sticky: bool = False  # pin each domain to one proxy of a pool while healthy
+    tor_isolation: str = (
+        "worker"  # 'worker', 'domain' or 'none': one Tor circuit per key
+    )
+    tor_socks_ports: Optional[list] = None  # None = [9050]
+    tor_control_port: Optional[int] = None  # enables NEWNYM on repeated failures
+    tor_control_password: Optional[str] = None
     keep_alive: Optional[bool] = None
+    pool_connections: Optional[int] = None  # None = max(10, number of sites)
+    pool_maxsize: Optional[int] = None  # None = sized to workers
     user_agent: str = "Echidna/1.0 (+https://github.com/svagionitis/echidna)"
     processor: str = "news"
 
+    # Download limits (checked from the response headers before the body is read)
+    # MIME pattern ('text/html', 'image/*', '*') -> max bytes. XML gets the
+    # sitemap protocol's 50 MiB, so large sitemaps are not rejected.
+    content_size_limits: dict = field(
+        default_factory=lambda: {
+            "*": 10 * 1024 * 1024,
+            "application/xml": 50 * 1024 * 1024,
+            "text/xml": 50 * 1024 * 1024,
+        }
+    )
+    allowed_content_types: Optional[list] = None  # None = allow everything
+    denied_content_types: list = field(default_factory=list)
+    head_probe: bool = False
+
+    # Frontier priority rules, overriding priority.DEFAULT_PRIORITY_RULES
+    # (JSON configuration only, per site)
+    priority_rules: Optional[dict] = None
+
+    # URL canonicalization; canonical_rules overrides
+    # canonical.DEFAULT_CANONICAL_RULES (JSON configuration only, per site)
+    canonicalize_urls: bool = True
+    canonical_rules: Optional[dict] = None
+
+    # Crawler-trap detection: URLs admitted per URL template before further
+    # ones are parked (None = no limit); trap_rules overrides
+    # traps.DEFAULT_TRAP_RULES (JSON configuration only, per site)
+    trap_detection: bool = True
+    trap_budget: Optional[int] = 10000
+    trap_rules: Optional[dict] = None
+
     # JavaScript rendering settings
     js_rendering: bool = False
     js_driver: str = "auto"  # 'playwright', 'selenium', 'puppeteer', 'auto'
@@ -39,26 +112,77 @@ class CrawlerConfig:
     @classmethod
     def from_args(cls, args) -> "CrawlerConfig":
         """Build config from parsed CLI argparse.Namespace."""
+
+        def split_list(value):
+            return [item.strip() for item in value.split(",") if item.strip()]
+
+        def split_ports(value):
+            return [int(port) for port in split_list(value)] if value else None
+
+        content_size_limits = cls().content_size_limits
+        if getattr(args, "max_content_bytes", None) is not None:
+            content_size_limits["*"] = args.max_content_bytes
+        allowed = getattr(args, "allow_content_types", None)
+        denied = getattr(args, "deny_content_types", None)
+
         return cls(
             respect_robots=args.respect_robots,
             no_duplicates=args.no_duplicates,
             crawl_delay=args.crawl_delay,
+            auto_throttle=getattr(args, "auto_throttle", False),
+            min_crawl_delay=getattr(args, "min_crawl_delay", 1.0),
+            max_crawl_delay=getattr(args, "max_crawl_delay", 120.0),
+            min_workers=getattr(args, "min_workers", 1),
             resume=args.resume,
             re_crawl_time=args.re_crawl_time,
+            adaptive_recrawl=getattr(args, "adaptive_recrawl", True),
+            min_re_crawl_time=getattr(args, "min_re_crawl_time", 0.5),
+            max_re_crawl_time=getattr(args, "max_re_crawl_time", 720.0),
+            robots_ttl=getattr(args, "robots_ttl", 24.0),
+            discovery=getattr(args, "discovery", False),
+            discovery_feeds=split_list(getattr(args, "discovery_feeds", None) or "")
+            or None,
+            discovery_min_interval=getattr(args, "discovery_min_interval", 5.0),
+            discovery_max_interval=getattr(args, "discovery_max_interval", 360.0),
             logs_dir=args.logs_dir,
             db_dir=args.db_dir,
             batch_size=args.batch_size,
             workers=args.workers,
+            seen_filter=getattr(args, "seen_filter", True),
+            seen_filter_capacity=getattr(args, "seen_filter_capacity", 1_000_000),
+            max_retries=getattr(args, "max_retries", 3),
+            lease_timeout=getattr(args, "lease_timeout", 300),
+            retry_backoff=getattr(args, "retry_backoff", 60),
+            engine=getattr(args, "engine", "threads"),
+            fetcher=getattr(args, "fetcher", "requests"),
+            http_cache=getattr(args, "http_cache", "off"),
+            http_cache_dir=getattr(args, "http_cache_dir", "http_cache"),
+            warc_dir=getattr(args, "warc_dir", None),
+            warc_max_size=getattr(args, "warc_max_size", 1024**3),
             parser_engine=args.parser,
             normalize_whitespace=args.normalize_whitespace,
             plagiarism_db=args.plagiarism_db,
             plagiarism_threshold=args.plagiarism_threshold,
             proxy=args.proxy,
+            proxy_sticky=getattr(args, "proxy_sticky", False),
+            tor_isolation=getattr(args, "tor_isolation", "worker"),
+            tor_socks_ports=split_ports(getattr(args, "tor_socks_ports", None)),
+            tor_control_port=getattr(args, "tor_control_port", None),
+            tor_control_password=getattr(args, "tor_control_password", None),
             processor=args.processor,
             keep_alive=args.keep_alive,
+            pool_connections=getattr(args, "pool_connections", None),
+            pool_maxsize=getattr(args, "pool_maxsize", None),
             js_rendering=getattr(args, "js_rendering", False),
             js_driver=getattr(args, "js_driver", "auto"),
             auto_detect_js=getattr(args, "auto_detect_js", True),
+            content_size_limits=content_size_limits,
+            allowed_content_types=split_list(allowed) if allowed else None,
+            denied_content_types=split_list(denied) if denied else [],
+            head_probe=getattr(args, "head_probe", False),
+            canonicalize_urls=getattr(args, "canonicalize_urls", True),
+            trap_detection=getattr(args, "trap_detection", True),
+            trap_budget=getattr(args, "trap_budget", 10000) or None,
         )
 
     def merge_with_dict(self, site_dict: dict) -> "CrawlerConfig":
@@ -0,0 +1,236 @@
+import ssl
+import threading
+import time
+
+import certifi
+import requests
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
+
+_ssl_contexts = {}  # resume_sessions -> SSLContext
+_ssl_context_lock = threading.Lock()
+
+
+class SessionReusingSSLContext(ssl.SSLContext):
+    """SSLContext that resumes the last TLS session seen for a host on new connections.
+
+    Sessions are remembered per server hostname once a connection goes back
+    into its pool (TLS 1.3 tickets only arrive after the handshake), so a
+    reconnect to the same host can skip the full handshake. The cache does not
+    know which route a connection took, so it is only used for direct
+    connections (see ``get_ssl_context``).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._tls_sessions = {}
+        self._tls_sessions_lock = threading.Lock()
+
+    def remember_session(self, server_hostname, session):
+        if server_hostname and session is not None:
+            with self._tls_sessions_lock:
+                self._tls_sessions[server_hostname] = session
+
+    def wrap_socket(self, sock, *args, server_hostname=None, session=None, **kwargs):
+        if session is None and server_hostname:
+            with self._tls_sessions_lock:
+                session = self._tls_sessions.get(server_hostname)
+        return super().wrap_socket(
+            sock, *args, server_hostname=server_hostname, session=session, **kwargs
+        )
+
+
+def get_ssl_context(resume_sessions=True):
+    """Return a process-wide client SSLContext, loading the CA bundle only once.
+
+    Passing a CA bundle path as ``verify=`` makes urllib3 re-read the bundle on
+    every new connection; sharing one pre-loaded context avoids that cost.
+
+    Connections through a proxy must use ``resume_sessions=False``: a TLS
+    session resumed through another proxy (or Tor identity) than the one it
+    was issued through would let the origin link the two exits.
+    """
+    with _ssl_context_lock:
+        context = _ssl_contexts.get(resume_sessions)
+        if context is None:
+            context_cls = (
+                SessionReusingSSLContext if resume_sessions else ssl.SSLContext
+            )
+            context = context_cls(ssl.PROTOCOL_TLS_CLIENT)
+            context.minimum_version = ssl.TLSVersion.TLSv1_2
+            context.options |= ssl.OP_NO_COMPRESSION
+            context.load_verify_locations(certifi.where())
+            _ssl_contexts[resume_sessions] = context
+        return context
+
+
+class PoolStats:
+    """Thread-safe counters describing how well connections are being reused.
+
+    Every request checks a connection out of a pool: it is a hit when the
+    connection is already open, and a miss when a new TCP (and TLS) connection
+    has to be established for it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_resumed = 0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_new_connection(self, tls_resumed=False):
+        with self._lock:
+            self.new_connections += 1
+            if tls_resumed:
+                self.tls_resumed += 1
+
+    def snapshot(self) -> dict:
+        """Return the current counters plus derived hit/miss figures."""
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started_at, 1e-9)
+            misses = min(self.new_connections, self.requests)
+            return {
+                "requests": self.requests,
+                "hits": self.requests - misses,
+                "misses": misses,
+                "new_connections": self.new_connections,
+                "tls_resumed": self.tls_resumed,
+                "new_connections_per_sec": self.new_connections / elapsed,
+            }
+
+    def summary(self) -> str:
+        stats = self.snapshot()
+        hit_rate = (
+            100.0 * stats["hits"] / stats["requests"] if stats["requests"] else 0.0
+        )
+        return (
+            f"{stats['requests']} requests, {stats['hits']} pool hits / "
+            f"{stats['misses']} misses ({hit_rate:.1f}% reused), "
+            f"{stats['new_connections']} new connections "
+            f"({stats['new_connections_per_sec']:.2f}/s, "
+            f"{stats['tls_resumed']} TLS sessions resumed)"
+        )
+
+
+def _instrument_pool_manager(manager, stats):
+    """Swap a urllib3 (proxy) pool manager's pool classes for ones that report to stats."""
+    manager.pool_classes_by_scheme = {
+        scheme: _instrumented_pool_class(pool_cls, stats)
+        for scheme, pool_cls in manager.pool_classes_by_scheme.items()
+    }
+    return manager
+
+
+def _instrumented_pool_class(pool_cls, stats):
+    connection_cls = pool_cls.ConnectionCls
+
+    class CountingConnection(connection_cls):
+        def connect(self):
+            super().connect()
+            sock = getattr(self, "sock", None)
+            stats.record_new_connection(
+                tls_resumed=isinstance(sock, ssl.SSLSocket) and sock.session_reused
+            )
+
+    class CountingPool(pool_cls):
+        ConnectionCls = CountingConnection
+
+        def _get_conn(self, timeout=None):
+            stats.record_request()
+            return super()._get_conn(timeout=timeout)
+
+        def _put_conn(self, conn):
+            sock = getattr(conn, "sock", None) if conn is not None else None
+            if isinstance(sock, ssl.SSLSocket) and isinstance(
+                sock.context, SessionReusingSSLContext
+            ):
+                sock.context.remember_session(sock.server_hostname, sock.session)
+            return super()._put_conn(conn)
+
+    # Keep the original names so reprs (and error descriptions) are unchanged.
+    for cls, original in (
+        (CountingConnection, connection_cls),
+        (CountingPool, pool_cls),
+    ):
+        cls.__name__ = cls.__qualname__ = original.__name__
+    return CountingPool
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that keeps connections alive through proxies and records pool stats.
+
+    Direct connections and every proxy (HTTP or SOCKS) get their own urllib3
+    pool manager sized by ``pool_connections``/``pool_maxsize``. Direct
+    connections share an SSLContext that resumes TLS sessions; the proxies
+    share one that does not.
+    """
+
+    def __init__(self, stats: PoolStats, ssl_context=None, **kwargs):
+        self.stats = stats
+        self.ssl_context = ssl_context if ssl_context is not None else get_ssl_context()
+        self.proxy_ssl_context = (
+            ssl_context
+            if ssl_context is not None
+            else get_ssl_context(resume_sessions=False)
+        )
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs.setdefault("ssl_context", self.ssl_context)
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        _instrument_pool_manager(self.poolmanager, self.stats)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        if proxy not in self.proxy_manager:
+            proxy_kwargs.setdefault("ssl_context", self.proxy_ssl_context)
+            manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+            _instrument_pool_manager(manager, self.stats)
+        return self.proxy_manager[proxy]
+
+
+class ConnectionPool:
+    """A requests.Session backed by a tunable, instrumented connection pool.
+
+    One instance can be shared by several SiteCrawlers (and their worker
+    threads) so they draw from the same keep-alive connections.
+
+    Args:
+        pool_connections (int): Number of per-host pools to keep (per proxy).
+        pool_maxsize (int): Maximum open connections kept per host; should be
+                            at least the number of workers hitting that host.
+        pool_block (bool): Block when a host's pool is exhausted instead of
+                           opening a throw-away extra connection.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = DEFAULT_POOLSIZE,
+        pool_maxsize: int = DEFAULT_POOLSIZE,
+        pool_block: bool = False,
+    ):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.stats = PoolStats()
+        self.session = requests.Session()
+        adapter = PooledHTTPAdapter(
+            self.stats,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @classmethod
+    def from_config(cls, config, sites: int = 1) -> "ConnectionPool":
+        """Build a pool sized to ``config.workers`` unless explicit sizes are configured."""
+        pool_maxsize = config.pool_maxsize or max(1, config.workers)
+        pool_connections = config.pool_connections or max(DEFAULT_POOLSIZE, sites)
+        return cls(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,138 @@
+import os
+from typing import Optional
+from urllib.parse import urlparse
+
+# URL path extensions that almost always point at a binary download. With
+# head_probe enabled, these URLs get a HEAD request first so that a denied or
+# oversized body is never downloaded at all.
+BINARY_EXTENSIONS = frozenset(
+    {
+        ".7z",
+        ".avi",
+        ".dmg",
+        ".doc",
+        ".docx",
+        ".exe",
+        ".flac",
+        ".gif",
+        ".gz",
+        ".iso",
+        ".jpeg",
+        ".jpg",
+        ".m4a",
+        ".mkv",
+        ".mov",
+        ".mp3",
+        ".mp4",
+        ".pdf",
+        ".png",
+        ".ppt",
+        ".pptx",
+        ".rar",
+        ".tar",
+        ".wav",
+        ".webm",
+        ".webp",
+        ".xls",
+        ".xlsx",
+        ".zip",
+    }
+)
+
+
+def _mime_type(content_type) -> str:
+    """Strip parameters (e.g. charset) from a Content-Type header value."""
+    return (content_type or "").split(";")[0].strip().lower()
+
+
+def _matches(mime_type, pattern) -> bool:
+    """Match a MIME type against 'type/subtype', 'type/*' or '*'."""
+    pattern = pattern.strip().lower()
+    if pattern in ("*", "*/*"):
+        return True
+    if pattern.endswith("/*"):
+        return mime_type.startswith(pattern[:-1])
+    return mime_type == pattern
+
+
+class ContentPolicy:
+    """Decides, from response headers alone, whether a body should be downloaded.
+
+    Args:
+        size_limits (dict): Byte caps keyed by MIME pattern ('text/html', 'image/*'
+                            or '*'). The most specific matching key wins; a value
+                            of None (or no match) means unlimited.
+        allowed_types (list): If set, only MIME types matching one of these
+                              patterns are downloaded.
+        denied_types (list): MIME type patterns that are never downloaded.
+        head_probe (bool): Send a HEAD request first for URLs whose extension
+                           suggests a binary file.
+    """
+
+    def __init__(
+        self,
+        size_limits: Optional[dict] = None,
+        allowed_types: Optional[list] = None,
+        denied_types: Optional[list] = None,
+        head_probe: bool = False,
+    ):
+        self.size_limits = dict(size_limits or {})
+        self.allowed_types = list(allowed_types) if allowed_types else None
+        self.denied_types = list(denied_types or [])
+        self.head_probe = head_probe
+
+    @classmethod
+    def from_config(cls, config) -> "ContentPolicy":
+        """Build a policy from a CrawlerConfig."""
+        return cls(
+            size_limits=config.content_size_limits,
+            allowed_types=config.allowed_content_types,
+            denied_types=config.denied_content_types,
+            head_probe=config.head_probe,
+        )
+
+    def size_limit(self, content_type) -> Optional[int]:
+        """Return the byte cap for a Content-Type, or None if unlimited."""
+        mime_type = _mime_type(content_type)
+        if mime_type in self.size_limits:
+            return self.size_limits[mime_type]
+        major = mime_type.split("/")[0] + "/*"
+        if major in self.size_limits:
+            return self.size_limits[major]
+        return self.size_limits.get("*")
+
+    def is_allowed(self, content_type) -> bool:
+        """Return True if the allow/deny lists permit downloading this Content-Type."""
+        mime_type = _mime_type(content_type)
+        if any(_matches(mime_type, pattern) for pattern in self.denied_types):
+            return False
+        if self.allowed_types is None:
+            return True
+        return any(_matches(mime_type, pattern) for pattern in self.allowed_types)
+
+    def should_probe(self, url) -> bool:
+        """Return True if the URL should be checked with a HEAD request before GET."""
+        if not self.head_probe:
+            return False
+        extension = os.path.splitext(urlparse(url).path)[1].lower()
+        return extension in BINARY_EXTENSIONS
+
+    def check_headers(self, headers) -> Optional[str]:
+        """Return a rejection reason for a response based on its headers, or None to proceed."""
+        content_type = headers.get("Content-Type", "")
+        if not self.is_allowed(content_type):
+            return f"Content type not allowed: {_mime_type(content_type) or 'unknown'}"
+
+        limit = self.size_limit(content_type)
+        content_length = headers.get("Content-Length")
+        if limit is not None and content_length and content_length.isdigit():
+            if int(content_length) > limit:
+                return f"Content-Length {content_length} exceeds the {limit} byte cap"
+        return None
+
+    def check_size(self, content_type, size) -> Optional[str]:
+        """Return a rejection reason once a streamed body has grown past its cap."""
+        limit = self.size_limit(content_type)
+        if limit is not None and size > limit:
+            return f"Response body exceeds the {limit} byte cap"
+        return None
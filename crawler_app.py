@@ -1,27 +1,61 @@
-import requests
 import argparse
 import logging
 from typing import Optional
 import signal
 import os
 import json
+import socket
+import uuid
 import queue
+import time
 from urllib.parse import urljoin, urlparse
-from urllib.robotparser import RobotFileParser
 from database import (
     init_db,
     save_links_to_db,
     load_pending_links,
+    get_link_depth,
+    renew_leases,
+    release_lease,
+    release_owner_leases,
+    requeue_due_links,
+    count_leased_links,
     get_database_name,
+    merge_duplicate_links,
     is_database_empty,
     update_queue_link,
+    schedule_retry,
+    has_scheduled_retries,
+    get_link_validators,
+    update_link_validators,
+    mark_link_not_modified,
+    record_transfer,
+    get_transfer_stats,
+    get_content_hash,
+    schedule_next_fetch,
+    save_discovery_sources,
+    load_discovery_sources,
+    requeue_due_sources,
+    requeue_updated_links,
 )
 from utils import fetch_page, compute_hash, ensure_directory_exists
-from proxies import get_proxy_provider
+from proxies import PROXY_FAILURE_STATUS_CODES, get_proxy_provider
+from connection_pool import ConnectionPool
+from fetchers import get_fetcher
+from http_cache import CachingFetcher, get_http_cache_name
+from warc_writer import WarcFetcher, WarcWriter
+from rate_limiter import get_rate_limiter
+from robots import RobotsPolicy
+from throttle import AutoThrottle
+from content_policy import ContentPolicy
+from priority import PriorityPolicy
+from recrawl import RecrawlPolicy
+from canonical import UrlCanonicalizer
+from seen_filter import SeenUrlFilter
+from traps import TrapDetector
 from processors import get_processor
 from config import CrawlerConfig
 from similarity import SimilarityIndexer
-from datetime import datetime
+from datetime import datetime, timezone
 import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
@@ -29,6 +63,20 @@ _active_crawlers = []
 _active_crawlers_lock = threading.Lock()
 _original_sigint_handler = None
 
+# Seconds the feeder sleeps when nothing notifies it (see feeder_idle_timeout).
+FEEDER_IDLE_TIMEOUT = 5.0
+
+# Seconds between sweeps for crawled links due again (see requeue_due_links).
+RECRAWL_SWEEP_INTERVAL = 300
+
+# Seconds between sweeps for discovery sources due a poll (see requeue_due_sources).
+DISCOVERY_SWEEP_INTERVAL = 30
+
+
+def lease_owner_prefix(pid=None) -> str:
+    """Return how the lease owner ids of the crawlers in process ``pid`` start."""
+    return f"{socket.gethostname()}-{pid or os.getpid()}-"
+
 
 def get_log_file_name(domain, logs_dir, logger=None):
     """Generate the log filename based on the domain and current datetime, and save it in the specified logs directory."""
@@ -45,9 +93,17 @@ def get_log_file_name(domain, logs_dir, logger=None):
 class SiteCrawler:
     """Encapsulates the state and crawl logic for a single domain website."""
 
-    def __init__(self, start_url: str, config: Optional[CrawlerConfig] = None):
+    def __init__(
+        self,
+        start_url: str,
+        config: Optional[CrawlerConfig] = None,
+        connection_pool: Optional[ConnectionPool] = None,
+    ):
         self.start_url = start_url
         self.config = config if config is not None else CrawlerConfig()
+        # A pool passed in is shared with other crawlers and closed by its owner.
+        self.connection_pool = connection_pool
+        self._owns_connection_pool = False
 
         self.respect_robots = self.config.respect_robots
         self.no_duplicates = self.config.no_duplicates
@@ -62,8 +118,22 @@ class SiteCrawler:
         self.normalize_whitespace = self.config.normalize_whitespace
         self.plagiarism_db = self.config.plagiarism_db
         self.plagiarism_threshold = self.config.plagiarism_threshold
-        self.proxy_provider = get_proxy_provider(self.config.proxy)
+        self.proxy_provider = self.build_proxy_provider()
         self.keep_alive = self.config.keep_alive
+        self.content_policy = ContentPolicy.from_config(self.config)
+        self.priority_policy = PriorityPolicy.from_config(self.config)
+        self.recrawl_policy = RecrawlPolicy.from_config(self.config)
+        # Feeds and sitemaps are polled on their own, shorter schedule.
+        self.discovery_policy = RecrawlPolicy(
+            self.config.discovery_min_interval / 60,
+            self.config.discovery_min_interval / 60,
+            self.config.discovery_max_interval / 60,
+        )
+        self.canonicalizer = (
+            UrlCanonicalizer.from_config(self.config)
+            if self.config.canonicalize_urls
+            else None
+        )
         if isinstance(self.config.processor, str):
             self.processor = get_processor(self.config.processor)
         else:
@@ -72,16 +142,42 @@ class SiteCrawler:
         self.domain = urlparse(start_url).netloc
         self.database_name = get_database_name(self.domain, self.db_dir)
         self.robots_parser = None
-        self.robots_delay_applied = False
+        self.robots_crawl_delay = None
+        self.seen_urls = None
+        self.traps = None
+        self._requeued_at = None
+        self.discovery_sources = set()
+        self._sources_polled_at = None
+        self.rate_limiter = None
+        self.throttle = None
         self.logger = None
         self.shutdown_event = threading.Event()
 
+        # URLs are claimed in the database with a lease (status 'in_progress'),
+        # so several crawler processes can share one domain database. The owner
+        # id tells this crawler's leases apart from theirs.
+        self.lease_owner = f"{lease_owner_prefix()}{uuid.uuid4().hex[:8]}"
+        self._leases_renewed_at = time.monotonic()
+
         # In-memory tracking of URLs currently queued or being processed.
-        # This prevents the Producer thread from querying and queuing duplicate
-        # pending URLs that are already active in-flight but not yet written to DB.
+        # This prevents the Producer thread from queuing a URL twice should its
+        # lease expire while it is still waiting in the queue.
         self._queued_urls = set()
         self._queue_lock = threading.Lock()
 
+        # The feeder sleeps on this condition until workers drain the queue,
+        # links are saved or a URL is released, rather than polling the
+        # database. ``frontier_listeners`` are extra callables notified with
+        # it (the asyncio engine wakes its feeder task through one).
+        self._frontier_changed = threading.Condition()
+        self._frontier_dirty = True
+        self.frontier_listeners = []
+        # Scan position over the pending links, kept between claims so each
+        # refill resumes where the last one stopped (see load_pending_links).
+        # Only the feeder touches it; others ask for a rewind to the top.
+        self._frontier_cursor = {}
+        self._frontier_rewind = False
+
     def initialize(self):
         """Initialize the crawler: set up logging, database schemas, and robots.txt."""
         log_file_name = get_log_file_name(self.domain, self.logs_dir)
@@ -106,53 +202,89 @@ class SiteCrawler:
         stream_handler.setFormatter(formatter)
         self.logger.addHandler(stream_handler)
 
+        # Rebuild the proxy provider so it logs to this site's logger
+        self.proxy_provider = self.build_proxy_provider(logger=self.logger)
+
         # Initialize database schemas and indexes
         init_db(self.database_name, logger=self.logger)
+        if self.config.seen_filter:
+            self.seen_urls = SeenUrlFilter.open(
+                self.database_name,
+                capacity=self.config.seen_filter_capacity,
+                logger=self.logger,
+            )
+        if self.config.trap_detection:
+            self.traps = TrapDetector.from_config(
+                self.database_name, self.config, logger=self.logger
+            )
+            self.traps.load()
 
-        # Initialize HTTP connection session based on keep-alive configuration
-        proxies = self.proxy_provider.get_proxies()
-        if self.keep_alive is None:
-            # Default behavior: keep-alive for direct connection, not keep-alive for proxy connection
-            keep_alive_enabled = not proxies
-        else:
-            keep_alive_enabled = self.keep_alive
-
-        if keep_alive_enabled:
-            self.session = requests.Session()
-            self.logger.info("HTTP Keep-Alive connection pooling enabled.")
-        else:
+        # Initialize HTTP connection session based on keep-alive configuration.
+        # Pooling is on by default, for proxied connections too: each proxy gets
+        # its own pool, so reused sockets skip the TCP + SOCKS + TLS handshakes.
+        if self.keep_alive is False:
             self.session = None
             self.logger.info("HTTP Keep-Alive connection pooling disabled.")
+        else:
+            if self.connection_pool is None:
+                self.connection_pool = ConnectionPool.from_config(self.config)
+                self._owns_connection_pool = True
+            self.session = self.connection_pool.session
+            self.logger.info(
+                f"HTTP Keep-Alive connection pooling enabled "
+                f"(pool_connections={self.connection_pool.pool_connections}, "
+                f"pool_maxsize={self.connection_pool.pool_maxsize})."
+            )
 
-        # Initialize robots.txt parser
+        self.fetcher = get_fetcher(
+            self.config.fetcher,
+            session=self.session,
+            keep_alive=self.keep_alive is not False,
+            logger=self.logger,
+        )
+        self.logger.info(
+            f"Using the '{self.fetcher.name}' fetcher backend "
+            f"(Accept-Encoding: {self.fetcher.accept_encoding})."
+        )
+        if self.config.http_cache != "off":
+            cache_name = get_http_cache_name(
+                self.domain, self.config.http_cache_dir, logger=self.logger
+            )
+            self.fetcher = CachingFetcher(
+                self.fetcher,
+                cache_name,
+                mode=self.config.http_cache,
+                logger=self.logger,
+            )
+            self.logger.info(
+                f"HTTP cache in '{self.config.http_cache}' mode: {cache_name}"
+            )
+        if self.config.warc_dir:
+            self.fetcher = WarcFetcher(
+                self.fetcher,
+                WarcWriter(
+                    self.config.warc_dir,
+                    self.domain,
+                    max_file_size=self.config.warc_max_size,
+                    logger=self.logger,
+                ),
+                self.database_name,
+                logger=self.logger,
+            )
+
+        # Load robots.txt (from the database cache while it is fresh)
         if self.respect_robots:
-            self.robots_parser = RobotFileParser()
-            robots_url = urljoin(self.start_url, "/robots.txt")
-            robots_content, _, robots_error_description = fetch_page(
-                robots_url, proxies=proxies, session=self.session, logger=self.logger
+            self.robots_parser = RobotsPolicy(
+                self.start_url,
+                self.config.user_agent,
+                self.fetch_robots_txt,
+                self.database_name,
+                ttl=self.config.robots_ttl * 3600,
+                on_update=self.apply_robots_crawl_delay,
+                logger=self.logger,
             )
-            if robots_error_description:
-                self.logger.warning(
-                    f"Failed to fetch robots.txt: {robots_error_description}"
-                )
-                return
-            try:
-                self.robots_parser.parse(robots_content.splitlines())
-                # Use the crawl delay from robots.txt if available
-                robots_crawl_delay = self.robots_parser.crawl_delay(
-                    self.config.user_agent
-                )
-                if (
-                    robots_crawl_delay is not None
-                    and robots_crawl_delay > self.crawl_delay
-                ):
-                    self.crawl_delay = robots_crawl_delay
-                    self.robots_delay_applied = True
-                    self.logger.info(
-                        f"Using crawl delay from robots.txt: {self.crawl_delay} seconds"
-                    )
-            except Exception as e:
-                self.logger.warning(f"Failed to read robots.txt: {e}")
+            self.robots_parser.load()
+            self.apply_robots_crawl_delay(self.robots_parser)
         # Initialize central similarity database and indexer
         self.indexer = SimilarityIndexer(self.plagiarism_db, logger=self.logger)
 
@@ -162,6 +294,12 @@ class SiteCrawler:
             self.database_name, logger=self.logger
         ):
             self.logger.info(f"Resuming from existing database: {self.database_name}")
+            leased = count_leased_links(self.database_name, logger=self.logger)
+            if leased:
+                self.logger.info(
+                    f"{leased} URL(s) are leased by other crawlers or an interrupted "
+                    f"run; they are claimed again once their leases expire."
+                )
         else:
             self.logger.info(f"Starting fresh crawl from: {self.start_url}")
             save_links_to_db(
@@ -170,36 +308,284 @@ class SiteCrawler:
                 [self.start_url],
                 self.robots_parser,
                 re_crawl_time=self.re_crawl_time,
+                priorities={
+                    self.start_url: self.priority_policy.score(
+                        self.start_url, 0, "seed"
+                    )
+                },
+                depth=0,
+                canonicalize=self.canonicalize_url,
                 logger=self.logger,
             )
+            if self.seen_urls is not None:
+                # Links back to the seed need no upsert either.
+                self.seen_urls.update([self.canonicalize_url(self.start_url)])
+        if self.config.discovery:
+            self.prepare_discovery()
+
+    def prepare_discovery(self):
+        """Register the configured feeds and the robots.txt sitemaps as discovery sources."""
+        self.discovery_sources.update(
+            load_discovery_sources(self.database_name, logger=self.logger)
+        )
+        sources = list(self.config.discovery_feeds or [])
+        if self.robots_parser is not None:
+            sources += self.robots_parser.sitemaps
+        self.add_discovery_sources(sources)
+        if self.discovery_sources:
+            self.logger.info(
+                f"Discovery mode: polling {len(self.discovery_sources)} feed(s) and "
+                f"sitemap(s) every {self.config.discovery_min_interval:g} to "
+                f"{self.config.discovery_max_interval:g} minutes."
+            )
+        else:
+            self.logger.warning(
+                "Discovery mode: no feeds or sitemaps known yet. They are picked up "
+                'from <link rel="alternate"> tags and sitemap indexes as pages '
+                "are crawled."
+            )
 
-    def crawl_page(self, current_url):
-        """Crawl a single page, fetch content, check for duplicates, and save data.
+    def add_discovery_sources(self, urls):
+        """Save new same-domain feed / sitemap URLs as discovery sources."""
+        new_sources = []
+        for url in urls:
+            url = self.canonicalize_url(urljoin(self.start_url, url.strip()))
+            if urlparse(url).netloc != self.domain or url in self.discovery_sources:
+                continue
+            if self.robots_parser and not self.robots_parser.is_allowed(url):
+                continue
+            new_sources.append(url)
+        if not new_sources:
+            return
+        save_discovery_sources(
+            self.database_name,
+            self.domain,
+            new_sources,
+            priority=self.priority_policy.score(self.start_url, 0, "seed"),
+            logger=self.logger,
+        )
+        self.discovery_sources.update(new_sources)
+        if self.seen_urls is not None:
+            self.seen_urls.update(new_sources)
+        for url in new_sources:
+            self.logger.info(f"Discovery source added: {url}")
+        self.notify_frontier(rewind=True)
+
+    def requeue_updated_links(self, links):
+        """Requeue crawled links that a feed or sitemap dates after their last crawl."""
+        lastmods = {}
+        for link, (_, lastmod) in getattr(links, "hints", {}).items():
+            if lastmod is None:
+                continue
+            if lastmod.tzinfo is None:  # Undated zone: UTC, as in the priority policy
+                lastmod = lastmod.replace(tzinfo=timezone.utc)
+            # date_crawled is stored as naive local time.
+            lastmods[self.canonicalize_url(link)] = lastmod.astimezone().replace(
+                tzinfo=None
+            )
+        if not lastmods:
+            return
+        requeued = requeue_updated_links(
+            self.database_name, lastmods, logger=self.logger
+        )
+        if requeued:
+            self.logger.info(f"Requeued {requeued} link(s) updated since their crawl.")
+            self.notify_frontier(rewind=True)
+
+    def fetch_robots_txt(self, robots_url):
+        """Fetch robots.txt; returns ``(content, status_code, error_description)``."""
+        response_meta = {}
+        content, _, error_description = fetch_page(
+            robots_url,
+            proxies=self.get_proxies(robots_url),
+            session=self.session,
+            fetcher=self.fetcher,
+            response_meta=response_meta,
+            logger=self.logger,
+        )
+        return content, response_meta.get("status_code"), error_description
+
+    def apply_robots_crawl_delay(self, robots):
+        """Honour a robots.txt Crawl-delay that is slower than the configured delay."""
+        self.robots_crawl_delay = robots.crawl_delay
+        if self.robots_crawl_delay is None:
+            return
+        if self.throttle is not None:
+            self.throttle.min_delay = max(
+                self.throttle.min_delay, self.robots_crawl_delay
+            )
+        if self.robots_crawl_delay > self.crawl_delay:
+            self.set_crawl_delay(self.robots_crawl_delay)
+            self.logger.info(
+                f"Using crawl delay from robots.txt: {self.crawl_delay} seconds"
+            )
 
-        Returns:
-            tuple: (success, new_links, action)
+    def is_allowed_by_robots(self, current_url) -> bool:
+        """Return False (and log) if robots.txt disallows crawling the URL.
+
+        A disallowed URL is marked crawled without content, so the frontier
+        does not hand it out again before it is due for a re-crawl.
         """
-        # Check robots.txt
-        if self.robots_parser and not self.robots_parser.can_fetch(
-            self.config.user_agent, current_url
-        ):
+        if self.robots_parser and not self.robots_parser.is_allowed(current_url):
             self.logger.info(f"Skipping {current_url} due to robots.txt")
-            return None, set(), "skip"
+            update_queue_link(
+                self.database_name, current_url, None, None, logger=self.logger
+            )
+            return False
+        return True
+
+    def fetch(self, current_url, response_meta=None):
+        """Fetch a URL with this site's network settings.
+
+        Retriable failures are not retried inline; they are flagged in
+        ``response_meta`` and rescheduled by ``handle_fetch_result``. Re-crawls
+        are sent as conditional requests using the stored ETag / Last-Modified.
 
-        # Fetch the page
+        Returns:
+            tuple: (content, content_type, error_description) as returned by fetch_page.
+        """
         self.logger.info(f"Crawling: {current_url}")
-        content, content_type, error_description = fetch_page(
+        if response_meta is None:
+            response_meta = {}
+        proxies = self.get_proxies(current_url)
+        started = time.monotonic()
+        result = fetch_page(
             current_url,
-            proxies=self.proxy_provider.get_proxies(),
+            proxies=proxies,
             session=self.session,
+            fetcher=self.fetcher,
             logger=self.logger,
             js_rendering=self.config.js_rendering,
             js_driver=self.config.js_driver,
             auto_detect_js=self.config.auto_detect_js,
+            defer_retries=True,
+            response_meta=response_meta,
+            content_policy=self.content_policy,
+            **self.get_validators(current_url),
+        )
+        self.report_proxy_result(
+            proxies, time.monotonic() - started, result[2], response_meta
+        )
+        return result
+
+    def build_proxy_provider(self, logger=None):
+        """Create the proxy provider described by this site's configuration."""
+        return get_proxy_provider(
+            self.config.proxy,
+            sticky=self.config.proxy_sticky,
+            tor_isolation=self.config.tor_isolation,
+            tor_socks_ports=self.config.tor_socks_ports,
+            tor_control_port=self.config.tor_control_port,
+            tor_control_password=self.config.tor_control_password,
+            logger=logger,
+        )
+
+    def get_proxies(self, current_url, worker=None) -> dict:
+        """Ask the proxy provider which proxies to use for fetching ``current_url``."""
+        return self.proxy_provider.get_proxies(
+            {
+                "url": current_url,
+                "domain": self.domain,
+                "worker": worker or threading.current_thread().name,
+            }
+        )
+
+    def report_proxy_result(self, proxies, latency, error_description, response_meta):
+        """Tell the proxy provider how a fetch through ``proxies`` went.
+
+        HTTP answers count as a success for the proxy, even errors like a 404,
+        apart from proxy gateway errors (502/504). Bans (403/407/429) are
+        classified by the provider.
+        """
+        if not proxies:
+            return
+        response_meta = response_meta or {}
+        status_code = response_meta.get("status_code")
+        success = (
+            not error_description
+            or bool(response_meta.get("rejected"))
+            or (
+                status_code is not None
+                and status_code not in PROXY_FAILURE_STATUS_CODES
+            )
         )
+        self.proxy_provider.report_result(
+            proxies, latency, success, status_code=status_code
+        )
+
+    def get_validators(self, current_url) -> dict:
+        """Return the stored ETag / Last-Modified for a conditional re-crawl of the URL."""
+        return get_link_validators(self.database_name, current_url, logger=self.logger)
+
+    def log_transfer_stats(self):
+        """Log how many body bytes crossed the wire versus how many were decoded."""
+        stats = get_transfer_stats(self.database_name, self.domain, logger=self.logger)
+        if not stats["responses"]:
+            return
+        wire, decoded = stats["wire_bytes"], stats["decoded_bytes"]
+        saved = 100.0 * (1 - wire / decoded) if decoded else 0.0
+        self.logger.info(
+            f"Transfer stats for {self.domain}: {stats['responses']} responses, "
+            f"{wire} bytes on the wire, {decoded} bytes decoded "
+            f"({saved:.1f}% saved by compression)."
+        )
+
+    def log_trap_stats(self):
+        """Log the URL templates flagged as possible crawler traps during this crawl."""
+        if self.traps is None:
+            return
+        stats = self.traps.stats()
+        if not stats["flagged_templates"]:
+            return
+        self.logger.warning(
+            f"Crawler-trap stats for {self.domain}: {stats['parked']} URL(s) parked "
+            f"under {stats['flagged_templates']} template(s): {self.traps.summary()}"
+        )
+
+    def handle_fetch_result(
+        self,
+        current_url,
+        content,
+        content_type,
+        error_description,
+        response_meta=None,
+    ):
+        """Record a failed fetch or delegate a successful one to the content processor.
+
+        Returns:
+            tuple: (success, new_links, action)
+        """
+        if response_meta and response_meta.get("rejected"):
+            # Denied content type or over the size cap: record it as crawled without
+            # a body so it is not downloaded again before the next re-crawl.
+            mime_type = content_type.split(";")[0].strip() if content_type else None
+            update_queue_link(
+                self.database_name,
+                current_url,
+                None,
+                None,
+                status="crawled",
+                mime_type=mime_type,
+                logger=self.logger,
+            )
+            return None, set(), None
+
         if error_description:
             # Handle failure
             error_description_hash = compute_hash(error_description)
+            if response_meta and response_meta.get("retriable"):
+                # Transient failure: back off via the frontier, not a sleeping thread.
+                schedule_retry(
+                    self.database_name,
+                    current_url,
+                    error_description,
+                    error_description_hash,
+                    max_attempts=self.config.max_retries,
+                    backoff_base=self.config.retry_backoff,
+                    min_delay=response_meta.get("retry_after") or 0,
+                    logger=self.logger,
+                )
+                return None, set(), None
             update_queue_link(
                 self.database_name,
                 current_url,
@@ -211,8 +597,122 @@ class SiteCrawler:
             self.logger.info(f"Failed to crawl {current_url}: {error_description}")
             return None, set(), None
 
+        if response_meta and response_meta.get("wire_bytes") is not None:
+            record_transfer(
+                self.database_name,
+                self.domain,
+                current_url,
+                response_meta["wire_bytes"],
+                response_meta.get("decoded_bytes"),
+                logger=self.logger,
+            )
+
+        # The stored hash before this fetch tells whether the page changed.
+        previous_hash = get_content_hash(
+            self.database_name, current_url, logger=self.logger
+        )
+        if response_meta and response_meta.get("not_modified"):
+            # 304: nothing to download, parse or re-index; just refresh date_crawled.
+            mark_link_not_modified(self.database_name, current_url, logger=self.logger)
+            self.schedule_next_fetch(current_url, previous_hash)
+            return None, set(), None
+
         # Delegate parsing, duplicate detection, and storage to the content processor
-        return self.processor.process_page(self, current_url, content, content_type)
+        result = self.processor.process_page(self, current_url, content, content_type)
+        if result[0]:
+            self.schedule_next_fetch(current_url, previous_hash)
+        if result[0] and response_meta:
+            etag = response_meta.get("etag")
+            last_modified = response_meta.get("last_modified")
+            if etag or last_modified:
+                update_link_validators(
+                    self.database_name,
+                    current_url,
+                    etag=etag,
+                    last_modified=last_modified,
+                    logger=self.logger,
+                )
+        return result
+
+    def schedule_next_fetch(self, current_url, previous_hash):
+        """Set when a page just stored is fetched again, from whether it changed."""
+        source = current_url in self.discovery_sources
+        interval = schedule_next_fetch(
+            self.database_name,
+            current_url,
+            self.discovery_policy if source else self.recrawl_policy,
+            previous_hash=previous_hash,
+            logger=self.logger,
+        )
+        if interval is None:
+            return
+        if source:
+            self.logger.info(
+                f"Next poll of {current_url} in {interval * 60:g} minute(s)."
+            )
+        else:
+            self.logger.info(f"Next fetch of {current_url} in {interval:g} hour(s).")
+
+    def complete_page(
+        self,
+        current_url,
+        content,
+        content_type,
+        error_description,
+        response_meta=None,
+    ):
+        """Handle a fetch result and persist any newly discovered same-domain links.
+
+        This is the blocking, CPU/DB-bound half of a crawl step, shared by the
+        thread-pool workers and the asyncio engine (which runs it in an executor).
+        """
+        success, new_links, action = self.handle_fetch_result(
+            current_url, content, content_type, error_description, response_meta
+        )
+        if success and action is None and new_links:
+            depth = (
+                get_link_depth(self.database_name, current_url, logger=self.logger) + 1
+            )
+            priorities = self.score_links(new_links, depth)
+            save_links_to_db(
+                self.database_name,
+                self.domain,
+                list(new_links),
+                self.robots_parser,
+                re_crawl_time=self.re_crawl_time,
+                priorities=priorities,
+                depth=depth,
+                seen=self.seen_urls,
+                canonicalize=self.canonicalize_url,
+                traps=self.traps,
+                logger=self.logger,
+            )
+            self.notify_frontier(max(priorities.values()))
+            if self.config.discovery:
+                self.add_discovery_sources(getattr(new_links, "feeds", ()))
+                if current_url in self.discovery_sources:
+                    self.requeue_updated_links(new_links)
+        return success, new_links, action
+
+    def canonicalize_url(self, url) -> str:
+        """Return the canonical form of a discovered URL (unchanged if disabled)."""
+        if self.canonicalizer is None:
+            return url
+        return self.canonicalizer.canonicalize(url)
+
+    def score_links(self, links, depth):
+        """Return the frontier priority of each discovered link.
+
+        ``links`` may carry ``hints`` (a ``utils.LinkSet``) telling how each
+        link was found; links without one count as plain anchors.
+        """
+        hints = getattr(links, "hints", {})
+        return {
+            link: self.priority_policy.score(
+                link, depth, *hints.get(link, ("anchor", None))
+            )
+            for link in links
+        }
 
     def crawl_worker(self, current_url):
         """Fetch a single URL, save content, and enqueue discovered links.
@@ -223,28 +723,302 @@ class SiteCrawler:
         if self.shutdown_event.is_set():
             return current_url
 
-        success, new_links, action = self.crawl_page(current_url)
-        if success and action is None:
-            if new_links:
-                save_links_to_db(
-                    self.database_name,
-                    self.domain,
-                    list(new_links),
-                    self.robots_parser,
-                    re_crawl_time=self.re_crawl_time,
-                    logger=self.logger,
-                )
-        elif not success and action:
-            # Robot skip — no network request was made, skip delay
+        if not self.is_allowed_by_robots(current_url):
+            # Robot skip — no network request was made, no permit needed
             return current_url
 
-        # Respect the crawl delay after every real network request.
-        # Event.wait() blocks efficiently and wakes up instantly if a shutdown is requested.
+        # Block only until the host's rate limiter grants a permit. It returns
+        # early (False) if a shutdown is requested while waiting.
+        if not self.acquire_fetch_permit():
+            return current_url
+
+        self.fetch_and_complete(current_url)
+        return current_url
+
+    def fetch_and_complete(self, current_url):
+        """Fetch a URL whose fetch permit is already held, then process the result."""
+        response_meta = {}
+        content, content_type, error_description = self.timed_fetch(
+            current_url, response_meta
+        )
+        self.complete_page(
+            current_url, content, content_type, error_description, response_meta
+        )
+
+    def acquire_fetch_permit(self) -> bool:
+        """Wait for a fetch slot and the host's token bucket.
+
+        With AutoThrottle enabled, a concurrency slot is taken first; it is
+        given back by ``release_fetch_permit`` once the fetch is over.
+
+        Returns:
+            bool: False if shutdown was requested while waiting.
+        """
+        if self.throttle is not None and not self.throttle.acquire_slot(
+            self.shutdown_event
+        ):
+            return False
+        if self.rate_limiter is None:
+            granted = not self.shutdown_event.is_set()
+        else:
+            granted = self.rate_limiter.acquire(self.shutdown_event)
+        if not granted:
+            self.release_fetch_permit()
+        return granted
+
+    async def acquire_fetch_permit_async(self) -> bool:
+        """Asyncio counterpart of ``acquire_fetch_permit``."""
+        if self.throttle is not None and not await self.throttle.acquire_slot_async(
+            self.shutdown_event
+        ):
+            return False
+        if self.rate_limiter is None:
+            granted = not self.shutdown_event.is_set()
+        else:
+            granted = await self.rate_limiter.acquire_async(self.shutdown_event)
+        if not granted:
+            self.release_fetch_permit()
+        return granted
+
+    def release_fetch_permit(self):
+        """Give back the concurrency slot taken by ``acquire_fetch_permit``."""
+        if self.throttle is not None:
+            self.throttle.release_slot()
+
+    def timed_fetch(self, current_url, response_meta):
+        """Fetch a URL holding a permit, and report its latency to AutoThrottle."""
+        started = time.monotonic()
+        try:
+            result = self.fetch(current_url, response_meta=response_meta)
+        finally:
+            self.release_fetch_permit()
+        self.record_fetch_outcome(time.monotonic() - started, result[2], response_meta)
+        return result
+
+    def record_fetch_outcome(self, latency, error_description, response_meta):
+        """Feed a fetch's latency and status to AutoThrottle, if enabled.
+
+        Only server trouble (retriable failures and 5xx) counts as an error;
+        a 404 says nothing about how loaded the server is.
+        """
+        if self.throttle is None:
+            return
+        response_meta = response_meta or {}
+        status_code = response_meta.get("status_code")
+        failed = bool(error_description) and bool(
+            response_meta.get("retriable") or (status_code or 0) >= 500
+        )
+        self.throttle.record_response(
+            latency,
+            status_code=status_code,
+            failed=failed,
+            retry_after=response_meta.get("retry_after"),
+        )
+
+    def set_crawl_delay(self, delay):
+        """Change the request interval for this host at runtime."""
+        self.crawl_delay = delay
+        if self.rate_limiter is not None:
+            self.rate_limiter.set_delay(delay)
+
+    def build_throttle(self) -> AutoThrottle:
+        """Create the AutoThrottle, never going below a robots.txt Crawl-delay."""
+        min_delay = self.config.min_crawl_delay
+        if self.respect_robots and self.robots_crawl_delay is not None:
+            min_delay = max(min_delay, self.robots_crawl_delay)
+        max_delay = max(self.config.max_crawl_delay, min_delay)
+        throttle = AutoThrottle(
+            self.set_crawl_delay,
+            self.rate_limiter,
+            start_delay=self.crawl_delay,
+            min_delay=min_delay,
+            max_delay=max_delay,
+            max_concurrency=self.workers,
+            min_concurrency=self.config.min_workers,
+            logger=self.logger,
+        )
         self.logger.info(
-            f"Waiting for {self.crawl_delay} seconds before the next request..."
+            f"AutoThrottle enabled: delay {throttle.min_delay}-{throttle.max_delay}s "
+            f"(starting at {throttle.delay}s), concurrency "
+            f"{throttle.min_concurrency}-{throttle.max_concurrency}."
         )
-        self.shutdown_event.wait(self.crawl_delay)
-        return current_url
+        return throttle
+
+    def claim_pending_urls(self, limit):
+        """Claim up to ``limit`` pending URLs that are not already queued or in-flight.
+
+        The URLs are leased to this crawler in the database and registered in
+        ``self._queued_urls``; callers must call ``release_url`` once each one
+        has been processed.
+        """
+        with self._frontier_changed:
+            if self._frontier_rewind:
+                self._frontier_cursor.clear()
+                self._frontier_rewind = False
+        try:
+            # Claim the next batch of pending URLs (and any with an expired lease).
+            batch = load_pending_links(
+                self.database_name,
+                self.re_crawl_time,
+                limit=limit,
+                lease_owner=self.lease_owner,
+                lease_seconds=self.config.lease_timeout,
+                cursor=self._frontier_cursor,
+                logger=self.logger,
+            )
+        except Exception as e:
+            self.logger.error(f"Error querying pending links from database: {e}")
+            batch = []
+
+        # Filter out URLs that are already queued/in-flight to avoid duplicate crawling.
+        # Use a lock to ensure thread safety when reading/writing to self._queued_urls.
+        new_urls = []
+        with self._queue_lock:
+            for url in batch:
+                if url not in self._queued_urls:
+                    self._queued_urls.add(url)
+                    new_urls.append(url)
+        return new_urls
+
+    def release_url(self, url):
+        """Mark a queued URL as no longer in-flight so it can be re-queued if needed.
+
+        A URL that was not processed (robots.txt skip, shutdown, error) still
+        holds its lease; it is handed back to the frontier as 'pending'.
+        """
+        # A URL handed back to 'pending' may sort behind the scan cursor.
+        returned = release_lease(
+            self.database_name, url, self.lease_owner, logger=self.logger
+        )
+        with self._queue_lock:
+            self._queued_urls.discard(url)
+        self.notify_frontier(rewind=returned)
+
+    def notify_frontier(self, priority=None, rewind=False):
+        """Wake the feeder: the queue drained, links were saved or a URL was released.
+
+        ``priority`` is the highest priority among newly saved links; if it
+        reaches the scan cursor's, or ``rewind`` is set, the next claim starts
+        from the top of the frontier. New links at the cursor's priority have
+        higher ids, so they sort before it too.
+        """
+        with self._frontier_changed:
+            position = self._frontier_cursor.get("position")
+            if priority is not None and position is not None:
+                rewind = rewind or priority >= position[0]
+            self._frontier_rewind = self._frontier_rewind or rewind
+            self._frontier_dirty = True
+            self._frontier_changed.notify_all()
+        for listener in self.frontier_listeners:
+            listener()
+
+    def wait_for_frontier(self, timeout):
+        """Block the feeder until ``notify_frontier`` is called or ``timeout`` passes.
+
+        On a timeout the next claim rescans from the top, picking up retries
+        whose backoff ended behind the cursor.
+
+        Returns:
+            bool: True if notified, False on timeout.
+        """
+        with self._frontier_changed:
+            notified = self._frontier_dirty or self._frontier_changed.wait(timeout)
+            self._frontier_dirty = False
+            if not notified:
+                self._frontier_rewind = True
+        return notified
+
+    def feeder_idle_timeout(self) -> float:
+        """Longest the feeder sleeps without a notification.
+
+        It still wakes on its own to claim retries whose backoff has ended,
+        links saved by other crawlers sharing the database, and to renew leases.
+        """
+        return min(FEEDER_IDLE_TIMEOUT, self.config.lease_timeout / 3)
+
+    def renew_leases(self):
+        """Extend this crawler's leases once a third of ``lease_timeout`` has passed.
+
+        Called from the feeder loop, so queued URLs keep their claim however
+        long they wait, and the leases of a crashed crawler lapse on their own.
+        """
+        interval = self.config.lease_timeout / 3
+        if time.monotonic() - self._leases_renewed_at < interval:
+            return
+        self._leases_renewed_at = time.monotonic()
+        renew_leases(
+            self.database_name,
+            self.lease_owner,
+            lease_seconds=self.config.lease_timeout,
+            logger=self.logger,
+        )
+
+    def requeue_due_links(self):
+        """Return crawled links whose re-crawl window has passed to the frontier.
+
+        Only needed with the seen-URL filter: without it, saving a link found
+        again requeues it. Runs when the feeder starts and every
+        ``RECRAWL_SWEEP_INTERVAL`` seconds (or the shortest re-crawl interval,
+        if shorter).
+        """
+        if self.config.discovery:
+            self.requeue_due_sources()
+        if self.seen_urls is None:
+            return
+        policy = self.recrawl_policy
+        shortest = policy.min_hours if policy.adaptive else policy.initial_hours
+        interval = min(RECRAWL_SWEEP_INTERVAL, shortest * 3600)
+        now = time.monotonic()
+        if self._requeued_at is not None and now - self._requeued_at < interval:
+            return
+        self._requeued_at = now
+        requeued = requeue_due_links(
+            self.database_name, self.re_crawl_time, logger=self.logger
+        )
+        if requeued:
+            self.logger.info(f"Requeued {requeued} link(s) due for a re-crawl.")
+            self.notify_frontier(rewind=True)
+
+    def requeue_due_sources(self):
+        """Return the discovery sources due a poll to the frontier.
+
+        Runs with ``requeue_due_links``, at most every
+        ``DISCOVERY_SWEEP_INTERVAL`` seconds.
+        """
+        now = time.monotonic()
+        if (
+            self._sources_polled_at is not None
+            and now - self._sources_polled_at < DISCOVERY_SWEEP_INTERVAL
+        ):
+            return
+        self._sources_polled_at = now
+        requeued = requeue_due_sources(
+            self.database_name, self.discovery_policy.min_hours, logger=self.logger
+        )
+        if requeued:
+            self.logger.info(f"Polling {requeued} discovery source(s).")
+            self.notify_frontier(rewind=True)
+
+    def has_in_flight_urls(self) -> bool:
+        """Return True while any claimed URL is still queued or being processed."""
+        with self._queue_lock:
+            return bool(self._queued_urls)
+
+    def is_crawl_complete(self) -> bool:
+        """Return True once nothing is in flight and no backoff-delayed retry is waiting.
+
+        URLs leased by other crawlers sharing the database count as in flight:
+        if such a crawler dies, its leases expire and this one claims them.
+        Only meaningful after ``claim_pending_urls`` returned no URLs. A crawl
+        in discovery mode never completes: it polls its sources until stopped.
+        """
+        if self.config.discovery:
+            return False
+        if self.has_in_flight_urls():
+            return False
+        if count_leased_links(self.database_name, logger=self.logger):
+            return False
+        return not has_scheduled_retries(self.database_name, logger=self.logger)
 
     def _feeder_loop(self, q):
         """Background thread logic to continuously load pending URLs from SQLite
@@ -256,6 +1030,8 @@ class SiteCrawler:
 
         try:
             while not self.shutdown_event.is_set():
+                self.renew_leases()
+                self.requeue_due_links()
                 # Check how many items are currently buffered in the queue.
                 # We want to maintain a healthy backlog without filling memory.
                 current_queued = q.qsize()
@@ -264,28 +1040,7 @@ class SiteCrawler:
                 # If the queue buffer drops below self.batch_size, fetch more URLs.
                 if current_queued < self.batch_size:
                     limit = target_fill - current_queued
-                    try:
-                        # Query SQLite for the next batch of pending URLs.
-                        batch = load_pending_links(
-                            self.database_name,
-                            self.re_crawl_time,
-                            limit=limit,
-                            logger=self.logger,
-                        )
-                    except Exception as e:
-                        self.logger.error(
-                            f"Error querying pending links from database: {e}"
-                        )
-                        batch = []
-
-                    # Filter out URLs that are already queued/in-flight to avoid duplicate crawling.
-                    # Use a lock to ensure thread safety when reading/writing to self._queued_urls.
-                    new_urls = []
-                    with self._queue_lock:
-                        for url in batch:
-                            if url not in self._queued_urls:
-                                self._queued_urls.add(url)
-                                new_urls.append(url)
+                    new_urls = self.claim_pending_urls(limit)
 
                     # Push the filtered new URLs into the queue.
                     if new_urls:
@@ -294,21 +1049,19 @@ class SiteCrawler:
                         self.logger.info(
                             f"Queued {len(new_urls)} new URLs. Queue size: {q.qsize()}"
                         )
-                    else:
-                        # If no new links are found in the database, check if any URLs are still being processed.
-                        # If all queued/in-flight URLs are finished, and database has no more URLs, crawling is complete.
-                        with self._queue_lock:
-                            if not self._queued_urls:
-                                self.logger.info(
-                                    "No pending links remaining and all workers finished. Crawl complete."
-                                )
-                                self.shutdown_event.set()  # Signal workers and main thread to exit
-                                break
-
-                # Sleep briefly (0.5s) to avoid pegging CPU/Database when the queue is full.
-                # Event.wait(timeout) is used here because it is a non-blocking interruptible sleep.
-                # If shutdown_event is set during this sleep, it wakes up instantly instead of waiting out the timeout.
-                self.shutdown_event.wait(timeout=0.5)
+                    elif self.is_crawl_complete():
+                        # If no new links are found in the database, all queued/in-flight
+                        # URLs are finished and no retry is scheduled, crawling is complete.
+                        self.logger.info(
+                            "No pending links remaining and all workers finished. Crawl complete."
+                        )
+                        self.shutdown_event.set()  # Signal workers and main thread to exit
+                        break
+
+                # Sleep until a worker drains the queue, saves links or releases
+                # a URL (or the idle timeout passes) instead of polling the
+                # database. Workers exiting on shutdown notify it as well.
+                self.wait_for_frontier(self.feeder_idle_timeout())
         finally:
             close_thread_connections()
             self.logger.info("Database queue feeder thread stopped.")
@@ -328,6 +1081,9 @@ class SiteCrawler:
                     url = q.get(timeout=1.0)
                 except queue.Empty:
                     continue
+                if q.qsize() < self.batch_size:
+                    # Ask the feeder for a refill while this URL is processed.
+                    self.notify_frontier()
 
                 try:
                     # Execute the crawl, page fetch, parsing, and link extraction.
@@ -338,39 +1094,58 @@ class SiteCrawler:
                     )
                 finally:
                     # Mark the item as done to update the queue's task tracker.
-                    # Remove the URL from self._queued_urls inside a lock so the feeder thread
-                    # knows it is no longer in-flight and can re-crawled/re-queued if needed.
-                    with self._queue_lock:
-                        self._queued_urls.discard(url)
+                    # Remove the URL from self._queued_urls so the feeder thread knows it
+                    # is no longer in-flight and can be re-crawled/re-queued if needed.
+                    self.release_url(url)
                     q.task_done()
         finally:
+            self.notify_frontier()
             close_thread_connections()
 
-    def crawl(self):
-        """Crawl the site starting from the given URL using a Producer-Consumer thread pool."""
+    def start(self):
+        """Prepare the crawl: logging, database, robots.txt, frontier and rate limits.
+
+        Called by ``crawl``, or by ``scheduler.GlobalScheduler``, which then
+        feeds the site's URLs to its shared worker pool. ``finish`` must be
+        called afterwards, even if this raises.
+        """
         # Register crawler instance for centralized shutdown
         with _active_crawlers_lock:
             _active_crawlers.append(self)
 
+        self.initialize()
+        self.prepare_queue()
+        if self.robots_parser is not None:
+            self.robots_parser.start_refresh(self.shutdown_event)
+
+        if self.config.http_cache == "replay":
+            # Nothing reaches the server, so there is no politeness to keep.
+            self.crawl_delay = 0
+            self.logger.info("Replaying from the HTTP cache without crawl delay.")
+
+        # All workers draw fetch permits from one per-host token bucket, so the
+        # request rate stays at 1 / crawl_delay whatever the worker count.
+        self.rate_limiter = get_rate_limiter(self.domain, self.crawl_delay)
+        self.logger.info(
+            f"Rate limiting {self.domain} to one request every "
+            f"{self.rate_limiter.delay}s across {self.workers} worker(s)."
+        )
+        if self.config.auto_throttle and self.config.http_cache != "replay":
+            self.throttle = self.build_throttle()
+
+    def crawl(self):
+        """Crawl the site starting from the given URL using a Producer-Consumer thread pool."""
         try:
-            self.initialize()
-            self.prepare_queue()
-
-            # Apply worker constraints and delay auto-scaling.
-            if self.workers > 1:
-                if self.robots_delay_applied:
-                    self.logger.warning(
-                        f"robots.txt specifies a crawl delay of {self.crawl_delay}s. "
-                        f"Forcing --workers to 1 to honour it."
-                    )
-                    self.workers = 1
-                else:
-                    scaled_delay = self.crawl_delay * self.workers
-                    self.logger.info(
-                        f"Scaling crawl delay from {self.crawl_delay}s to {scaled_delay}s "
-                        f"({self.workers} workers × {self.crawl_delay}s) to maintain server load."
-                    )
-                    self.crawl_delay = scaled_delay
+            self.start()
+
+            if self.config.engine == "async":
+                # Asyncio engine: one event loop multiplexes all fetches for this site.
+                from async_engine import AsyncCrawlRunner
+
+                AsyncCrawlRunner(self).run()
+                if self.shutdown_event.is_set():
+                    self.logger.info("Crawl execution halted or completed.")
+                return
 
             # Initialize a thread-safe Queue. We bound its capacity to (batch_size * 2)
             # to limit memory overhead and prevent querying too far ahead.
@@ -413,14 +1188,57 @@ class SiteCrawler:
                 self.logger.info("Crawl execution halted or completed.")
 
         finally:
-            # Close connection session if instantiated
-            if getattr(self, "session", None) is not None:
-                self.session.close()
+            self.finish()
+
+    def finish(self):
+        """Release the crawl's resources and log its statistics (see ``start``)."""
+        if getattr(self, "fetcher", None) is not None:
+            self.fetcher.close()
+        # The workers have drained: hand URLs claimed but never fetched back
+        # now, so a --resume run need not wait for their leases to expire.
+        released = release_owner_leases(
+            self.database_name, self.lease_owner, logger=self.logger
+        )
+        if released:
+            self.logger.info(f"Released {released} unfetched URL lease(s).")
+        if self.seen_urls is not None:
+            self.seen_urls.save()
+
+        if self.logger is not None:
+            self.log_transfer_stats()
+            self.log_trap_stats()
+            if hasattr(self.proxy_provider, "summary"):
+                self.logger.info(f"Proxy pool stats: {self.proxy_provider.summary()}")
+
+        # Report connection reuse and close the pool if this crawler owns it
+        if getattr(self, "session", None) is not None:
+            self.logger.info(
+                f"Connection pool stats: {self.connection_pool.stats.summary()}"
+            )
+            if self._owns_connection_pool:
+                self.connection_pool.close()
 
-            # Unregister crawler instance
-            with _active_crawlers_lock:
-                if self in _active_crawlers:
-                    _active_crawlers.remove(self)
+        # Unregister crawler instance
+        with _active_crawlers_lock:
+            if self in _active_crawlers:
+                _active_crawlers.remove(self)
+
+
+def merge_duplicate_urls(start_url, config):
+    """Merge a site's stored links that share a canonical form (``--merge-duplicate-urls``)."""
+    domain = urlparse(start_url).netloc
+    database_name = get_database_name(domain, config.db_dir)
+    logger = logging.getLogger(f"crawler.{domain}")
+    init_db(database_name, logger=logger)
+    stats = merge_duplicate_links(
+        database_name,
+        UrlCanonicalizer.from_config(config).canonicalize,
+        logger=logger,
+    )
+    print(
+        f"{domain}: merged {stats['merged']} duplicate link(s) and renamed "
+        f"{stats['renamed']} to their canonical form."
+    )
 
 
 def _handle_sigint(signum, frame):
@@ -453,11 +1271,85 @@ def _handle_sigint(signum, frame):
             crawler.shutdown_event.set()
 
 
-def main():
-    """Main function to handle command-line arguments and start crawling."""
+def install_sigint_handler():
+    """Route Ctrl+C to ``_handle_sigint``: graceful first, forced on the second."""
     global _original_sigint_handler
     _original_sigint_handler = signal.getsignal(signal.SIGINT)
     signal.signal(signal.SIGINT, _handle_sigint)
+
+
+def crawl_sites(sites_list, base_config, global_workers=None):
+    """Crawl the sites of a configuration file in parallel.
+
+    Args:
+        sites_list (list): Site dicts, each with a 'url'.
+        base_config (CrawlerConfig): Defaults the site dicts are merged into.
+        global_workers (int): Serve all sites from one worker pool of this
+                              size (see scheduler.py; 0: sized automatically).
+                              None runs a thread pool per site.
+    """
+    # Build the per-site crawler instances using merged configs. They all
+    # share one connection pool, sized for the busiest site.
+    site_configs = [base_config.merge_with_dict(site) for site in sites_list]
+    pool_config = base_config.merge_with_dict(
+        {"workers": max([cfg.workers for cfg in site_configs] or [base_config.workers])}
+    )
+    shared_pool = ConnectionPool.from_config(pool_config, sites=len(site_configs))
+    crawlers = [
+        SiteCrawler(
+            start_url=site["url"],
+            config=site_config,
+            connection_pool=shared_pool,
+        )
+        for site, site_config in zip(sites_list, site_configs)
+    ]
+
+    if global_workers is not None:
+        # One dispatcher and one worker pool for all sites.
+        from scheduler import GlobalScheduler
+
+        print(f"\nLaunching {len(crawlers)} site crawl(s) on one worker pool...")
+        try:
+            GlobalScheduler(crawlers, workers=global_workers).run()
+        except (KeyboardInterrupt, SystemExit):
+            print("\nCrawl execution interrupted by user. Exiting.")
+        print(f"\nShared connection pool stats: {shared_pool.stats.summary()}")
+        shared_pool.close()
+        return
+
+    def _crawl_site_task(crawler_instance):
+        """Thread entry point: crawl one site and return its URL."""
+        print(f"\n=== Starting crawl for: {crawler_instance.start_url} ===")
+        try:
+            crawler_instance.crawl()
+        except Exception as e:
+            print(f"Failed to crawl site {crawler_instance.start_url}: {e}")
+        return crawler_instance.start_url
+
+    # Run all site crawls in parallel
+    print(f"\nLaunching {len(crawlers)} site crawl(s) in parallel...")
+    with ThreadPoolExecutor(max_workers=len(crawlers)) as site_executor:
+        site_futures = {
+            site_executor.submit(_crawl_site_task, crawler): crawler.start_url
+            for crawler in crawlers
+        }
+        for future in as_completed(site_futures):
+            url = site_futures[future]
+            try:
+                future.result()
+                print(f"\n=== Crawl finished for: {url} ===")
+            except (KeyboardInterrupt, SystemExit):
+                print("\nCrawl execution interrupted by user. Exiting.")
+                break
+            except Exception as e:
+                print(f"Unhandled error for {url}: {e}")
+    print(f"\nShared connection pool stats: {shared_pool.stats.summary()}")
+    shared_pool.close()
+
+
+def main():
+    """Main function to handle command-line arguments and start crawling."""
+    install_sigint_handler()
     default_cfg = CrawlerConfig()
 
     parser = argparse.ArgumentParser(
@@ -474,6 +1366,15 @@ def main():
         action="store_true",
         help="Respect robots.txt when crawling.",
     )
+    parser.add_argument(
+        "--robots-ttl",
+        type=float,
+        default=default_cfg.robots_ttl,
+        help=(
+            "Hours a fetched robots.txt is cached in the database and trusted "
+            "before it is fetched again, also during a running crawl (default: 24)."
+        ),
+    )
     parser.add_argument(
         "--no-duplicates",
         action="store_true",
@@ -485,6 +1386,33 @@ def main():
         default=default_cfg.crawl_delay,
         help="Crawl delay in seconds (default: 30). If robots.txt specifies a delay, it will override this.",
     )
+    parser.add_argument(
+        "--auto-throttle",
+        action="store_true",
+        help=(
+            "Adapt the crawl delay and the number of concurrent fetches to the "
+            "server's latency and error rate, starting from --crawl-delay and backing "
+            "off on 429/503 (honouring Retry-After)."
+        ),
+    )
+    parser.add_argument(
+        "--min-crawl-delay",
+        type=float,
+        default=default_cfg.min_crawl_delay,
+        help="Lowest delay in seconds AutoThrottle may use (default: 1.0; never below a robots.txt Crawl-delay).",
+    )
+    parser.add_argument(
+        "--max-crawl-delay",
+        type=float,
+        default=default_cfg.max_crawl_delay,
+        help="Highest delay in seconds AutoThrottle may back off to (default: 120).",
+    )
+    parser.add_argument(
+        "--min-workers",
+        type=int,
+        default=default_cfg.min_workers,
+        help="Lowest number of concurrent fetches AutoThrottle may use; --workers is the highest (default: 1).",
+    )
     parser.add_argument(
         "--resume",
         action="store_true",
@@ -492,9 +1420,57 @@ def main():
     )
     parser.add_argument(
         "--re-crawl-time",
-        type=int,
-        default=int(default_cfg.re_crawl_time),
-        help="Time in hours after which a link should be re-crawled (default: 3).",
+        type=float,
+        default=default_cfg.re_crawl_time,
+        help="Time in hours after which a link should be re-crawled the first "
+        "time; later intervals adapt to how often the page changes (default: 3).",
+    )
+    parser.add_argument(
+        "--min-re-crawl-time",
+        type=float,
+        default=default_cfg.min_re_crawl_time,
+        help="Shortest adaptive re-crawl interval in hours (default: 0.5).",
+    )
+    parser.add_argument(
+        "--max-re-crawl-time",
+        type=float,
+        default=default_cfg.max_re_crawl_time,
+        help="Longest adaptive re-crawl interval in hours (default: 720).",
+    )
+    parser.add_argument(
+        "--no-adaptive-recrawl",
+        dest="adaptive_recrawl",
+        action="store_false",
+        help="Re-crawl every page every --re-crawl-time hours instead of "
+        "adapting the interval to how often it changes.",
+    )
+    parser.set_defaults(adaptive_recrawl=default_cfg.adaptive_recrawl)
+    parser.add_argument(
+        "--discovery",
+        action="store_true",
+        help="Discovery mode: poll the site's feeds and sitemaps and crawl only "
+        "new links and links they report as updated. Runs until stopped.",
+    )
+    parser.add_argument(
+        "--discovery-feeds",
+        type=str,
+        default=None,
+        help="Comma-separated feed / sitemap URLs to poll in discovery mode, in "
+        "addition to the robots.txt sitemaps and the feeds pages link to.",
+    )
+    parser.add_argument(
+        "--discovery-min-interval",
+        type=float,
+        default=default_cfg.discovery_min_interval,
+        help="Shortest interval between polls of a feed or sitemap, in minutes "
+        "(default: 5).",
+    )
+    parser.add_argument(
+        "--discovery-max-interval",
+        type=float,
+        default=default_cfg.discovery_max_interval,
+        help="Longest interval between polls of a feed or sitemap, in minutes "
+        "(default: 360).",
     )
     parser.add_argument(
         "--logs-dir",
@@ -514,17 +1490,193 @@ def main():
         default=default_cfg.batch_size,
         help="Number of pending links to load from the database per batch (default: 100).",
     )
+    parser.add_argument(
+        "--no-seen-filter",
+        dest="seen_filter",
+        action="store_false",
+        help="Send every discovered link to the database instead of dropping the "
+        "ones a Bloom filter of known links has seen.",
+    )
+    parser.set_defaults(seen_filter=default_cfg.seen_filter)
+    parser.add_argument(
+        "--seen-filter-capacity",
+        type=int,
+        default=default_cfg.seen_filter_capacity,
+        help="Number of links the seen-URL filter is first sized for; it doubles "
+        "when full (default: 1000000).",
+    )
+    parser.add_argument(
+        "--no-canonicalize-urls",
+        dest="canonicalize_urls",
+        action="store_false",
+        help="Store discovered URLs as found instead of in their canonical form "
+        "(tracking parameters removed, query sorted, encoding normalized).",
+    )
+    parser.set_defaults(canonicalize_urls=default_cfg.canonicalize_urls)
+    parser.add_argument(
+        "--no-trap-detection",
+        dest="trap_detection",
+        action="store_false",
+        help="Do not group discovered URLs into templates to cap crawler traps "
+        "(calendars, endless pagination, session ids, faceted search).",
+    )
+    parser.set_defaults(trap_detection=default_cfg.trap_detection)
+    parser.add_argument(
+        "--trap-budget",
+        type=int,
+        default=default_cfg.trap_budget,
+        help="URLs of one URL template admitted to the frontier before further "
+        "ones are parked; 0 means no limit (default: 10000).",
+    )
+    parser.add_argument(
+        "--merge-duplicate-urls",
+        action="store_true",
+        help="Do not crawl: merge the links stored in each site's database that "
+        "have the same canonical form, then exit.",
+    )
     parser.add_argument(
         "--workers",
         type=int,
         default=default_cfg.workers,
         help=(
             "Number of parallel worker threads (default: 1 = single-threaded). "
-            "The crawl delay is automatically scaled by this factor so the "
-            "effective request rate to the server remains unchanged. "
-            "Forced to 1 when robots.txt specifies a Crawl-delay."
+            "All workers share the host's rate limit of one request every "
+            "--crawl-delay seconds."
+        ),
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        default=default_cfg.engine,
+        choices=["threads", "async"],
+        help=(
+            "Fetch engine (default: threads). 'threads' runs one OS thread per "
+            "in-flight request; 'async' multiplexes all fetches of a site on an "
+            "asyncio event loop (requires httpx), with --workers setting the number "
+            "of concurrent requests and parsing running in a thread pool."
+        ),
+    )
+    parser.add_argument(
+        "--global-workers",
+        type=int,
+        nargs="?",
+        const=0,
+        default=None,
+        help=(
+            "With --config, serve all sites from one pool of this many worker "
+            "threads, fed from per-domain politeness queues, instead of one "
+            "thread pool per site. Without a value (or 0) the pool is sized to "
+            "the CPUs and the sites' --workers (at most 64). Each site's "
+            "--workers still caps its concurrent fetches."
+        ),
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help=(
+            "With --config, shard the sites across this many worker processes "
+            "run by a supervisor, which restarts crashed ones with --resume and "
+            "reports their combined progress (default: one process)."
+        ),
+    )
+    parser.add_argument(
+        "--fetcher",
+        type=str,
+        default=default_cfg.fetcher,
+        choices=["requests", "http2"],
+        help=(
+            "HTTP backend used for fetches (default: requests). 'http2' multiplexes "
+            "all requests to a domain over one HTTP/2 connection (requires httpx[http2])."
+        ),
+    )
+    parser.add_argument(
+        "--http-cache",
+        type=str,
+        default=default_cfg.http_cache,
+        choices=["off", "record", "replay"],
+        help=(
+            "HTTP cache mode (default: off). 'record' stores every response in a "
+            "per-domain cache file; 'replay' serves responses from it without any "
+            "network access or crawl delay."
+        ),
+    )
+    parser.add_argument(
+        "--http-cache-dir",
+        type=str,
+        default=default_cfg.http_cache_dir,
+        help="Directory for the HTTP cache files (default: http_cache).",
+    )
+    parser.add_argument(
+        "--warc-dir",
+        type=str,
+        default=default_cfg.warc_dir,
+        help=(
+            "Write every fetched request/response pair to rotating WARC/1.1 files "
+            "in this directory, indexed by URL and date in the crawler database "
+            "(default: off)."
+        ),
+    )
+    parser.add_argument(
+        "--warc-max-size",
+        type=int,
+        default=default_cfg.warc_max_size,
+        help="Start a new WARC file once the current one reaches this many bytes (default: 1 GiB).",
+    )
+    parser.add_argument(
+        "--lease-timeout",
+        type=int,
+        default=default_cfg.lease_timeout,
+        help=(
+            "Seconds a claimed URL stays leased to a crawler that stops renewing "
+            "its leases (e.g. after a crash) before another may claim it (default: 300)."
+        ),
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=default_cfg.max_retries,
+        help=(
+            "Attempts per URL for transient failures (504, timeouts, SSL and "
+            "connection errors) before waiting for the next re-crawl (default: 3)."
+        ),
+    )
+    parser.add_argument(
+        "--retry-backoff",
+        type=int,
+        default=default_cfg.retry_backoff,
+        help=(
+            "Seconds before retrying a transiently failed URL; doubles per attempt "
+            "(default: 60). Workers move on to other URLs meanwhile."
         ),
     )
+    parser.add_argument(
+        "--max-content-bytes",
+        type=int,
+        default=default_cfg.content_size_limits.get("*"),
+        help=(
+            "Default per-response byte cap; larger bodies are not downloaded "
+            "(default: 10485760). Per-MIME caps can be set with "
+            "'content_size_limits' in the JSON configuration."
+        ),
+    )
+    parser.add_argument(
+        "--allow-content-types",
+        type=str,
+        default=None,
+        help="Comma-separated MIME patterns to download (e.g. 'text/*,application/xml'). Default: all.",
+    )
+    parser.add_argument(
+        "--deny-content-types",
+        type=str,
+        default=None,
+        help="Comma-separated MIME patterns never to download (e.g. 'video/*,application/pdf').",
+    )
+    parser.add_argument(
+        "--head-probe",
+        action="store_true",
+        help="Send a HEAD request first for URLs whose extension suggests a binary file.",
+    )
     parser.add_argument(
         "--parser",
         type=str,
@@ -560,7 +1712,44 @@ def main():
         "--proxy",
         type=str,
         default=default_cfg.proxy,
-        help="Proxy setting for crawling the URL (e.g. 'tor', 'http://127.0.0.1:8080'). Defaults to direct connection.",
+        help=(
+            "Proxy setting for crawling the URL (e.g. 'tor', 'http://127.0.0.1:8080'). "
+            "Several comma-separated proxy URLs form a health-scored proxy pool. "
+            "Defaults to direct connection."
+        ),
+    )
+    parser.add_argument(
+        "--proxy-sticky",
+        action="store_true",
+        help="With a proxy pool, keep each domain on the same proxy while it stays healthy.",
+    )
+    parser.add_argument(
+        "--tor-isolation",
+        type=str,
+        default=default_cfg.tor_isolation,
+        choices=["worker", "domain", "none"],
+        help=(
+            "With --proxy tor, give each worker (default) or each domain its own "
+            "Tor circuit via distinct SOCKS credentials (IsolateSOCKSAuth)."
+        ),
+    )
+    parser.add_argument(
+        "--tor-socks-ports",
+        type=str,
+        default=None,
+        help="Comma-separated Tor SocksPorts to spread circuits over (default: 9050).",
+    )
+    parser.add_argument(
+        "--tor-control-port",
+        type=int,
+        default=default_cfg.tor_control_port,
+        help="Tor ControlPort; when set, NEWNYM is sent after repeated failures.",
+    )
+    parser.add_argument(
+        "--tor-control-password",
+        type=str,
+        default=default_cfg.tor_control_password,
+        help="Password for the Tor ControlPort (HashedControlPassword).",
     )
 
     def str_to_bool(value):
@@ -577,7 +1766,19 @@ def main():
         "--keep-alive",
         type=str_to_bool,
         default=default_cfg.keep_alive,
-        help="Enable/disable HTTP Keep-Alive connection pooling (true/false). Default: None (enable for direct connection, disable for proxy).",
+        help="Enable/disable HTTP Keep-Alive connection pooling (true/false). Default: enabled, for proxied connections too.",
+    )
+    parser.add_argument(
+        "--pool-connections",
+        type=int,
+        default=default_cfg.pool_connections,
+        help="Number of per-host connection pools to keep (default: max(10, number of sites)).",
+    )
+    parser.add_argument(
+        "--pool-maxsize",
+        type=int,
+        default=default_cfg.pool_maxsize,
+        help="Maximum keep-alive connections per host (default: the number of workers).",
     )
     parser.add_argument(
         "--processor",
@@ -611,12 +1812,16 @@ def main():
         parser.error("one of the following arguments is required: --url or --config")
     if args.url and args.config:
         parser.error("arguments --url and --config are mutually exclusive")
+    if args.processes is not None and (args.processes < 1 or not args.config):
+        parser.error("--processes requires --config and at least 1 process")
 
     # Build base config from CLI arguments
     base_config = CrawlerConfig.from_args(args)
 
     try:
-        if args.url:
+        if args.url and args.merge_duplicate_urls:
+            merge_duplicate_urls(args.url, base_config)
+        elif args.url:
             # Start crawling the single URL
             crawler = SiteCrawler(start_url=args.url, config=base_config)
             crawler.crawl()
@@ -660,39 +1865,27 @@ def main():
                         f"Item at index {i} in configuration file is missing the required 'url' field."
                     )
 
-            # Build the per-site crawler instances using merged configs
-            crawlers = []
-            for site in sites_list:
-                site_config = base_config.merge_with_dict(site)
-                crawler = SiteCrawler(start_url=site["url"], config=site_config)
-                crawlers.append(crawler)
+            if args.merge_duplicate_urls:
+                for site in sites_list:
+                    merge_duplicate_urls(site["url"], base_config.merge_with_dict(site))
+                return
+
+            if args.processes:
+                # Shard the sites across worker processes (see supervisor.py).
+                from supervisor import Supervisor
 
-            def _crawl_site_task(crawler_instance):
-                """Thread entry point: crawl one site and return its URL."""
-                print(f"\n=== Starting crawl for: {crawler_instance.start_url} ===")
                 try:
-                    crawler_instance.crawl()
-                except Exception as e:
-                    print(f"Failed to crawl site {crawler_instance.start_url}: {e}")
-                return crawler_instance.start_url
-
-            # Run all site crawls in parallel
-            print(f"\nLaunching {len(crawlers)} site crawl(s) in parallel...")
-            with ThreadPoolExecutor(max_workers=len(crawlers)) as site_executor:
-                site_futures = {
-                    site_executor.submit(_crawl_site_task, crawler): crawler.start_url
-                    for crawler in crawlers
-                }
-                for future in as_completed(site_futures):
-                    url = site_futures[future]
-                    try:
-                        future.result()
-                        print(f"\n=== Crawl finished for: {url} ===")
-                    except (KeyboardInterrupt, SystemExit):
-                        print("\nCrawl execution interrupted by user. Exiting.")
-                        break
-                    except Exception as e:
-                        print(f"Unhandled error for {url}: {e}")
+                    Supervisor(
+                        sites_list,
+                        base_config,
+                        args.processes,
+                        global_workers=args.global_workers,
+                    ).run()
+                except KeyboardInterrupt:
+                    print("\nCrawl execution interrupted by user. Exiting.")
+                return
+
+            crawl_sites(sites_list, base_config, global_workers=args.global_workers)
     finally:
         print("\nWaiting for plagiarism indexing background tasks to complete...")
         SimilarityIndexer.shutdown()
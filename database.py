@@ -1,8 +1,10 @@
+import base64
+import binascii
+import re
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
-from config import CrawlerConfig
-from utils import ensure_directory_exists
+from utils import compute_hash, ensure_directory_exists
 import os
 import threading
 
@@ -54,6 +56,51 @@ def get_database_name(domain, db_dir, logger=None):
     return os.path.join(db_dir, f"crawled_data_{domain}.db")
 
 
+# Columns added to crawled_data after its initial schema, as (name, definition).
+# init_db adds any that are missing with ALTER TABLE, in this order.
+_CRAWLED_DATA_ADDED_COLUMNS = [
+    ("mime_type", "TEXT"),
+    # Retry bookkeeping: failed attempts since the last success, and the
+    # earliest time the scheduler may hand the link out again.
+    ("attempts", "INTEGER NOT NULL DEFAULT 0"),
+    ("next_attempt_at", "DATETIME"),
+    # HTTP validators of the stored copy, used for conditional GET re-crawls.
+    ("etag", "TEXT"),
+    ("last_modified", "TEXT"),
+    # Raw bytes of binary responses; `content` only ever holds text.
+    ("content_blob", "BLOB"),
+    # Body size of the last fetch as received (possibly compressed) and after decoding.
+    ("wire_bytes", "INTEGER"),
+    ("decoded_bytes", "INTEGER"),
+    # Lease of an 'in_progress' link: the crawler that claimed it and when the
+    # claim lapses, after which any crawler may claim the link again.
+    ("leased_by", "TEXT"),
+    ("lease_expires_at", "DATETIME"),
+    # Frontier order (higher first), scored at discovery, and link hops from
+    # the start URL.
+    ("priority", "INTEGER NOT NULL DEFAULT 0"),
+    ("depth", "INTEGER"),
+    # Path/query template the link was grouped under by the trap detector.
+    ("url_template", "TEXT"),
+    # Adaptive re-crawl schedule (see recrawl.py): hours between visits,
+    # adjusted on every fetch, and when the crawled link is due again.
+    ("recrawl_interval", "REAL"),
+    ("next_fetch_at", "DATETIME"),
+    # 1 for the feeds and sitemaps polled by the discovery mode.
+    ("discovery_source", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+# Allowed values of crawled_data.status. 'parked' links are known but held
+# back from the frontier (their URL template is over its trap budget).
+_STATUS_CHECK = "CHECK(status IN ('pending', 'in_progress', 'crawled', 'parked'))"
+
+# UPDATE ... RETURNING (used to claim links atomically) needs SQLite 3.35.
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# PRAGMA user_version reached once the Base64 -> BLOB migration has run.
+_BASE64_MIGRATION_VERSION = 1
+
+
 def init_db(database_name, logger=None):
     """Initialize the SQLite database and create the table if it doesn't exist."""
     if logger is None:
@@ -74,17 +121,23 @@ def init_db(database_name, logger=None):
                 mime_type TEXT,
                 content TEXT,
                 content_hash TEXT,
-                status TEXT NOT NULL CHECK(status IN ('pending', 'crawled'))
+                status TEXT NOT NULL CHECK(status IN ('pending', 'in_progress', 'crawled', 'parked'))
             )
             """
         )
-        # Check if the mime_type column exists (for auto-migration of existing databases)
+        # Add columns introduced after the initial schema (auto-migration of existing databases)
         cursor.execute("PRAGMA table_info(crawled_data)")
         columns = [row[1] for row in cursor.fetchall()]
-        if "mime_type" not in columns:
-            cursor.execute("ALTER TABLE crawled_data ADD COLUMN mime_type TEXT")
-            if logger:
-                logger.info("Auto-migration: added mime_type column to crawled_data.")
+        for column_name, column_def in _CRAWLED_DATA_ADDED_COLUMNS:
+            if column_name not in columns:
+                cursor.execute(
+                    f"ALTER TABLE crawled_data ADD COLUMN {column_name} {column_def}"
+                )
+                if logger:
+                    logger.info(
+                        f"Auto-migration: added {column_name} column to crawled_data."
+                    )
+        _migrate_status_check(conn, logger)
 
         # Ensure idx_link is a UNIQUE index for UPSERT compatibility and data integrity.
         cursor.execute(
@@ -117,6 +170,19 @@ def init_db(database_name, logger=None):
             logger.info("Auto-migration: created UNIQUE index idx_link.")
         # Create an index on the status column
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_status ON crawled_data (status)")
+        # The feeder claims pending links in priority order straight off this index.
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_status_priority ON crawled_data (status, priority)"
+        )
+        # Due discovery sources (feeds, sitemaps); only those rows are indexed.
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_discovery_due ON crawled_data (next_fetch_at) "
+            "WHERE discovery_source = 1"
+        )
+        # Per-template link counts of the trap detector (see traps.py).
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_template_status ON crawled_data (url_template, status)"
+        )
         # Create an index on the link, status columns
         cursor.execute(
             "CREATE INDEX IF NOT EXISTS idx_link_status ON crawled_data (link, status)"
@@ -154,8 +220,167 @@ def init_db(database_name, logger=None):
         cursor.execute(
             "CREATE UNIQUE INDEX IF NOT EXISTS idx_content_hash ON crawled_data (content_hash)"
         )
+        # Running per-domain totals of transferred bytes. Unlike the per-link
+        # columns these are never overwritten by re-crawls.
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS transfer_stats (
+                domain TEXT PRIMARY KEY CHECK(length(domain) > 0),
+                responses INTEGER NOT NULL DEFAULT 0,
+                wire_bytes INTEGER NOT NULL DEFAULT 0,
+                decoded_bytes INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        # Where each archived response lives in the WARC files (--warc-dir).
+        # Every fetch adds a row, so earlier captures stay reachable.
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS warc_records (
+                link TEXT NOT NULL,
+                date TIMESTAMP NOT NULL,
+                warc_file TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                status_code INTEGER
+            )
+            """
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_warc_link_date ON warc_records (link, date)"
+        )
+        # Last fetched robots.txt, reused by restarts within --robots-ttl.
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS robots_txt (
+                domain TEXT PRIMARY KEY CHECK(length(domain) > 0),
+                content TEXT NOT NULL,
+                fetched_at TIMESTAMP NOT NULL
+            )
+            """
+        )
         conn.commit()
 
+    migrate_base64_content(database_name, logger=logger)
+
+
+def _migrate_status_check(conn, logger):
+    """Rebuild crawled_data if its status CHECK predates the 'in_progress' or 'parked' status.
+
+    SQLite cannot alter a CHECK constraint, so the table is copied into one
+    created from the same definition with the new constraint, following
+    SQLite's documented table-rebuild procedure. Foreign keys are switched
+    off meanwhile so dropping the old table does not cascade to the payload
+    tables that reference it, and the indexes are recreated before they are
+    switched back on (the payload tables' foreign keys need ``idx_link``).
+    """
+    row = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type='table' AND name='crawled_data'"
+    ).fetchone()
+    if row is None or "'parked'" in row[0]:
+        return
+    old_check = re.search(r"CHECK\s*\(\s*status\s+IN\s*\([^)]*\)\s*\)", row[0])
+    if old_check is None:
+        return
+    new_sql = row[0][: old_check.start()] + _STATUS_CHECK + row[0][old_check.end() :]
+    new_sql = re.sub(
+        r"^CREATE TABLE\s+\"?crawled_data\"?",
+        "CREATE TABLE crawled_data_new",
+        new_sql,
+    )
+    index_sqls = [
+        r[0]
+        for r in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type='index' "
+            "AND tbl_name='crawled_data' AND sql IS NOT NULL"
+        )
+    ]
+    conn.commit()
+    conn.execute("PRAGMA foreign_keys=OFF")
+    try:
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS crawled_data_new")
+            conn.execute(new_sql)
+            conn.execute("INSERT INTO crawled_data_new SELECT * FROM crawled_data")
+            conn.execute("DROP TABLE crawled_data")
+            conn.execute("ALTER TABLE crawled_data_new RENAME TO crawled_data")
+            for index_sql in index_sqls:
+                conn.execute(index_sql)
+        logger.info(
+            "Auto-migration: added the 'in_progress' and 'parked' statuses to "
+            "crawled_data."
+        )
+    finally:
+        conn.execute("PRAGMA foreign_keys=ON")
+
+
+def migrate_base64_content(database_name, batch_size=500, logger=None):
+    """Convert Base64-encoded binary rows written by older versions into raw BLOBs.
+
+    Binary bodies used to be stored Base64-encoded in the TEXT ``content``
+    column. This decodes them into ``content_blob`` (clearing ``content``) and
+    re-hashes the raw bytes, walking the table by id in batches so the table
+    is never loaded into memory. It runs once per database, tracked through
+    ``PRAGMA user_version``.
+
+    Args:
+        database_name (str): Path to the SQLite database.
+        batch_size (int): Number of rows decoded and committed per transaction.
+        logger: Optional logger instance.
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    conn = get_connection(database_name)
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= _BASE64_MIGRATION_VERSION:
+        return
+
+    # Successful fetches of non-text MIME types (or with no Content-Type at all)
+    # are the rows that were Base64-encoded; failed fetches are never 'crawled'.
+    select_batch = """
+        SELECT id, content FROM crawled_data
+        WHERE id > ?
+          AND status = 'crawled'
+          AND content IS NOT NULL
+          AND content_blob IS NULL
+          AND (mime_type IS NULL OR NOT (
+                mime_type LIKE '%text/%' OR mime_type LIKE '%xml%' OR mime_type LIKE '%json%'))
+        ORDER BY id
+        LIMIT ?
+    """
+    last_id = 0
+    converted = 0
+    try:
+        while True:
+            rows = conn.execute(select_batch, (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            with conn:
+                for row_id, encoded in rows:
+                    last_id = row_id
+                    try:
+                        raw = base64.b64decode(encoded, validate=True)
+                    except (binascii.Error, ValueError):
+                        continue  # Not Base64 after all; leave the row untouched
+                    params = [raw, compute_hash(raw), row_id]
+                    update = """
+                        UPDATE crawled_data
+                        SET content = NULL, content_blob = ?, content_hash = ?
+                        WHERE id = ?
+                    """
+                    try:
+                        conn.execute(update, params)
+                    except sqlite3.IntegrityError:
+                        params[1] = None  # Same bytes already stored under another link
+                        conn.execute(update, params)
+                    converted += 1
+        conn.execute(f"PRAGMA user_version = {_BASE64_MIGRATION_VERSION}")
+        if converted:
+            logger.info(
+                f"Auto-migration: converted {converted} Base64 row(s) to raw BLOBs."
+            )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to migrate Base64 content to BLOBs: {e}")
+
 
 def save_links_to_db(
     database_name,
@@ -164,52 +389,117 @@ def save_links_to_db(
     robots_parser,
     status="pending",
     re_crawl_time=3,
+    priorities=None,
+    depth=None,
+    seen=None,
+    canonicalize=None,
+    traps=None,
     logger=None,
 ):
-    """Save multiple links to the database in a batch, if allowed by robots.txt."""
+    """Save multiple links to the database in a batch, if allowed by robots.txt.
+
+    ``priorities`` maps links to their frontier priority (default 0) and
+    ``depth`` is their distance in links from the start URL. A link found
+    again keeps the higher priority and the lower depth, unless it was
+    already crawled, in which case a due re-crawl takes the new priority.
+    A crawled link is due at its ``next_fetch_at``; links crawled without
+    one are due ``re_crawl_time`` hours after ``date_crawled``.
+
+    With ``seen`` (a ``seen_filter.SeenUrlFilter``), links it already knows
+    are dropped without a query, and the saved ones are added to it.
+    ``canonicalize`` (``canonicalize(link) -> str``) rewrites each link to
+    its canonical form first; variants keep the highest priority.
+    With ``traps`` (a ``traps.TrapDetector``), each new link is counted
+    against the budget of its URL template and saved as 'parked' once the
+    template is over it.
+    """
+    priorities = priorities or {}
     if logger is None:
         logger = logging.getLogger(__name__)
+    if canonicalize is not None:
+        canonical_priorities = {}
+        for link in links:
+            canonical = canonicalize(link)
+            priority = priorities.get(link, 0)
+            canonical_priorities[canonical] = max(
+                canonical_priorities.get(canonical, priority), priority
+            )
+        links, priorities = list(canonical_priorities), canonical_priorities
+    if seen is not None:
+        links = seen.filter_new(links)
+        if not links:
+            return
+    saved = []
+    # Crawled links are due again at this time (see load_pending_links).
+    now = datetime.now()
+    crawled_before = now - timedelta(hours=re_crawl_time)
     try:
         conn = get_connection(database_name)
         with conn:
             cursor = conn.cursor()
             for link in links:
-                if robots_parser and not robots_parser.can_fetch(
-                    CrawlerConfig().user_agent, link
-                ):
+                if robots_parser and not robots_parser.is_allowed(link):
                     logger.info(f"Skipping disallowed link: {link}")
                     continue
 
+                link_status, template = status, None
+                if (
+                    traps is not None
+                    and cursor.execute(
+                        "SELECT 1 FROM crawled_data WHERE link = ?", (link,)
+                    ).fetchone()
+                    is None
+                ):
+                    template, parked = traps.admit(link)
+                    if parked:
+                        link_status = "parked"
+
                 cursor.execute(
                     """
-                    INSERT INTO crawled_data (domain, date_inserted, link, status)
-                    VALUES (?, ?, ?, ?)
+                    INSERT INTO crawled_data (domain, date_inserted, link, status, priority, depth, url_template)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
                     ON CONFLICT(link) DO UPDATE SET
+                        priority = CASE
+                            WHEN status = 'crawled' AND (next_fetch_at <= ? OR (next_fetch_at IS NULL AND date_crawled <= ?)) THEN excluded.priority
+                            ELSE MAX(priority, excluded.priority)
+                        END,
+                        depth = MIN(COALESCE(depth, excluded.depth), COALESCE(excluded.depth, depth)),
                         status = CASE
-                            WHEN status = 'crawled' AND (julianday('now') - julianday(date_crawled)) * 24 >= ? THEN 'pending'
+                            WHEN status = 'crawled' AND (next_fetch_at <= ? OR (next_fetch_at IS NULL AND date_crawled <= ?)) THEN 'pending'
                             ELSE status
                         END,
                         date_inserted = CASE
-                            WHEN status = 'pending' OR (status = 'crawled' AND (julianday('now') - julianday(date_crawled)) * 24 >= ?) THEN excluded.date_inserted
+                            WHEN status = 'pending' OR (status = 'crawled' AND (next_fetch_at <= ? OR (next_fetch_at IS NULL AND date_crawled <= ?))) THEN excluded.date_inserted
                             ELSE date_inserted
                         END
                     """,
                     (
                         domain,
-                        datetime.now(),
+                        now,
                         link,
-                        status,
-                        re_crawl_time,
-                        re_crawl_time,
+                        link_status,
+                        priorities.get(link, 0),
+                        depth,
+                        template,
+                        now,
+                        crawled_before,
+                        now,
+                        crawled_before,
+                        now,
+                        crawled_before,
                     ),
                 )
                 if cursor.rowcount > 0:
+                    saved.append(link)
                     logger.info(
-                        f"Saved/updated link in database: {link} (status: {status})"
+                        f"Saved/updated link in database: {link} (status: {link_status})"
                     )
             conn.commit()  # Commit all changes at once
     except sqlite3.Error as e:
         logger.error(f"Database error while saving links: {e}")
+        return
+    if seen is not None:
+        seen.update(saved)
 
 
 def reset_link_to_pending(database_name, link, logger=None):
@@ -223,7 +513,8 @@ def reset_link_to_pending(database_name, link, logger=None):
             cursor.execute(
                 """
                 UPDATE crawled_data
-                SET status = 'pending', date_inserted = ?
+                SET status = 'pending', date_inserted = ?, leased_by = NULL,
+                    lease_expires_at = NULL
                 WHERE link = ?
                 """,
                 (datetime.now(), link),
@@ -245,12 +536,19 @@ def update_queue_link(
 ) -> bool:
     """Update a link in the crawl queue with content, hash, date_crawled, and mark it with the given status.
 
+    Text content is stored in ``content``; raw bytes (binary responses) go to
+    ``content_blob`` so they are kept without any encoding overhead.
+
+    ``next_fetch_at`` is cleared, so the link waits ``re_crawl_time`` hours
+    from now unless ``schedule_next_fetch`` sets it for a page just stored.
+
     Returns:
         True on success, False if the update was rejected due to a duplicate
         content_hash (IntegrityError from the UNIQUE index).
     """
     if logger is None:
         logger = logging.getLogger(__name__)
+    is_binary = isinstance(content, (bytes, bytearray))
     try:
         conn = get_connection(database_name)
         with conn:
@@ -258,10 +556,21 @@ def update_queue_link(
             cursor.execute(
                 """
                 UPDATE crawled_data
-                SET content = ?, content_hash = ?, status = ?, date_crawled = ?, mime_type = ?
+                SET content = ?, content_blob = ?, content_hash = ?, status = ?, date_crawled = ?,
+                    mime_type = ?, attempts = 0, next_attempt_at = NULL, etag = NULL,
+                    last_modified = NULL, leased_by = NULL, lease_expires_at = NULL,
+                    next_fetch_at = NULL
                 WHERE link = ?
                 """,
-                (content, content_hash, status, datetime.now(), mime_type, link),
+                (
+                    None if is_binary else content,
+                    content if is_binary else None,
+                    content_hash,
+                    status,
+                    datetime.now(),
+                    mime_type,
+                    link,
+                ),
             )
             conn.commit()
             logger.info(f"Updated queue link in database: {link}")
@@ -270,20 +579,424 @@ def update_queue_link(
         # Another row with the same content_hash was committed between our
         # duplicate-check and this UPDATE (TOCTOU race in multi-threaded mode).
         logger.info(f"Skipping duplicate content (concurrent write race): {link}")
+        # Still complete the link, without a body, so it is not claimed again
+        # before the next re-crawl.
+        update_queue_link(database_name, link, None, None, status=status, logger=logger)
         return False
     except sqlite3.Error as e:
         logger.error(f"Database error while updating queue link: {e}")
         return False
 
 
-def load_pending_links(database_name, re_crawl_time=3, limit=None, logger=None):
-    """Load pending links from the database.
+def get_link_validators(database_name, link, logger=None) -> dict:
+    """Return the stored ETag / Last-Modified validators of a link (values may be None)."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        conn = get_connection(database_name)
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT etag, last_modified FROM crawled_data WHERE link = ?", (link,)
+            )
+            row = cursor.fetchone()
+            if row:
+                return {"etag": row[0], "last_modified": row[1]}
+    except sqlite3.Error as e:
+        logger.error(f"Failed to load HTTP validators for {link}: {e}")
+    return {"etag": None, "last_modified": None}
+
+
+def update_link_validators(
+    database_name, link, etag=None, last_modified=None, logger=None
+):
+    """Store the ETag / Last-Modified validators of a freshly stored page."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        conn = get_connection(database_name)
+        with conn:
+            conn.execute(
+                "UPDATE crawled_data SET etag = ?, last_modified = ? WHERE link = ?",
+                (etag, last_modified, link),
+            )
+            conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"Database error while storing HTTP validators: {e}")
+
+
+def record_transfer(
+    database_name, domain, link, wire_bytes, decoded_bytes, logger=None
+):
+    """Store a response's wire/decoded body sizes on its link and add them to the domain totals."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        conn = get_connection(database_name)
+        with conn:
+            conn.execute(
+                "UPDATE crawled_data SET wire_bytes = ?, decoded_bytes = ? WHERE link = ?",
+                (wire_bytes, decoded_bytes, link),
+            )
+            conn.execute(
+                """
+                INSERT INTO transfer_stats (domain, responses, wire_bytes, decoded_bytes)
+                VALUES (?, 1, ?, ?)
+                ON CONFLICT(domain) DO UPDATE SET
+                    responses = responses + 1,
+                    wire_bytes = wire_bytes + excluded.wire_bytes,
+                    decoded_bytes = decoded_bytes + excluded.decoded_bytes
+                """,
+                (domain, wire_bytes or 0, decoded_bytes or 0),
+            )
+            conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"Database error while recording transfer sizes: {e}")
+
+
+def get_transfer_stats(database_name, domain, logger=None) -> dict:
+    """Return the accumulated responses / wire_bytes / decoded_bytes of a domain."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    stats = {"responses": 0, "wire_bytes": 0, "decoded_bytes": 0}
+    try:
+        conn = get_connection(database_name)
+        row = conn.execute(
+            "SELECT responses, wire_bytes, decoded_bytes FROM transfer_stats WHERE domain = ?",
+            (domain,),
+        ).fetchone()
+        if row:
+            stats = {"responses": row[0], "wire_bytes": row[1], "decoded_bytes": row[2]}
+    except sqlite3.Error as e:
+        logger.error(f"Failed to load transfer stats for {domain}: {e}")
+    return stats
+
+
+def save_robots_txt(database_name, domain, content, logger=None):
+    """Store the robots.txt of a domain with the current time as its fetch time."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        conn = get_connection(database_name)
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO robots_txt (domain, content, fetched_at) VALUES (?, ?, ?)",
+                (domain, content, datetime.now()),
+            )
+    except sqlite3.Error as e:
+        logger.error(f"Database error while caching robots.txt: {e}")
+
+
+def load_robots_txt(database_name, domain, logger=None):
+    """Return the cached robots.txt of a domain as ``{content, fetched_at}``, or None."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        row = (
+            get_connection(database_name)
+            .execute(
+                "SELECT content, fetched_at FROM robots_txt WHERE domain = ?",
+                (domain,),
+            )
+            .fetchone()
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to load the cached robots.txt: {e}")
+        return None
+    if row is None:
+        return None
+    return {"content": row[0], "fetched_at": datetime.fromisoformat(row[1])}
+
+
+def record_warc_location(
+    database_name, link, date, warc_file, offset, length, status_code=None, logger=None
+):
+    """Index an archived response: ``(link, date)`` -> ``(warc_file, offset, length)``."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        conn = get_connection(database_name)
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO warc_records (link, date, warc_file, offset, length, status_code)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (link, date, warc_file, offset, length, status_code),
+            )
+    except sqlite3.Error as e:
+        logger.error(f"Database error while indexing WARC record of {link}: {e}")
+
+
+def get_warc_locations(database_name, link, logger=None) -> list:
+    """Return the archived captures of a link, newest first.
+
+    Each entry is a dict with ``date``, ``warc_file``, ``offset``, ``length``
+    and ``status_code``; pass ``warc_file`` and ``offset`` to
+    ``warc_writer.read_warc_record`` to load the response.
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        rows = (
+            get_connection(database_name)
+            .execute(
+                """
+                SELECT date, warc_file, offset, length, status_code FROM warc_records
+                WHERE link = ? ORDER BY date DESC
+                """,
+                (link,),
+            )
+            .fetchall()
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to load WARC locations for {link}: {e}")
+        return []
+    return [
+        {
+            "date": row[0],
+            "warc_file": row[1],
+            "offset": row[2],
+            "length": row[3],
+            "status_code": row[4],
+        }
+        for row in rows
+    ]
+
+
+def mark_link_not_modified(database_name, link, logger=None):
+    """Handle a 304 Not Modified re-crawl: keep the stored copy and only bump date_crawled."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        conn = get_connection(database_name)
+        with conn:
+            conn.execute(
+                """
+                UPDATE crawled_data
+                SET status = 'crawled', date_crawled = ?, attempts = 0, next_attempt_at = NULL,
+                    leased_by = NULL, lease_expires_at = NULL
+                WHERE link = ?
+                """,
+                (datetime.now(), link),
+            )
+            conn.commit()
+            logger.info(f"Marked unchanged link as crawled: {link}")
+    except sqlite3.Error as e:
+        logger.error(f"Database error while marking link as not modified: {e}")
+
+
+def get_content_hash(database_name, link, logger=None):
+    """Return the stored content hash of a link (None if it has none)."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        row = (
+            get_connection(database_name)
+            .execute("SELECT content_hash FROM crawled_data WHERE link = ?", (link,))
+            .fetchone()
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to load the content hash of {link}: {e}")
+        return None
+    return row[0] if row else None
+
+
+def schedule_next_fetch(
+    database_name, link, recrawl_policy, previous_hash=None, logger=None
+):
+    """Adjust the re-crawl interval of a link just fetched and set its ``next_fetch_at``.
+
+    The content counts as changed if the stored ``content_hash`` differs from
+    ``previous_hash``, the hash before the fetch.
+
+    Args:
+        recrawl_policy (recrawl.RecrawlPolicy): Computes the new interval.
+
+    Returns:
+        float | None: The new interval in hours (None if the link is unknown).
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    now = datetime.now()
+    try:
+        conn = get_connection(database_name)
+        with conn:
+            row = conn.execute(
+                "SELECT recrawl_interval, content_hash FROM crawled_data WHERE link = ?",
+                (link,),
+            ).fetchone()
+            if row is None:
+                return None
+            interval = recrawl_policy.next_interval(row[0], row[1] != previous_hash)
+            conn.execute(
+                """
+                UPDATE crawled_data SET recrawl_interval = ?, next_fetch_at = ?
+                WHERE link = ?
+                """,
+                (interval, now + timedelta(hours=interval), link),
+            )
+            return interval
+    except sqlite3.Error as e:
+        logger.error(f"Failed to schedule the next fetch of {link}: {e}")
+        return None
+
+
+def schedule_retry(
+    database_name,
+    link,
+    error_description,
+    error_description_hash,
+    max_attempts=3,
+    backoff_base=60,
+    min_delay=0,
+    logger=None,
+):
+    """Record a retriable fetch failure and schedule the next attempt with exponential backoff.
+
+    Instead of a worker thread sleeping between attempts, the link stays
+    ``pending`` with ``next_attempt_at`` set, and ``load_pending_links`` only
+    hands it out again once that time has passed. After ``max_attempts``
+    failures the link is recorded like any other failed fetch (error stored,
+    ``date_crawled`` set) and its attempt counter is reset.
+
+    Args:
+        database_name (str): Path to the SQLite database.
+        link (str): The URL that failed.
+        error_description (str): Description of the failure (stored as content).
+        error_description_hash (str): Hash of the error description.
+        max_attempts (int): Total attempts before giving up until the next re-crawl.
+        backoff_base (int): Delay in seconds before the second attempt; doubles per attempt.
+        min_delay (float): Lower bound for the delay, e.g. a server's ``Retry-After``.
+        logger: Optional logger instance.
+
+    Returns:
+        datetime | None: When the next attempt is due, or None if attempts are exhausted.
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        conn = get_connection(database_name)
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT attempts FROM crawled_data WHERE link = ?", (link,))
+            row = cursor.fetchone()
+            attempts = (row[0] or 0) + 1 if row else 1
+
+            if attempts >= max_attempts:
+                # Exhausted: record like any other failed fetch and wait for the re-crawl window.
+                next_attempt_at = None
+                query = """
+                    UPDATE crawled_data
+                    SET content = ?, content_hash = ?, status = 'pending', date_crawled = ?,
+                        attempts = 0, next_attempt_at = NULL, etag = NULL, last_modified = NULL,
+                        leased_by = NULL, lease_expires_at = NULL, next_fetch_at = NULL
+                    WHERE link = ?
+                """
+                params = [
+                    error_description,
+                    error_description_hash,
+                    datetime.now(),
+                    link,
+                ]
+            else:
+                next_attempt_at = datetime.now() + timedelta(
+                    seconds=max(backoff_base * 2 ** (attempts - 1), min_delay)
+                )
+                query = """
+                    UPDATE crawled_data
+                    SET content = ?, content_hash = ?, status = 'pending',
+                        attempts = ?, next_attempt_at = ?, etag = NULL, last_modified = NULL,
+                        leased_by = NULL, lease_expires_at = NULL
+                    WHERE link = ?
+                """
+                params = [
+                    error_description,
+                    error_description_hash,
+                    attempts,
+                    next_attempt_at,
+                    link,
+                ]
+
+            try:
+                cursor.execute(query, params)
+            except sqlite3.IntegrityError:
+                # The same error text is already stored for another link (UNIQUE
+                # content_hash); keep the schedule but drop the hash.
+                params[1] = None
+                cursor.execute(query, params)
+            conn.commit()
+
+            if next_attempt_at is None:
+                logger.info(
+                    f"Giving up on {link} after {attempts} attempts until the next re-crawl."
+                )
+            else:
+                logger.info(
+                    f"Scheduled retry {attempts + 1}/{max_attempts} for {link} at {next_attempt_at}"
+                )
+            return next_attempt_at
+    except sqlite3.Error as e:
+        logger.error(f"Database error while scheduling retry: {e}")
+        return None
+
+
+def has_scheduled_retries(database_name, logger=None) -> bool:
+    """Return True if any pending link is waiting for a backoff-delayed retry."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        conn = get_connection(database_name)
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT 1 FROM crawled_data
+                WHERE status = 'pending' AND next_attempt_at IS NOT NULL
+                LIMIT 1
+                """
+            )
+            return cursor.fetchone() is not None
+    except sqlite3.Error as e:
+        logger.error(f"Failed to check scheduled retries: {e}")
+        return False
+
+
+def load_pending_links(
+    database_name,
+    re_crawl_time=3,
+    limit=None,
+    lease_owner=None,
+    lease_seconds=300,
+    cursor=None,
+    logger=None,
+):
+    """Load pending links from the database, optionally claiming them.
+
+    With ``lease_owner`` set, the links are claimed in the same statement
+    (``UPDATE ... RETURNING``): they become ``in_progress`` with ``leased_by``
+    set to the owner and ``lease_expires_at`` ``lease_seconds`` from now, so
+    crawlers sharing the database never hand out the same link twice. Links
+    whose lease has expired (their crawler died or hung) are claimed again.
+
+    ``cursor`` is a dict kept by the caller between calls. It records the
+    ``(priority, id)`` of the last pending link handed out, and the next call
+    resumes the index scan after it instead of walking again over pending
+    links that are not due yet. It restarts from the top once the scan reaches
+    the end; clear it when links that may sort before it become pending.
+
+    A link crawled before is handed out once its ``next_fetch_at`` has
+    passed, or ``re_crawl_time`` hours after ``date_crawled`` if it has none.
 
     Args:
         database_name (str): Path to the SQLite database.
-        re_crawl_time (int): Time in hours after which a link should be re-crawled.
+        re_crawl_time (int): Hours after which a link without a
+                             ``next_fetch_at`` should be re-crawled.
         limit (int | None): Maximum number of links to return.
                             Pass None to load all pending links (default behaviour).
+        lease_owner (str | None): Identifier of the claiming crawler.
+        lease_seconds (float): Lease duration; see ``renew_leases``.
+        cursor (dict | None): Scan position, updated in place.
         logger: Optional logger instance. Falls back to module-level logger.
 
     Returns:
@@ -291,25 +1004,652 @@ def load_pending_links(database_name, re_crawl_time=3, limit=None, logger=None):
     """
     if logger is None:
         logger = logging.getLogger(__name__)
-    pending_links = []
+    now = datetime.now()
+    # date_crawled is stored in the same ISO format, so comparing it with a
+    # cutoff computed once here avoids a julianday() call per scanned row.
+    crawled_before = now - timedelta(hours=re_crawl_time)
+    batch_limit = -1 if limit is None else limit
+    expired = """
+        SELECT id FROM crawled_data
+        WHERE status = 'in_progress' AND lease_expires_at <= ?
+        LIMIT ?
+    """
     try:
         conn = get_connection(database_name)
-        with conn:
-            cursor = conn.cursor()
-            query = """
-                SELECT link FROM crawled_data
+        rows = _claim_links(
+            conn, expired, (now, batch_limit), lease_owner, lease_seconds, now
+        )
+        position = cursor.get("position") if cursor is not None else None
+        if batch_limit < 0:
+            position = None
+        # Resume after the cursor; if that runs out, go round from the top
+        # down to where this lap started.
+        laps = [(position, None)]
+        if position is not None:
+            laps.append((None, position))
+        for after, down_to in laps:
+            remaining = -1 if batch_limit < 0 else batch_limit - len(rows)
+            if remaining == 0:
+                break
+            bounds = ""
+            if after is not None:
+                bounds += " AND (priority, id) < (?, ?)"
+            if down_to is not None:
+                bounds += " AND (priority, id) > (?, ?)"
+            # Pending links by priority. The ORDER BY walks idx_status_priority
+            # (whose entries end with the rowid), so only about ``remaining``
+            # rows past the cursor are read.
+            pending = f"""
+                SELECT id FROM crawled_data
                 WHERE status = 'pending'
-                  AND (date_crawled IS NULL OR (julianday('now') - julianday(date_crawled)) * 24 >= ?)
+                  AND (next_fetch_at <= ? OR (next_fetch_at IS NULL
+                       AND (date_crawled IS NULL OR date_crawled <= ?)))
+                  AND (next_attempt_at IS NULL OR next_attempt_at <= ?){bounds}
+                ORDER BY priority DESC, id DESC
+                LIMIT ?
             """
-            params = (re_crawl_time,)
-            if limit is not None:
-                query += " LIMIT ?"
-                params = (re_crawl_time, limit)
-            cursor.execute(query, params)
-            pending_links = [row[0] for row in cursor.fetchall()]
+            params = (now, crawled_before, now, *(after or ()), *(down_to or ()))
+            batch = _claim_links(
+                conn, pending, params + (remaining,), lease_owner, lease_seconds, now
+            )
+            rows.extend(batch)
+            if batch_limit >= 0 and len(batch) == remaining:
+                position = min((row[1], row[2]) for row in batch)
+                break
+        else:
+            position = None
+        if cursor is not None:
+            cursor["position"] = position
     except sqlite3.Error as e:
         logger.error(f"Failed to load pending links from database: {e}")
-    return pending_links
+        return []
+    # RETURNING rows come in no particular order.
+    rows.sort(key=lambda row: -row[1])
+    return [row[0] for row in rows]
+
+
+def _claim_links(conn, select_ids, params, lease_owner, lease_seconds, now):
+    """Return ``(link, priority, id)`` of the rows ``select_ids`` picks, leased
+    to ``lease_owner`` unless it is None."""
+    if lease_owner is None:
+        return conn.execute(
+            f"SELECT link, priority, id FROM crawled_data WHERE id IN ({select_ids})",
+            params,
+        ).fetchall()
+
+    lease = (lease_owner, now + timedelta(seconds=lease_seconds))
+    if _HAS_RETURNING:
+        with conn:
+            return conn.execute(
+                f"""
+                UPDATE crawled_data
+                SET status = 'in_progress', leased_by = ?, lease_expires_at = ?
+                WHERE id IN ({select_ids})
+                RETURNING link, priority, id
+                """,
+                lease + params,
+            ).fetchall()
+
+    # Older SQLite: take the write lock first so the select and the update
+    # cannot interleave with another crawler's claim.
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        ids = [row[0] for row in conn.execute(select_ids, params).fetchall()]
+        rows = []
+        if ids:
+            marks = ", ".join("?" * len(ids))
+            rows = conn.execute(
+                f"SELECT link, priority, id FROM crawled_data WHERE id IN ({marks})",
+                ids,
+            ).fetchall()
+            conn.execute(
+                f"""
+                UPDATE crawled_data
+                SET status = 'in_progress', leased_by = ?, lease_expires_at = ?
+                WHERE id IN ({marks})
+                """,
+                lease + tuple(ids),
+            )
+        conn.commit()
+        return rows
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+def merge_duplicate_links(database_name, canonicalize, logger=None) -> dict:
+    """Merge the rows of ``crawled_data`` whose links have the same canonical form.
+
+    For each canonical URL one row survives: preferably a crawled one, then
+    the most recently crawled, then the one already holding the canonical
+    link. It takes the highest priority, the lowest depth and the earliest
+    ``date_inserted`` of the group and is renamed to the canonical link. The
+    other rows are deleted together with their rows in the payload tables
+    (``news_articles``, ...), and their WARC index entries are moved to the
+    canonical link. Run it while no crawler uses the database.
+
+    Args:
+        database_name (str): Path to the SQLite database.
+        canonicalize (callable): ``canonicalize(link) -> str``.
+        logger: Optional logger instance.
+
+    Returns:
+        dict: ``{"renamed": rows given their canonical link, "merged": rows
+        deleted as duplicates}``.
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    stats = {"renamed": 0, "merged": 0}
+    groups = {}  # canonical link -> ids of rows holding a variant of it
+    for row_id, link in iter_known_links(database_name, logger=logger):
+        canonical = canonicalize(link)
+        if canonical != link:
+            groups.setdefault(canonical, []).append(row_id)
+    if not groups:
+        return stats
+
+    conn = get_connection(database_name)
+    tables = [
+        row[0]
+        for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    ]
+    payload_tables = [
+        table
+        for table in tables
+        if any(
+            fk[2] == "crawled_data" and fk[3] == "link"
+            for fk in conn.execute(f'PRAGMA foreign_key_list("{table}")')
+        )
+    ]
+    # Payload rows are renamed along with their crawled_data row, which
+    # foreign keys would reject midway; keep them consistent by hand instead.
+    conn.commit()
+    conn.execute("PRAGMA foreign_keys=OFF")
+    try:
+        for canonical, ids in groups.items():
+            marks = ", ".join("?" * len(ids))
+            rows = conn.execute(
+                f"""
+                SELECT id, link, status, date_crawled, priority, depth, date_inserted
+                FROM crawled_data WHERE id IN ({marks}) OR link = ?
+                """,
+                (*ids, canonical),
+            ).fetchall()
+            survivor = max(
+                rows,
+                key=lambda row: (
+                    row[2] == "crawled",
+                    row[3] or "",
+                    row[1] == canonical,
+                ),
+            )
+            depths = [row[5] for row in rows if row[5] is not None]
+            with conn:
+                for row in rows:
+                    if row is survivor:
+                        continue
+                    for table in payload_tables:
+                        conn.execute(f'DELETE FROM "{table}" WHERE link = ?', (row[1],))
+                    conn.execute("DELETE FROM crawled_data WHERE id = ?", (row[0],))
+                    stats["merged"] += 1
+                conn.execute(
+                    """
+                    UPDATE crawled_data
+                    SET link = ?, priority = ?, depth = ?, date_inserted = ?
+                    WHERE id = ?
+                    """,
+                    (
+                        canonical,
+                        max(row[4] or 0 for row in rows),
+                        min(depths) if depths else None,
+                        min(row[6] for row in rows),
+                        survivor[0],
+                    ),
+                )
+                if survivor[1] != canonical:
+                    for table in payload_tables:
+                        conn.execute(
+                            f'UPDATE "{table}" SET link = ? WHERE link = ?',
+                            (canonical, survivor[1]),
+                        )
+                    stats["renamed"] += 1
+                conn.execute(
+                    f"UPDATE warc_records SET link = ? WHERE link IN "
+                    f"({', '.join('?' * len(rows))})",
+                    (canonical, *(row[1] for row in rows)),
+                )
+        logger.info(
+            f"Merged {stats['merged']} duplicate link(s) and renamed "
+            f"{stats['renamed']} to their canonical form in {database_name}."
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to merge duplicate links in {database_name}: {e}")
+    finally:
+        conn.execute("PRAGMA foreign_keys=ON")
+    return stats
+
+
+def get_link_depth(database_name, link, logger=None) -> int:
+    """Return how many links away from the start URL ``link`` was found (0 if unknown)."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        row = (
+            get_connection(database_name)
+            .execute("SELECT depth FROM crawled_data WHERE link = ?", (link,))
+            .fetchone()
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to load the depth of {link}: {e}")
+        return 0
+    return (row[0] or 0) if row else 0
+
+
+def get_max_link_id(database_name, logger=None) -> int:
+    """Return the highest ``crawled_data`` id (0 for an empty table)."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        row = (
+            get_connection(database_name)
+            .execute("SELECT MAX(id) FROM crawled_data")
+            .fetchone()
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to load the highest link id: {e}")
+        return 0
+    return row[0] or 0
+
+
+def iter_known_links(database_name, after_id=0, logger=None):
+    """Yield ``(id, link)`` of the rows of ``crawled_data`` with an id above ``after_id``.
+
+    Rows are read in batches, so the whole table is never held in memory. A
+    full read walks the covering ``idx_link`` index rather than the table, so
+    stored page content is not read.
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    conn = get_connection(database_name)
+    if after_id:
+        query = "SELECT id, link FROM crawled_data WHERE id > ? ORDER BY id LIMIT 10000"
+        position, key = after_id, 0
+    else:
+        query = (
+            "SELECT id, link FROM crawled_data WHERE link > ? ORDER BY link LIMIT 10000"
+        )
+        position, key = "", 1
+    while True:
+        try:
+            rows = conn.execute(query, (position,)).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to read the known links: {e}")
+            return
+        if not rows:
+            return
+        yield from rows
+        position = rows[-1][key]
+
+
+def requeue_due_links(database_name, re_crawl_time=3, logger=None) -> int:
+    """Set crawled links due for a re-crawl back to 'pending'.
+
+    A link is due at its ``next_fetch_at``, or ``re_crawl_time`` hours after
+    ``date_crawled`` if it has none.
+
+    ``save_links_to_db`` does this for each link it sees again; crawlers that
+    drop known links before saving them (see ``seen_filter``) sweep instead.
+
+    Returns:
+        int: Number of links requeued.
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    now = datetime.now()
+    try:
+        conn = get_connection(database_name)
+        with conn:
+            cursor = conn.execute(
+                """
+                UPDATE crawled_data SET status = 'pending', date_inserted = ?
+                WHERE status = 'crawled'
+                  AND (next_fetch_at <= ? OR (next_fetch_at IS NULL AND date_crawled <= ?))
+                """,
+                (now, now, now - timedelta(hours=re_crawl_time)),
+            )
+            return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Failed to requeue links due for a re-crawl: {e}")
+        return 0
+
+
+def fill_link_templates(database_name, template_of, logger=None) -> int:
+    """Set ``url_template`` on the rows saved without one (e.g. by older versions).
+
+    Args:
+        template_of (callable): ``template_of(link) -> str``.
+
+    Returns:
+        int: Number of rows updated.
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    updated, position = 0, 0
+    try:
+        conn = get_connection(database_name)
+        while True:
+            rows = conn.execute(
+                """
+                SELECT id, link FROM crawled_data
+                WHERE url_template IS NULL AND id > ? ORDER BY id LIMIT 10000
+                """,
+                (position,),
+            ).fetchall()
+            if not rows:
+                return updated
+            with conn:
+                conn.executemany(
+                    "UPDATE crawled_data SET url_template = ? WHERE id = ?",
+                    [(template_of(link), row_id) for row_id, link in rows],
+                )
+            updated += len(rows)
+            position = rows[-1][0]
+    except sqlite3.Error as e:
+        logger.error(f"Failed to fill in the URL templates of known links: {e}")
+        return updated
+
+
+def count_template_links(database_name, template, logger=None):
+    """Return ``(admitted, parked)``: the links of ``template`` that are and
+    are not 'parked'."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        row = (
+            get_connection(database_name)
+            .execute(
+                """
+                SELECT COUNT(*) - COUNT(CASE WHEN status = 'parked' THEN 1 END),
+                       COUNT(CASE WHEN status = 'parked' THEN 1 END)
+                FROM crawled_data WHERE url_template = ?
+                """,
+                (template,),
+            )
+            .fetchone()
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to count the links of {template}: {e}")
+        return 0, 0
+    return row[0], row[1]
+
+
+def get_parked_templates(database_name, logger=None) -> list:
+    """Return the URL templates that have parked links."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        rows = (
+            get_connection(database_name)
+            .execute(
+                "SELECT DISTINCT url_template FROM crawled_data "
+                "WHERE status = 'parked' AND url_template IS NOT NULL"
+            )
+            .fetchall()
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to load the templates of parked links: {e}")
+        return []
+    return [row[0] for row in rows]
+
+
+def load_parked_links(database_name, template, logger=None) -> list:
+    """Return the parked links of ``template``, highest priority first."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        rows = (
+            get_connection(database_name)
+            .execute(
+                """
+                SELECT link FROM crawled_data
+                WHERE url_template = ? AND status = 'parked'
+                ORDER BY priority DESC, id
+                """,
+                (template,),
+            )
+            .fetchall()
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to load the parked links of {template}: {e}")
+        return []
+    return [row[0] for row in rows]
+
+
+def unpark_links(database_name, links, logger=None) -> int:
+    """Return parked links to the frontier; returns the number set to 'pending'."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    now = datetime.now()
+    try:
+        conn = get_connection(database_name)
+        with conn:
+            cursor = conn.executemany(
+                """
+                UPDATE crawled_data SET status = 'pending', date_inserted = ?
+                WHERE link = ? AND status = 'parked'
+                """,
+                [(now, link) for link in links],
+            )
+            return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Failed to unpark links: {e}")
+        return 0
+
+
+def save_discovery_sources(database_name, domain, links, priority=0, logger=None):
+    """Mark links as discovery sources (feeds, sitemaps), adding the unknown ones as pending."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    now = datetime.now()
+    try:
+        conn = get_connection(database_name)
+        with conn:
+            conn.executemany(
+                """
+                INSERT INTO crawled_data (domain, date_inserted, link, status, priority, depth, discovery_source)
+                VALUES (?, ?, ?, 'pending', ?, 0, 1)
+                ON CONFLICT(link) DO UPDATE SET
+                    discovery_source = 1,
+                    priority = MAX(priority, excluded.priority)
+                """,
+                [(domain, now, link, priority) for link in links],
+            )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to save discovery sources: {e}")
+
+
+def load_discovery_sources(database_name, logger=None) -> list:
+    """Return the links marked as discovery sources."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        rows = (
+            get_connection(database_name)
+            .execute("SELECT link FROM crawled_data WHERE discovery_source = 1")
+            .fetchall()
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to load discovery sources: {e}")
+        return []
+    return [row[0] for row in rows]
+
+
+def requeue_due_sources(database_name, min_interval_hours, logger=None) -> int:
+    """Set crawled discovery sources whose next poll is due back to 'pending'.
+
+    Sources without a ``next_fetch_at`` (stored without a body) are due
+    ``min_interval_hours`` after ``date_crawled``.
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    now = datetime.now()
+    try:
+        conn = get_connection(database_name)
+        with conn:
+            cursor = conn.execute(
+                """
+                UPDATE crawled_data
+                SET status = 'pending', date_inserted = ?, next_fetch_at = ?
+                WHERE discovery_source = 1 AND status = 'crawled'
+                  AND (next_fetch_at <= ? OR (next_fetch_at IS NULL AND date_crawled <= ?))
+                """,
+                (now, now, now, now - timedelta(hours=min_interval_hours)),
+            )
+            return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Failed to requeue due discovery sources: {e}")
+        return 0
+
+
+def requeue_updated_links(database_name, lastmods, logger=None) -> int:
+    """Set crawled links back to 'pending' if they changed after they were crawled.
+
+    Args:
+        lastmods (dict): Link -> modification time announced by a sitemap or
+                         feed (a naive local datetime, like ``date_crawled``).
+
+    Returns:
+        int: Number of links requeued.
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    now = datetime.now()
+    try:
+        conn = get_connection(database_name)
+        with conn:
+            cursor = conn.executemany(
+                """
+                UPDATE crawled_data
+                SET status = 'pending', date_inserted = ?, next_fetch_at = ?
+                WHERE link = ? AND status = 'crawled' AND date_crawled < ?
+                """,
+                [(now, now, link, lastmod) for link, lastmod in lastmods.items()],
+            )
+            return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Failed to requeue updated links: {e}")
+        return 0
+
+
+def renew_leases(database_name, lease_owner, lease_seconds=300, logger=None) -> int:
+    """Extend every lease held by ``lease_owner``; returns the number renewed.
+
+    Crawlers call this well within ``lease_seconds`` while links wait in their
+    queue or are being fetched, so only the leases of a crawler that stopped
+    renewing them (crash, hang) expire.
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        conn = get_connection(database_name)
+        with conn:
+            cursor = conn.execute(
+                """
+                UPDATE crawled_data SET lease_expires_at = ?
+                WHERE status = 'in_progress' AND leased_by = ?
+                """,
+                (datetime.now() + timedelta(seconds=lease_seconds), lease_owner),
+            )
+            return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Database error while renewing leases: {e}")
+        return 0
+
+
+def release_lease(database_name, link, lease_owner, logger=None) -> bool:
+    """Return a claimed link that was not processed (skipped, shutdown) to 'pending'.
+
+    Links already completed no longer carry the owner's lease and are left as they are.
+
+    Returns:
+        bool: True if the link went back to 'pending'.
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        conn = get_connection(database_name)
+        with conn:
+            cursor = conn.execute(
+                """
+                UPDATE crawled_data
+                SET status = 'pending', leased_by = NULL, lease_expires_at = NULL
+                WHERE link = ? AND status = 'in_progress' AND leased_by = ?
+                """,
+                (link, lease_owner),
+            )
+            return cursor.rowcount > 0
+    except sqlite3.Error as e:
+        logger.error(f"Database error while releasing the lease of {link}: {e}")
+    return False
+
+
+def count_leased_links(database_name, logger=None) -> int:
+    """Return how many links are currently 'in_progress' under a lease."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        row = (
+            get_connection(database_name)
+            .execute("SELECT COUNT(*) FROM crawled_data WHERE status = 'in_progress'")
+            .fetchone()
+        )
+        return row[0]
+    except sqlite3.Error as e:
+        logger.error(f"Failed to count leased links: {e}")
+        return 0
+
+
+def release_owner_leases(database_name, owner_prefix, logger=None) -> int:
+    """Return every link leased by an owner whose id starts with ``owner_prefix``
+    to 'pending', e.g. the leases of a crashed crawler process.
+
+    Returns:
+        int: Number of links released.
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        conn = get_connection(database_name)
+        with conn:
+            cursor = conn.execute(
+                """
+                UPDATE crawled_data
+                SET status = 'pending', leased_by = NULL, lease_expires_at = NULL
+                WHERE status = 'in_progress' AND substr(leased_by, 1, ?) = ?
+                """,
+                (len(owner_prefix), owner_prefix),
+            )
+            return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Failed to release the leases of {owner_prefix}*: {e}")
+        return 0
+
+
+def count_links_by_status(database_name, logger=None) -> dict:
+    """Return the number of links per status."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        rows = (
+            get_connection(database_name)
+            .execute("SELECT status, COUNT(*) FROM crawled_data GROUP BY status")
+            .fetchall()
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to count links by status: {e}")
+        return {}
+    return dict(rows)
 
 
 def is_database_empty(database_name, logger=None):
@@ -360,7 +1700,9 @@ def check_re_crawl(database_name, link, re_crawl_time, logger=None):
         return True  # Assume re-crawl if there's an error
 
 
-def is_duplicate_content(database_name, content_hash: str, logger=None) -> bool:
+def is_duplicate_content(
+    database_name, content_hash: str, link=None, logger=None
+) -> bool:
     """Check whether a page with the given content_hash has already been saved.
 
     This replaces the in-memory ``visited_hashes`` set, letting the database
@@ -370,10 +1712,12 @@ def is_duplicate_content(database_name, content_hash: str, logger=None) -> bool:
     Args:
         database_name (str): Path to the SQLite database.
         content_hash (str): SHA-256 hex digest to look up.
+        link (str): The page being stored; its own row (an unchanged
+                    re-crawl) does not count as a duplicate.
         logger: Optional logger instance.
 
     Returns:
-        True if a row with this hash already exists, False otherwise.
+        True if another row with this hash already exists, False otherwise.
     """
     if logger is None:
         logger = logging.getLogger(__name__)
@@ -382,8 +1726,8 @@ def is_duplicate_content(database_name, content_hash: str, logger=None) -> bool:
         with conn:
             cursor = conn.cursor()
             cursor.execute(
-                "SELECT 1 FROM crawled_data WHERE content_hash = ? LIMIT 1",
-                (content_hash,),
+                "SELECT 1 FROM crawled_data WHERE content_hash = ? AND link IS NOT ? LIMIT 1",
+                (content_hash, link),
             )
             return cursor.fetchone() is not None
     except sqlite3.Error as e:
@@ -0,0 +1,316 @@
+import contextlib
+import logging
+import ssl
+import threading
+
+import requests
+
+from connection_pool import get_ssl_context
+
+
+class Fetcher:
+    """Transport interface used by ``fetch_page`` to talk HTTP.
+
+    ``fetch_page`` owns retries, backoff, content policy and decoding; a fetcher
+    only issues requests. Responses must expose ``status_code``, ``headers``,
+    ``encoding``, ``ok`` and ``raise_for_status()`` like ``requests.Response``,
+    and failures must be raised as ``requests.exceptions`` so that every
+    backend yields the same error descriptions.
+
+    ``accept_encoding`` lists the content codings the backend can decode
+    (brotli and zstd only when their decoders are installed).
+    """
+
+    name = None
+    accept_encoding = "gzip, deflate"
+
+    def get(self, url, headers=None, timeout=None, proxies=None):
+        """Return a context manager yielding a streamed GET response."""
+        raise NotImplementedError
+
+    def head(self, url, headers=None, timeout=None, proxies=None):
+        """Send a HEAD request (following redirects) and return the response."""
+        raise NotImplementedError
+
+    def iter_body(self, response, chunk_size=65536):
+        """Yield the decoded body of a streamed response in chunks."""
+        return response.iter_content(chunk_size=chunk_size)
+
+    def wire_bytes(self, response):
+        """Return the number of body bytes received on the wire (before decoding)."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class RequestsFetcher(Fetcher):
+    """HTTP/1.1 fetcher built on ``requests`` (pooled when given a session)."""
+
+    name = "requests"
+    # What urllib3 can decode: adds br / zstd when brotli / zstd support is installed.
+    accept_encoding = requests.utils.DEFAULT_ACCEPT_ENCODING
+
+    def __init__(self, session=None):
+        self.session = session
+
+    @property
+    def _client(self):
+        return self.session if self.session is not None else requests
+
+    def get(self, url, headers=None, timeout=None, proxies=None):
+        return self._client.get(
+            url,
+            headers=headers,
+            timeout=timeout,
+            verify=True,
+            proxies=proxies,
+            stream=True,
+        )
+
+    def head(self, url, headers=None, timeout=None, proxies=None):
+        return self._client.head(
+            url,
+            headers=headers,
+            timeout=timeout,
+            verify=True,
+            proxies=proxies,
+            allow_redirects=True,
+        )
+
+    def iter_body(self, response, chunk_size=65536):
+        """Yield decoded body chunks, read through urllib3's ``read()``.
+
+        ``iter_content()`` reads chunked responses through a path that skips
+        the counter behind ``raw.tell()``, which ``wire_bytes`` relies on.
+        Errors are translated the same way ``iter_content()`` does.
+        """
+        from urllib3.exceptions import (
+            DecodeError,
+            ProtocolError,
+            ReadTimeoutError,
+            SSLError,
+        )
+
+        try:
+            while True:
+                chunk = response.raw.read(chunk_size, decode_content=True)
+                if not chunk:
+                    break
+                yield chunk
+        except ProtocolError as e:
+            raise requests.exceptions.ChunkedEncodingError(e)
+        except DecodeError as e:
+            raise requests.exceptions.ContentDecodingError(e)
+        except ReadTimeoutError as e:
+            raise requests.exceptions.ConnectionError(e)
+        except SSLError as e:
+            raise requests.exceptions.SSLError(e)
+
+    def wire_bytes(self, response):
+        return response.raw.tell()
+
+
+def httpx_accept_encoding():
+    """Content codings httpx can decode (br / zstd only when their decoders are installed)."""
+    try:
+        from httpx._decoders import SUPPORTED_DECODERS
+    except ImportError:
+        return Fetcher.accept_encoding
+    return ", ".join(coding for coding in SUPPORTED_DECODERS if coding != "identity")
+
+
+def is_ssl_error(exc) -> bool:
+    """Return True if an httpx transport error was caused by a TLS failure."""
+    while exc is not None:
+        if isinstance(exc, ssl.SSLError):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def http_error_message(status_code, reason, url) -> str:
+    """Describe an HTTP error status the way ``requests.Response.raise_for_status`` does."""
+    kind = "Client" if status_code < 500 else "Server"
+    return f"{status_code} {kind} Error: {reason} for url: {url}"
+
+
+class _HttpxResponse:
+    """Wraps an httpx response in the subset of the ``requests.Response`` API fetch_page uses."""
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.reason = response.reason_phrase
+        self.http_version = response.http_version
+        self.headers = response.headers
+        self.encoding = response.charset_encoding
+        self.url = str(response.url)
+
+    @property
+    def num_bytes_downloaded(self):
+        return self._response.num_bytes_downloaded
+
+    @property
+    def ok(self):
+        return self._response.is_success or self._response.is_redirect
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 600:
+            raise requests.exceptions.HTTPError(
+                http_error_message(
+                    self.status_code, self._response.reason_phrase, self.url
+                ),
+                response=self,
+            )
+
+    def iter_content(self, chunk_size=None):
+        import httpx
+
+        try:
+            yield from self._response.iter_bytes(chunk_size=chunk_size)
+        except httpx.HTTPError as e:
+            raise _translate_httpx_error(e) from e
+
+
+def _translate_httpx_error(exc):
+    """Map an httpx exception onto the ``requests`` exception fetch_page expects."""
+    import httpx
+
+    if isinstance(exc, httpx.TimeoutException):
+        return requests.exceptions.Timeout(str(exc))
+    if isinstance(exc, httpx.UnsupportedProtocol):
+        return requests.exceptions.InvalidSchema(str(exc))
+    if isinstance(exc, httpx.TransportError):
+        if is_ssl_error(exc):
+            return requests.exceptions.SSLError(str(exc))
+        return requests.exceptions.ConnectionError(str(exc))
+    return requests.exceptions.RequestException(str(exc))
+
+
+class Http2Fetcher(Fetcher):
+    """HTTP/2 fetcher built on ``httpx`` (requires the ``h2`` package).
+
+    All workers of a site share one client per proxy, so concurrent requests
+    to a domain are multiplexed as streams over a single TCP/TLS connection
+    instead of opening one connection per worker. Servers that do not offer
+    HTTP/2 in ALPN are transparently spoken to over HTTP/1.1.
+
+    Args:
+        keep_alive (bool): Keep idle connections open between requests.
+    """
+
+    name = "http2"
+
+    def __init__(self, keep_alive=True):
+        import httpx
+
+        self._httpx = httpx
+        self.keep_alive = keep_alive
+        self.accept_encoding = httpx_accept_encoding()
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+
+    def _client_for(self, proxies):
+        # httpx binds proxies to the client, so each proxy gets its own client.
+        proxy_url = (proxies.get("https") or proxies.get("http")) if proxies else None
+        with self._clients_lock:
+            client = self._clients.get(proxy_url)
+            if client is None:
+                httpx = self._httpx
+                client = httpx.Client(
+                    http2=True,
+                    proxy=proxy_url,
+                    verify=get_ssl_context(resume_sessions=proxy_url is None),
+                    follow_redirects=True,
+                    # Environment proxies are ignored, as for the requests fetcher.
+                    trust_env=False,
+                    limits=httpx.Limits(
+                        max_keepalive_connections=None if self.keep_alive else 0,
+                    ),
+                )
+                self._clients[proxy_url] = client
+            return client
+
+    @contextlib.contextmanager
+    def get(self, url, headers=None, timeout=None, proxies=None):
+        httpx = self._httpx
+        client = self._client_for(proxies)
+        try:
+            with client.stream("GET", url, headers=headers, timeout=timeout) as resp:
+                yield _HttpxResponse(resp)
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            raise _translate_httpx_error(e) from e
+
+    def head(self, url, headers=None, timeout=None, proxies=None):
+        httpx = self._httpx
+        try:
+            response = self._client_for(proxies).head(
+                url, headers=headers, timeout=timeout
+            )
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            raise _translate_httpx_error(e) from e
+        return _HttpxResponse(response)
+
+    def wire_bytes(self, response):
+        return response.num_bytes_downloaded
+
+    def close(self):
+        with self._clients_lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+
+FETCHERS = {
+    RequestsFetcher.name: RequestsFetcher,
+    Http2Fetcher.name: Http2Fetcher,
+}
+
+
+class RecordingResponse:
+    """Wraps a live response and collects the body chunks read through the fetcher.
+
+    Used by fetcher wrappers (HTTP cache, WARC writer) that need the body
+    ``fetch_page`` reads. The wrapper's ``iter_body`` sets ``started`` and
+    appends each chunk; ``complete`` is set once the body was read in full.
+    """
+
+    def __init__(self, response):
+        self.response = response
+        self.chunks = []
+        self.started = False
+        self.complete = False
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+
+def get_fetcher(name="requests", session=None, keep_alive=True, logger=None):
+    """Factory returning the fetcher backend called ``name``.
+
+    Falls back to the ``requests`` fetcher if the HTTP/2 dependencies
+    (``httpx`` and ``h2``) are not installed.
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+
+    name = (name or "requests").strip().lower()
+    if name not in FETCHERS:
+        raise ValueError(
+            f"Unknown fetcher '{name}'. Available fetchers: {', '.join(FETCHERS)}"
+        )
+
+    if name == Http2Fetcher.name:
+        try:
+            import h2  # noqa: F401
+            import httpx  # noqa: F401
+        except ImportError:
+            logger.error(
+                "HTTP/2 fetcher requires httpx and h2. Try running: pip install httpx[http2]. "
+                "Falling back to the requests fetcher."
+            )
+        else:
+            return Http2Fetcher(keep_alive=keep_alive)
+
+    return RequestsFetcher(session=session)
@@ -0,0 +1,236 @@
+"""Record/replay HTTP cache (``--http-cache record|replay``).
+
+``record`` stores every response a crawl receives (status, headers and the
+decoded body) in a per-domain SQLite file keyed by URL; ``replay`` answers
+from that file without touching the network, so a recorded crawl can be
+re-run in seconds to benchmark processors, extractors and database writes,
+or to reproduce a performance regression deterministically.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from database import get_connection
+from fetchers import Fetcher, RecordingResponse
+from utils import RETRIABLE_STATUS_CODES, ensure_directory_exists
+
+CACHE_MODES = ("off", "record", "replay")
+
+
+class CacheMissError(requests.exceptions.RequestException):
+    """Raised in replay mode for a URL that was never recorded."""
+
+
+def get_http_cache_name(domain, cache_dir, logger=None):
+    """Return the cache filename of a domain in ``cache_dir`` (created if absent)."""
+    ensure_directory_exists(cache_dir, logger=logger)
+    return os.path.join(cache_dir, f"http_cache_{domain}.db")
+
+
+def init_http_cache(cache_name, logger=None):
+    """Create the responses table of a cache file if it does not exist."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        conn = get_connection(cache_name)
+        with conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    url         TEXT PRIMARY KEY,
+                    status_code INTEGER NOT NULL,
+                    reason      TEXT,
+                    headers     TEXT NOT NULL,
+                    body        BLOB,
+                    wire_bytes  INTEGER,
+                    recorded_at TIMESTAMP
+                )
+                """
+            )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to initialize HTTP cache {cache_name}: {e}")
+
+
+def save_cached_response(
+    cache_name, url, status_code, reason, headers, body, wire_bytes, logger=None
+):
+    """Insert or replace the recorded response for ``url``."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        conn = get_connection(cache_name)
+        with conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO responses
+                    (url, status_code, reason, headers, body, wire_bytes, recorded_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    url,
+                    status_code,
+                    reason,
+                    json.dumps(list(headers.items())),
+                    body,
+                    wire_bytes,
+                    datetime.now(),
+                ),
+            )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to record {url} in the HTTP cache: {e}")
+
+
+def load_cached_response(cache_name, url, logger=None):
+    """Return the recorded response for ``url`` as a dict, or None."""
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    try:
+        row = (
+            get_connection(cache_name)
+            .execute(
+                "SELECT status_code, reason, headers, body, wire_bytes FROM responses WHERE url = ?",
+                (url,),
+            )
+            .fetchone()
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to read {url} from the HTTP cache: {e}")
+        return None
+    if row is None:
+        return None
+    return {
+        "status_code": row[0],
+        "reason": row[1],
+        "headers": CaseInsensitiveDict(json.loads(row[2])),
+        "body": row[3] or b"",
+        "wire_bytes": row[4],
+    }
+
+
+class _CachedResponse:
+    """A recorded response, exposing the ``requests.Response`` subset fetch_page uses."""
+
+    def __init__(self, url, entry):
+        self.url = url
+        self.status_code = entry["status_code"]
+        self.reason = entry["reason"]
+        self.headers = entry["headers"]
+        self.encoding = get_encoding_from_headers(self.headers)
+        self.body = entry["body"]
+        self.wire_bytes = entry["wire_bytes"]
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 600:
+            kind = "Client" if self.status_code < 500 else "Server"
+            raise requests.exceptions.HTTPError(
+                f"{self.status_code} {kind} Error: {self.reason} for url: {self.url}",
+                response=self,
+            )
+
+
+class CachingFetcher(Fetcher):
+    """Fetcher wrapper that records responses to, or replays them from, an HTTP cache.
+
+    In ``record`` mode requests go to the wrapped fetcher and each response is
+    stored once its body has been read in full (or was never read, e.g. an
+    HTTP error or a body rejected from its headers). ``304 Not Modified``
+    answers and transient failures (429, 503, 504) are not recorded, so they
+    do not overwrite the stored page. In ``replay`` mode nothing is sent;
+    URLs missing from the cache fail with ``CacheMissError``.
+
+    Args:
+        fetcher (Fetcher): The backend that talks to the network.
+        cache_name (str): Path of the SQLite cache file.
+        mode (str): 'record' or 'replay'.
+        logger: Optional logger instance.
+    """
+
+    def __init__(self, fetcher, cache_name, mode="record", logger=None):
+        if mode not in ("record", "replay"):
+            raise ValueError(
+                f"Unknown HTTP cache mode '{mode}'. Available modes: {', '.join(CACHE_MODES)}"
+            )
+        self.fetcher = fetcher
+        self.cache_name = cache_name
+        self.mode = mode
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.name = fetcher.name
+        self.accept_encoding = fetcher.accept_encoding
+        init_http_cache(cache_name, logger=self.logger)
+
+    def _replay(self, url):
+        entry = load_cached_response(self.cache_name, url, logger=self.logger)
+        if entry is None:
+            raise CacheMissError(f"Not in the HTTP cache: {url}")
+        return _CachedResponse(url, entry)
+
+    def _record(self, url, recording):
+        if (
+            recording.status_code == 304
+            or recording.status_code in RETRIABLE_STATUS_CODES
+        ):
+            # Keep the stored page rather than a 304 or a transient failure.
+            return
+        if recording.started and not recording.complete:
+            # Abandoned mid-body (e.g. over the size cap): nothing complete to store.
+            return
+        save_cached_response(
+            self.cache_name,
+            url,
+            recording.status_code,
+            getattr(recording.response, "reason", None),
+            recording.headers,
+            b"".join(recording.chunks),
+            self.fetcher.wire_bytes(recording.response) if recording.complete else 0,
+            logger=self.logger,
+        )
+
+    @contextlib.contextmanager
+    def get(self, url, headers=None, timeout=None, proxies=None):
+        if self.mode == "replay":
+            yield self._replay(url)
+            return
+        with self.fetcher.get(
+            url, headers=headers, timeout=timeout, proxies=proxies
+        ) as response:
+            recording = RecordingResponse(response)
+            try:
+                yield recording
+            finally:
+                self._record(url, recording)
+
+    def head(self, url, headers=None, timeout=None, proxies=None):
+        if self.mode == "replay":
+            return self._replay(url)
+        return self.fetcher.head(url, headers=headers, timeout=timeout, proxies=proxies)
+
+    def iter_body(self, response, chunk_size=65536):
+        if isinstance(response, _CachedResponse):
+            for start in range(0, len(response.body), chunk_size):
+                yield response.body[start : start + chunk_size]
+            return
+        response.started = True
+        for chunk in self.fetcher.iter_body(response.response, chunk_size=chunk_size):
+            response.chunks.append(chunk)
+            yield chunk
+        response.complete = True
+
+    def wire_bytes(self, response):
+        if isinstance(response, _CachedResponse):
+            return response.wire_bytes
+        return self.fetcher.wire_bytes(response.response)
+
+    def close(self):
+        self.fetcher.close()
@@ -0,0 +1,116 @@
+import math
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+# Score rules used when a site configures none. "source_scores" rates how a
+# link was discovered, "patterns" adds the score of every regex that matches
+# the URL, "depth_penalty" is taken off per link hop from the start URL, and
+# up to "freshness_bonus" is added for recent pages, halving every
+# "freshness_half_life_hours".
+DEFAULT_PRIORITY_RULES = {
+    "source_scores": {
+        "seed": 100,
+        "feed": 60,
+        "sitemap": 40,
+        "anchor": 0,
+        "link": -10,
+        "script": -40,
+    },
+    "depth_penalty": 5,
+    "patterns": [
+        # Dated article paths (/2024/10/15/...) and long slugs or numeric ids.
+        [r"/\d{4}/\d{1,2}/", 20],
+        [r"/[a-z0-9]+(?:-[a-z0-9]+){3,}/?$|/[^/]*\d{5,}[^/]*$", 20],
+        # Listing pages that mostly repeat links already known.
+        [r"/(?:tags?|category|categories|archives?|authors?|search|page)(?:/|$)", -30],
+        [r"[?&](?:page|p|sort|order|filter)=", -20],
+        # Assets and downloads.
+        [
+            r"\.(?:css|js|json|jpe?g|png|gif|svg|webp|ico|woff2?|ttf|pdf|zip|mp3|mp4)$",
+            -40,
+        ],
+    ],
+    "freshness_bonus": 50,
+    "freshness_half_life_hours": 24,
+}
+
+# Dates embedded in URL paths, used as a freshness hint when the link source
+# (sitemap <lastmod>, feed <pubDate>) gave none.
+_URL_DATE_RE = re.compile(r"/(\d{4})[/-](\d{1,2})[/-](\d{1,2})(?:/|-|$)")
+
+
+def _date_from_url(url) -> Optional[datetime]:
+    match = _URL_DATE_RE.search(url)
+    if not match:
+        return None
+    try:
+        return datetime(*(int(part) for part in match.groups()), tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+class PriorityPolicy:
+    """Scores discovered URLs; the frontier hands out the highest score first.
+
+    Args:
+        rules (dict): Overrides of ``DEFAULT_PRIORITY_RULES``. ``source_scores``
+                      is merged key by key; ``patterns`` (a list of
+                      ``[regex, score]`` pairs) replaces the default list.
+    """
+
+    def __init__(self, rules: Optional[dict] = None):
+        rules = dict(rules or {})
+        self.source_scores = {
+            **DEFAULT_PRIORITY_RULES["source_scores"],
+            **rules.get("source_scores", {}),
+        }
+        self.depth_penalty = rules.get(
+            "depth_penalty", DEFAULT_PRIORITY_RULES["depth_penalty"]
+        )
+        self.patterns = [
+            (re.compile(pattern, re.IGNORECASE), score)
+            for pattern, score in rules.get(
+                "patterns", DEFAULT_PRIORITY_RULES["patterns"]
+            )
+        ]
+        self.freshness_bonus = rules.get(
+            "freshness_bonus", DEFAULT_PRIORITY_RULES["freshness_bonus"]
+        )
+        self.freshness_half_life_hours = rules.get(
+            "freshness_half_life_hours",
+            DEFAULT_PRIORITY_RULES["freshness_half_life_hours"],
+        )
+
+    @classmethod
+    def from_config(cls, config) -> "PriorityPolicy":
+        """Build a policy from a CrawlerConfig."""
+        return cls(config.priority_rules)
+
+    def freshness(self, url, lastmod=None) -> float:
+        """Return the freshness bonus from ``lastmod`` or a date in the URL."""
+        published = lastmod or _date_from_url(url)
+        if published is None or not self.freshness_bonus:
+            return 0.0
+        if published.tzinfo is None:
+            published = published.replace(tzinfo=timezone.utc)
+        age_hours = (datetime.now(timezone.utc) - published).total_seconds() / 3600
+        half_life = max(self.freshness_half_life_hours, 1e-6)
+        return self.freshness_bonus * math.pow(0.5, max(0.0, age_hours) / half_life)
+
+    def score(self, url, depth=0, source="anchor", lastmod=None) -> int:
+        """Return the priority of ``url`` (higher is crawled sooner).
+
+        Args:
+            url (str): The discovered URL.
+            depth (int): Link hops from the start URL.
+            source (str): How it was found: 'seed', 'sitemap', 'feed',
+                          'anchor', 'link' (``<link href>``) or 'script'.
+            lastmod (datetime): Last-modified / publication time given by a
+                                sitemap or feed, if any.
+        """
+        score = self.source_scores.get(source, 0)
+        score -= self.depth_penalty * (depth or 0)
+        score += sum(value for regex, value in self.patterns if regex.search(url))
+        score += self.freshness(url, lastmod)
+        return int(round(score))
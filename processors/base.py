@@ -9,7 +9,8 @@ class BaseContentProcessor:
         Args:
             crawler: The crawler instance (for configuration/DB access).
             url (str): The fetched URL.
-            content (str): The raw page content.
+            content (str | bytes): The page content: decoded text for textual
+                                   MIME types, raw bytes for binary responses.
             content_type (str): The MIME type.
 
         Returns:
@@ -1,5 +1,5 @@
 from bs4 import BeautifulSoup
-from utils import extract_links, compute_hash
+from utils import extract_links, compute_hash, is_xml_feed
 from database import is_duplicate_content, update_queue_link, get_connection
 from .base import BaseContentProcessor
 
@@ -73,13 +73,18 @@ class ForumContentProcessor(BaseContentProcessor):
 
         content_hash = compute_hash(content)
         if crawler.no_duplicates and is_duplicate_content(
-            crawler.database_name, content_hash, logger=crawler.logger
+            crawler.database_name, content_hash, link=url, logger=crawler.logger
         ):
             crawler.logger.info(f"Skipping duplicate content: {url}")
+            # Record it as crawled without a body so the frontier does not
+            # hand it out again before the next re-crawl.
+            update_queue_link(
+                crawler.database_name, url, None, None, logger=crawler.logger
+            )
             return None, set(), None
 
         is_html = (content_type and "html" in content_type) or (
-            content
+            isinstance(content, str)
             and any(
                 tag in content[:1000].lower()
                 for tag in ("<html", "<body", "<p", "<div")
@@ -88,9 +93,14 @@ class ForumContentProcessor(BaseContentProcessor):
         soup = BeautifulSoup(content, "html.parser") if is_html else None
         new_links = (
             extract_links(
-                url, content, crawler.robots_parser, soup=soup, logger=crawler.logger
+                url,
+                content,
+                crawler.robots_parser,
+                soup=soup,
+                canonicalize=crawler.canonicalize_url,
+                logger=crawler.logger,
             )
-            if soup
+            if soup or is_xml_feed(content)
             else set()
         )
 
@@ -1,5 +1,5 @@
 from bs4 import BeautifulSoup
-from utils import extract_links, compute_hash
+from utils import extract_links, compute_hash, is_xml_feed
 from database import is_duplicate_content, update_queue_link, get_connection
 from datetime import datetime
 from .base import BaseContentProcessor
@@ -81,15 +81,21 @@ class NewsContentProcessor(BaseContentProcessor):
         # Check for duplicate content using the database index.
         content_hash = compute_hash(content)
         if crawler.no_duplicates and is_duplicate_content(
-            crawler.database_name, content_hash, logger=crawler.logger
+            crawler.database_name, content_hash, link=url, logger=crawler.logger
         ):
             crawler.logger.info(f"Skipping duplicate content: {url}")
+            # Record it as crawled without a body so the frontier does not
+            # hand it out again before the next re-crawl.
+            update_queue_link(
+                crawler.database_name, url, None, None, logger=crawler.logger
+            )
             return None, set(), None
 
         # Detect HTML once using the Content-Type header or a limited prefix search of
         # the first 1000 characters, avoiding memory-intensive full-page string copies.
+        # Binary bodies arrive as raw bytes and are never sniffed.
         is_html = (content_type and "html" in content_type) or (
-            content
+            isinstance(content, str)
             and any(
                 tag in content[:1000].lower()
                 for tag in ("<html", "<body", "<p", "<div")
@@ -100,9 +106,14 @@ class NewsContentProcessor(BaseContentProcessor):
         # Extract links FIRST using the pre-parsed soup (non-destructive)
         new_links = (
             extract_links(
-                url, content, crawler.robots_parser, soup=soup, logger=crawler.logger
+                url,
+                content,
+                crawler.robots_parser,
+                soup=soup,
+                canonicalize=crawler.canonicalize_url,
+                logger=crawler.logger,
             )
-            if soup
+            if soup or is_xml_feed(content)
             else set()
         )
 
@@ -1,14 +1,38 @@
+import logging
+import socket
+import threading
+import time
+import zlib
+from urllib.parse import quote, urlsplit
+
+# Statuses that mean the target (or the proxy itself) refuses this exit.
+BAN_STATUS_CODES = (403, 407, 429)
+# Statuses a proxy answers with when it cannot reach the target.
+PROXY_FAILURE_STATUS_CODES = (502, 504)
+
+
 class ProxyProvider:
-    """Base interface for connection proxy providers."""
+    """Base interface for connection proxy providers.
 
-    def get_proxies(self) -> dict:
+    ``get_proxies`` receives an optional request context, a dict with the
+    ``url`` being fetched, its ``domain`` and the ``worker`` fetching it, so
+    providers can route per request. ``report_result`` is called after every
+    fetch with the proxies that were used, so providers can track their health.
+    """
+
+    def get_proxies(self, context: dict = None) -> dict:
         raise NotImplementedError
 
+    def report_result(
+        self, proxies: dict, latency: float, success: bool, status_code: int = None
+    ):
+        pass
+
 
 class DirectConnectionProvider(ProxyProvider):
     """Fallback default connection (no proxy)."""
 
-    def get_proxies(self) -> dict:
+    def get_proxies(self, context: dict = None) -> dict:
         return {}
 
 
@@ -18,27 +42,345 @@ class StaticProxyProvider(ProxyProvider):
     def __init__(self, proxy_url: str):
         self.proxy_url = proxy_url
 
-    def get_proxies(self) -> dict:
+    def get_proxies(self, context: dict = None) -> dict:
         return {"http": self.proxy_url, "https": self.proxy_url}
 
 
+class TorController:
+    """Minimal client for Tor's control port, used to request fresh circuits.
+
+    Authenticates with ``password`` (``HashedControlPassword``), or with no
+    credentials when the control port is configured without authentication.
+    """
+
+    def __init__(self, host="127.0.0.1", port=9051, password=None, timeout=10):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+
+    def _command(self, sock_file, command):
+        sock_file.write(f"{command}\r\n".encode())
+        sock_file.flush()
+        reply = sock_file.readline().decode(errors="replace").strip()
+        if not reply.startswith("250"):
+            raise ConnectionError(f"Tor control port refused '{command}': {reply}")
+
+    def new_identity(self):
+        """Send ``SIGNAL NEWNYM``: new streams get new circuits."""
+        with socket.create_connection((self.host, self.port), self.timeout) as sock:
+            with sock.makefile("rwb") as sock_file:
+                if self.password is not None:
+                    escaped = self.password.replace("\\", "\\\\").replace('"', '\\"')
+                    self._command(sock_file, f'AUTHENTICATE "{escaped}"')
+                else:
+                    self._command(sock_file, "AUTHENTICATE")
+                self._command(sock_file, "SIGNAL NEWNYM")
+
+
 class TorProxyProvider(StaticProxyProvider):
-    """Tor proxy provider mapping to a local SOCKS5h Tor proxy wrapper."""
+    """Tor proxy provider mapping to a local SOCKS5h Tor proxy wrapper.
 
-    def __init__(self, tor_url: str = "socks5h://127.0.0.1:9050"):
+    Tor isolates streams by SOCKS credentials (``IsolateSOCKSAuth``, on by
+    default), so giving each worker (or each domain) its own made-up username
+    puts it on its own circuit, and the crawl is no longer limited to a single
+    circuit's bandwidth. With several ``socks_ports`` the isolation keys are
+    also spread over the ports (e.g. ports of separate Tor instances).
+
+    When ``renew_after_failures`` fetches in a row fail through one circuit,
+    its key gets fresh credentials, and therefore a fresh circuit. If a control
+    port is configured, ``SIGNAL NEWNYM`` is sent as well (at most every
+    ``NEWNYM_INTERVAL`` seconds, which is as often as Tor accepts it).
+
+    Args:
+        tor_url (str): SOCKS URL of the Tor client.
+        isolation (str): 'worker', 'domain' or 'none' (one shared endpoint).
+        socks_ports (list): SocksPorts to spread isolation keys over
+                            (default: the port of ``tor_url``).
+        control_port (int): Tor ControlPort for NEWNYM; None disables it.
+        control_password (str): Password for the control port.
+        renew_after_failures (int): Consecutive failures before a circuit is renewed.
+        logger: Optional logger instance.
+    """
+
+    ISOLATION_MODES = ("none", "worker", "domain")
+    NEWNYM_INTERVAL = 10
+
+    def __init__(
+        self,
+        tor_url: str = "socks5h://127.0.0.1:9050",
+        isolation: str = "worker",
+        socks_ports=None,
+        control_port=None,
+        control_password=None,
+        renew_after_failures=3,
+        logger=None,
+    ):
         super().__init__(tor_url)
+        if isolation not in self.ISOLATION_MODES:
+            raise ValueError(
+                f"Unknown Tor isolation '{isolation}'. "
+                f"Available modes: {', '.join(self.ISOLATION_MODES)}"
+            )
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.isolation = isolation
+        parts = urlsplit(tor_url)
+        self.scheme = parts.scheme or "socks5h"
+        self.host = parts.hostname or "127.0.0.1"
+        self.socks_ports = [int(port) for port in socks_ports or [parts.port or 9050]]
+        self.controller = (
+            TorController(self.host, control_port, control_password)
+            if control_port
+            else None
+        )
+        self.renew_after_failures = max(1, renew_after_failures)
+        self._generations = {}  # isolation key -> credential generation
+        self._failures = {}  # proxy URL -> consecutive failures
+        self._keys = {}  # proxy URL -> isolation key
+        self._last_newnym = 0.0
+        self._lock = threading.Lock()
 
+    def _proxy_url_for(self, key) -> str:
+        port = self.socks_ports[zlib.crc32(key.encode()) % len(self.socks_ports)]
+        generation = self._generations.get(key, 0)
+        username = quote(f"{self.isolation}-{key}-{generation}", safe="")
+        return f"{self.scheme}://{username}:crawler@{self.host}:{port}"
 
-def get_proxy_provider(proxy_str: str) -> ProxyProvider:
-    """Factory function to parse proxy configuration string and return a provider."""
-    if not proxy_str:
-        return DirectConnectionProvider()
+    def get_proxies(self, context: dict = None) -> dict:
+        key = (context or {}).get(self.isolation) if self.isolation != "none" else None
+        if not key:
+            return super().get_proxies(context)
+        with self._lock:
+            proxy_url = self._proxy_url_for(str(key))
+            self._keys[proxy_url] = str(key)
+        return {"http": proxy_url, "https": proxy_url}
 
-    proxy_str_stripped = proxy_str.strip()
-    if not proxy_str_stripped:
+    def report_result(
+        self, proxies: dict, latency: float, success: bool, status_code: int = None
+    ):
+        proxy_url = (proxies or {}).get("https") or (proxies or {}).get("http")
+        with self._lock:
+            key = self._keys.get(proxy_url)
+            if key is None:
+                return
+            if success and status_code not in BAN_STATUS_CODES:
+                self._failures.pop(proxy_url, None)
+                return
+            failures = self._failures.get(proxy_url, 0) + 1
+            if failures < self.renew_after_failures:
+                self._failures[proxy_url] = failures
+                return
+            # Fresh credentials make Tor build a new circuit for this key.
+            self._failures.pop(proxy_url, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+            send_newnym = (
+                self.controller is not None
+                and time.monotonic() - self._last_newnym >= self.NEWNYM_INTERVAL
+            )
+            if send_newnym:
+                self._last_newnym = time.monotonic()
+        self.logger.warning(
+            f"Renewing the Tor circuit for {self.isolation} '{key}' after "
+            f"{failures} failed requests."
+        )
+        if send_newnym:
+            try:
+                self.controller.new_identity()
+                self.logger.info("Sent NEWNYM to the Tor control port.")
+            except (OSError, ConnectionError) as e:
+                self.logger.warning(f"Tor circuit renewal via control port failed: {e}")
+
+
+class ProxyHealth:
+    """Running health figures for one proxy of a ``ProxyPoolProvider``."""
+
+    def __init__(self, proxy_url: str):
+        self.proxy_url = proxy_url
+        self.latency = None  # EWMA of the fetch latency in seconds
+        self.success_rate = 1.0  # EWMA of successful fetches (0.0 - 1.0)
+        self.requests = 0
+        self.failures = 0  # consecutive failures
+        self.bans = 0
+        self.evictions = 0
+        self.evicted_until = 0.0
+        self.current_weight = 0.0  # smooth weighted round-robin state
+
+    def score(self) -> float:
+        """Routing weight: favours reliable, fast proxies (untried ones get a fair share)."""
+        latency = self.latency if self.latency is not None else 1.0
+        return self.success_rate**2 / max(latency, 0.05)
+
+    def summary(self) -> str:
+        latency = f"{self.latency:.2f}s" if self.latency is not None else "n/a"
+        return (
+            f"{self.proxy_url}: {self.requests} requests, "
+            f"{self.success_rate:.0%} success, latency {latency}, "
+            f"{self.bans} bans, {self.evictions} evictions"
+        )
+
+
+class ProxyPoolProvider(ProxyProvider):
+    """Spreads requests over several proxies, routing around unhealthy ones.
+
+    Each proxy's latency and success rate are tracked as moving averages from
+    ``report_result``, and requests are routed by smooth weighted round-robin
+    on a health score (success rate squared over latency). A proxy that fails
+    ``max_failures`` times in a row, or gets banned (403, 407 or 429), is
+    evicted for ``eviction_seconds``, doubling with every further eviction.
+    If every proxy is evicted, the one coming back first is used.
+
+    Args:
+        proxy_urls (list): Proxy URLs (HTTP, HTTPS or SOCKS).
+        sticky (bool): Keep sending a domain through the same proxy while it
+                       stays healthy (cookies and sessions survive).
+        max_failures (int): Consecutive failures before a proxy is evicted.
+        eviction_seconds (float): How long a first eviction lasts.
+        smoothing (float): EWMA weight of the newest sample.
+        logger: Optional logger instance.
+    """
+
+    def __init__(
+        self,
+        proxy_urls,
+        sticky=False,
+        max_failures=3,
+        eviction_seconds=300,
+        smoothing=0.3,
+        logger=None,
+    ):
+        if not proxy_urls:
+            raise ValueError("ProxyPoolProvider needs at least one proxy URL")
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.sticky = sticky
+        self.max_failures = max(1, max_failures)
+        self.eviction_seconds = eviction_seconds
+        self.smoothing = smoothing
+        self._health = {url: ProxyHealth(url) for url in dict.fromkeys(proxy_urls)}
+        self._sticky_proxies = {}  # domain -> proxy URL
+        self._lock = threading.Lock()
+
+    @property
+    def proxy_urls(self) -> list:
+        return list(self._health)
+
+    def _is_available(self, health, now) -> bool:
+        return health.evicted_until <= now
+
+    def _pick(self, now) -> ProxyHealth:
+        available = [h for h in self._health.values() if self._is_available(h, now)]
+        if not available:
+            return min(self._health.values(), key=lambda h: h.evicted_until)
+
+        # Smooth weighted round-robin (as in nginx): spreads picks evenly in
+        # proportion to the weights instead of sending bursts to one proxy.
+        total = 0.0
+        best = None
+        for health in available:
+            weight = health.score()
+            health.current_weight += weight
+            total += weight
+            if best is None or health.current_weight > best.current_weight:
+                best = health
+        best.current_weight -= total
+        return best
+
+    def get_proxies(self, context: dict = None) -> dict:
+        domain = (context or {}).get("domain")
+        with self._lock:
+            now = time.monotonic()
+            health = None
+            if self.sticky and domain:
+                health = self._health.get(self._sticky_proxies.get(domain))
+                if health is not None and not self._is_available(health, now):
+                    health = None
+            if health is None:
+                health = self._pick(now)
+                if self.sticky and domain:
+                    self._sticky_proxies[domain] = health.proxy_url
+            return {"http": health.proxy_url, "https": health.proxy_url}
+
+    def report_result(
+        self, proxies: dict, latency: float, success: bool, status_code: int = None
+    ):
+        proxy_url = (proxies or {}).get("https") or (proxies or {}).get("http")
+        with self._lock:
+            health = self._health.get(proxy_url)
+            if health is None:
+                return
+            banned = status_code in BAN_STATUS_CODES
+            failed = banned or not success
+            a = self.smoothing
+            health.requests += 1
+            if latency is not None and not failed:
+                health.latency = (
+                    latency
+                    if health.latency is None
+                    else a * latency + (1 - a) * health.latency
+                )
+            health.success_rate = (
+                a * (0.0 if failed else 1.0) + (1 - a) * health.success_rate
+            )
+            if not failed:
+                health.failures = 0
+                return
+            health.failures += 1
+            if banned:
+                health.bans += 1
+            if not banned and health.failures < self.max_failures:
+                return
+            health.evictions += 1
+            health.failures = 0
+            duration = self.eviction_seconds * 2 ** (health.evictions - 1)
+            health.evicted_until = time.monotonic() + duration
+            reason = f"HTTP {status_code}" if banned else "repeated failures"
+        self.logger.warning(
+            f"Evicting proxy {proxy_url} for {duration:.0f}s ({reason})."
+        )
+
+    def summary(self) -> str:
+        with self._lock:
+            return "; ".join(h.summary() for h in self._health.values())
+
+
+def parse_proxy_list(proxy) -> list:
+    """Split a proxy setting (a list, or a comma-separated string) into proxy URLs."""
+    if isinstance(proxy, (list, tuple)):
+        items = proxy
+    else:
+        items = str(proxy).split(",")
+    return [item.strip() for item in items if item and item.strip()]
+
+
+def get_proxy_provider(
+    proxy,
+    sticky: bool = False,
+    tor_isolation: str = "worker",
+    tor_socks_ports=None,
+    tor_control_port=None,
+    tor_control_password=None,
+    logger=None,
+) -> ProxyProvider:
+    """Factory function to parse proxy configuration and return a provider.
+
+    ``proxy`` is empty for a direct connection, ``"tor"``, a proxy URL, or
+    several proxy URLs (a list, or comma-separated) for a ``ProxyPoolProvider``.
+    The ``tor_*`` options configure the ``TorProxyProvider``.
+    """
+    proxy_urls = parse_proxy_list(proxy) if proxy else []
+    if not proxy_urls:
         return DirectConnectionProvider()
 
+    if len(proxy_urls) > 1:
+        return ProxyPoolProvider(proxy_urls, sticky=sticky, logger=logger)
+
+    proxy_str_stripped = proxy_urls[0]
     if proxy_str_stripped.lower() == "tor":
-        return TorProxyProvider()
+        return TorProxyProvider(
+            isolation=tor_isolation,
+            socks_ports=tor_socks_ports,
+            control_port=tor_control_port,
+            control_password=tor_control_password,
+            logger=logger,
+        )
 
     return StaticProxyProvider(proxy_str_stripped)
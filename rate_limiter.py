@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import time
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Hands out fetch permits for one host at a fixed rate of 1 / ``delay``.
+
+    Permits are spaced by ``delay`` seconds regardless of how many workers ask
+    for them or how long their requests take, so the request rate to the host
+    stays at the politeness budget. ``burst`` permits may be handed out back
+    to back after an idle period (1 = strict spacing). The rate can be changed
+    at any time with ``set_delay``.
+
+    Implemented as a virtual-scheduling (GCRA) bucket: each permit is reserved
+    up front, so waiting workers are served in arrival order.
+    """
+
+    def __init__(self, delay: float, burst: int = 1):
+        self._lock = threading.Lock()
+        self.delay = max(0.0, float(delay))
+        self.burst = max(1, int(burst))
+        # Theoretical arrival time of the next permit (monotonic clock).
+        self._next_permit_at = time.monotonic()
+        # No permit is handed out before this time (see ``defer``).
+        self._paused_until = 0.0
+
+    def set_delay(self, delay: float):
+        """Change the permit interval; already reserved permits keep their slots."""
+        with self._lock:
+            delay = max(0.0, float(delay))
+            last_permit_at = self._next_permit_at - self.delay
+            self._next_permit_at = max(time.monotonic(), last_permit_at + delay)
+            self.delay = delay
+
+    def defer(self, seconds: float):
+        """Hand out no permit for the next ``seconds`` (e.g. a ``Retry-After``).
+
+        Workers already waiting for a reserved permit wait out the pause too.
+        """
+        with self._lock:
+            paused_until = time.monotonic() + max(0.0, float(seconds))
+            self._paused_until = max(self._paused_until, paused_until)
+            self._next_permit_at = max(self._next_permit_at, self._paused_until)
+
+    def _rereserve_if_paused(self) -> float:
+        """Return the wait for a fresh permit if a pause is in effect, else 0.
+
+        Permits reserved before a ``defer`` are given up rather than all
+        being handed out together once the pause ends.
+        """
+        with self._lock:
+            paused = self._paused_until > time.monotonic()
+        return self.reserve() if paused else 0.0
+
+    def reserve(self) -> float:
+        """Reserve the next permit and return how many seconds to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            next_permit_at = max(self._next_permit_at, now)
+            permit_at = max(now, next_permit_at - (self.burst - 1) * self.delay)
+            self._next_permit_at = next_permit_at + self.delay
+            return permit_at - now
+
+    def try_acquire(self) -> float:
+        """Take a permit if one is available now, without waiting.
+
+        Returns:
+            float: 0 if a permit was taken, else the seconds until the next
+            one is available (nothing is reserved).
+        """
+        with self._lock:
+            now = time.monotonic()
+            next_permit_at = max(self._next_permit_at, now)
+            permit_at = max(now, next_permit_at - (self.burst - 1) * self.delay)
+            if permit_at > now:
+                return permit_at - now
+            self._next_permit_at = next_permit_at + self.delay
+            return 0.0
+
+    def acquire(self, shutdown_event=None) -> bool:
+        """Block until a permit is available.
+
+        Returns:
+            bool: False if ``shutdown_event`` was set while waiting.
+        """
+        wait = self.reserve()
+        while wait > 0:
+            if shutdown_event is None:
+                time.sleep(wait)
+            elif shutdown_event.wait(wait):
+                return False
+            # A pause requested while waiting also holds back reserved permits.
+            wait = self._rereserve_if_paused()
+        return shutdown_event is None or not shutdown_event.is_set()
+
+    async def acquire_async(self, shutdown_event=None) -> bool:
+        """Asyncio counterpart of ``acquire``; wakes early if shutdown is requested."""
+        remaining = self.reserve()
+        while remaining > 0:
+            if shutdown_event is not None and shutdown_event.is_set():
+                return False
+            step = min(remaining, 0.5)
+            await asyncio.sleep(step)
+            remaining -= step
+            if remaining <= 0:
+                remaining = self._rereserve_if_paused()
+        return shutdown_event is None or not shutdown_event.is_set()
+
+
+def get_rate_limiter(host: str, delay: float, burst: int = 1) -> TokenBucket:
+    """Return the process-wide bucket for ``host``, creating it on first use.
+
+    Crawlers for the same host share one bucket. A later caller's ``delay``
+    only replaces the existing rate if it is slower.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = _limiters[host] = TokenBucket(delay, burst=burst)
+        elif delay > limiter.delay:
+            limiter.set_delay(delay)
+        return limiter
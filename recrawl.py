@@ -0,0 +1,51 @@
+from typing import Optional
+
+
+class RecrawlPolicy:
+    """Adapts each URL's re-crawl interval to how often its content changes.
+
+    A page is first revisited ``initial_hours`` after it was fetched. Each
+    revisit then halves the interval if the content hash changed and doubles
+    it if not (a ``304 Not Modified`` counts as unchanged), within
+    ``[min_hours, max_hours]``. Front pages settle near the minimum and old
+    articles near the maximum. With ``adaptive`` off every page keeps the
+    initial interval.
+
+    Args:
+        initial_hours (float): Interval after the first fetch (``re_crawl_time``).
+        min_hours (float): Shortest interval.
+        max_hours (float): Longest interval.
+        adaptive (bool): Adapt the interval to the observed changes.
+    """
+
+    def __init__(
+        self, initial_hours=3.0, min_hours=0.5, max_hours=720.0, adaptive=True
+    ):
+        self.min_hours = min(min_hours, max_hours)
+        self.max_hours = max_hours
+        self.adaptive = adaptive
+        self.initial_hours = initial_hours
+        if adaptive:
+            self.initial_hours = min(max(initial_hours, self.min_hours), max_hours)
+
+    @classmethod
+    def from_config(cls, config) -> "RecrawlPolicy":
+        """Build a policy from a CrawlerConfig."""
+        return cls(
+            config.re_crawl_time,
+            config.min_re_crawl_time,
+            config.max_re_crawl_time,
+            adaptive=config.adaptive_recrawl,
+        )
+
+    def next_interval(self, interval: Optional[float], changed: bool) -> float:
+        """Return the hours until the next visit of a page just fetched.
+
+        Args:
+            interval (float): The page's current interval (None: first fetch).
+            changed (bool): Whether its content changed since the last fetch.
+        """
+        if interval is None or not self.adaptive:
+            return self.initial_hours
+        interval = interval / 2 if changed else interval * 2
+        return min(max(interval, self.min_hours), self.max_hours)
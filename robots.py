@@ -0,0 +1,279 @@
+"""robots.txt handling: a compiled rule matcher and a cached, refreshable policy.
+
+``RobotsRules`` parses a robots.txt once into the rule group that applies to
+the crawler's user agent and answers ``is_allowed`` with RFC 9309 semantics
+(the longest matching ``Allow`` / ``Disallow`` pattern wins, ``Allow`` on a
+tie; ``*`` and ``$`` wildcards). Verdicts are memoized per path, so the
+checks repeated for every discovered link cost a dict lookup.
+
+``RobotsPolicy`` fetches robots.txt, keeps a copy in the crawler database so
+restarts within ``ttl`` do not fetch it again, and can refresh it in the
+background during long crawls.
+"""
+
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import quote, unquote, urljoin, urlsplit
+
+from database import load_robots_txt, save_robots_txt
+
+# Verdicts memoized per matcher before the cache is cleared and refilled.
+MAX_CACHED_VERDICTS = 100000
+
+# Delay before retrying a robots.txt that could not be fetched.
+FAILED_FETCH_RETRY_SECONDS = 300
+
+
+def _normalize_path(path):
+    """Percent-encode a path or pattern the same way on both sides of a match."""
+    return quote(unquote(path), safe="/%*$?=&;:@+,!~'()")
+
+
+class _Rule:
+    __slots__ = ("pattern", "allow", "length", "regex")
+
+    def __init__(self, pattern, allow):
+        self.pattern = pattern
+        self.allow = allow
+        self.length = len(pattern)
+        if "*" in pattern or pattern.endswith("$"):
+            anchored = pattern.endswith("$")
+            body = pattern[:-1] if anchored else pattern
+            regex = ".*".join(re.escape(part) for part in body.split("*"))
+            self.regex = re.compile(regex + ("$" if anchored else ""))
+        else:
+            self.regex = None
+
+    def matches(self, path):
+        if self.regex is None:
+            return path.startswith(self.pattern)
+        return self.regex.match(path) is not None
+
+
+class RobotsRules:
+    """The rules of one robots.txt, compiled for one user agent.
+
+    Args:
+        content (str): The robots.txt body ('' allows everything).
+        user_agent (str): The crawler's User-Agent; its product token (the
+            part before '/') selects the group of rules.
+        disallow_all (bool): Deny every path, e.g. when robots.txt could not
+            be fetched (RFC 9309: a server error means complete disallow).
+    """
+
+    def __init__(self, content, user_agent, disallow_all=False):
+        self.disallow_all = disallow_all
+        self.crawl_delay = None
+        self.sitemaps = []
+        self._verdicts = {}
+        self._rules = self._compile(content or "", user_agent)
+
+    def _compile(self, content, user_agent):
+        product = user_agent.split("/")[0].strip().lower()
+        groups = []  # [(agents, rules, crawl_delay)]
+        agents, rules, delay = [], [], [None]
+        in_agent_lines = False
+        for line in content.splitlines():
+            line = line.split("#", 1)[0].strip()
+            if ":" not in line:
+                continue
+            key, value = (part.strip() for part in line.split(":", 1))
+            key = key.lower()
+            if key == "user-agent":
+                if not in_agent_lines:
+                    agents, rules, delay = [], [], [None]
+                    groups.append((agents, rules, delay))
+                    in_agent_lines = True
+                agents.append(value.lower())
+                continue
+            in_agent_lines = False
+            if key == "sitemap":
+                # Sitemap lines are global, outside any group.
+                self.sitemaps.append(value)
+            elif not groups:
+                continue
+            elif key in ("allow", "disallow") and value:
+                rules.append(_Rule(_normalize_path(value), key == "allow"))
+            elif key == "crawl-delay":
+                try:
+                    delay[0] = float(value)
+                except ValueError:
+                    pass
+
+        matched = [g for g in groups if any(a != "*" and a in product for a in g[0])]
+        if not matched:
+            matched = [g for g in groups if "*" in g[0]]
+        selected = [rule for group in matched for rule in group[1]]
+        delays = [group[2][0] for group in matched if group[2][0] is not None]
+        self.crawl_delay = max(delays) if delays else None
+        # Longest pattern first and Allow before Disallow on equal length, so
+        # the first match is the verdict.
+        selected.sort(key=lambda rule: (-rule.length, not rule.allow))
+        return selected
+
+    def is_allowed(self, url) -> bool:
+        """Return True if the rules allow fetching ``url``."""
+        if self.disallow_all:
+            return False
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += f"?{parts.query}"
+        verdict = self._verdicts.get(path)
+        if verdict is None:
+            verdict = self._match(path)
+            if len(self._verdicts) >= MAX_CACHED_VERDICTS:
+                self._verdicts.clear()
+            self._verdicts[path] = verdict
+        return verdict
+
+    def _match(self, path):
+        if path == "/robots.txt":
+            return True
+        path = _normalize_path(path)
+        for rule in self._rules:
+            if rule.matches(path):
+                return rule.allow
+        return True
+
+
+class RobotsPolicy:
+    """robots.txt of one site: cached in the crawler database and kept fresh.
+
+    ``load`` uses the stored copy while it is younger than ``ttl`` seconds and
+    fetches robots.txt otherwise. A 4xx answer allows everything; any other
+    failure keeps a previously stored copy, or disallows everything until a
+    retry succeeds. ``start_refresh`` re-fetches it every ``ttl`` seconds in a
+    daemon thread, swapping the compiled rules in place.
+
+    Args:
+        start_url (str): Any URL of the site.
+        user_agent (str): The crawler's User-Agent.
+        fetch (callable): ``fetch(robots_url) -> (content, status_code, error)``.
+        database_name (str): Crawler database holding the cached copy.
+        ttl (float): Seconds a fetched robots.txt is considered fresh.
+        on_update (callable): Called with the policy after each refresh.
+        logger: Optional logger instance.
+    """
+
+    def __init__(
+        self,
+        start_url,
+        user_agent,
+        fetch,
+        database_name,
+        ttl=86400,
+        on_update=None,
+        logger=None,
+    ):
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.robots_url = urljoin(start_url, "/robots.txt")
+        self.domain = urlsplit(start_url).netloc
+        self.user_agent = user_agent
+        self._fetch = fetch
+        self.database_name = database_name
+        self.ttl = ttl
+        self.on_update = on_update
+        self.rules = RobotsRules("", user_agent)
+        self.fetched_at = None  # When the rules were fetched (None: last fetch failed)
+        self._thread = None
+
+    @property
+    def crawl_delay(self):
+        return self.rules.crawl_delay
+
+    @property
+    def sitemaps(self):
+        """The ``Sitemap:`` URLs listed in robots.txt."""
+        return list(self.rules.sitemaps)
+
+    def is_allowed(self, url) -> bool:
+        return self.rules.is_allowed(url)
+
+    def load(self) -> bool:
+        """Load robots.txt from the cache or the site.
+
+        Returns:
+            bool: False if it could not be fetched and no cached copy exists.
+        """
+        cached = load_robots_txt(self.database_name, self.domain, logger=self.logger)
+        if cached and datetime.now() - cached["fetched_at"] < timedelta(
+            seconds=self.ttl
+        ):
+            self.rules = RobotsRules(cached["content"], self.user_agent)
+            self.fetched_at = cached["fetched_at"]
+            self.logger.info(
+                f"Using robots.txt cached at {cached['fetched_at']:%Y-%m-%d %H:%M:%S}."
+            )
+            return True
+        return self.refresh(cached)
+
+    def refresh(self, cached=None) -> bool:
+        """Fetch robots.txt and recompile the rules."""
+        content, status_code, error = self._fetch(self.robots_url)
+        if error and status_code is not None and 400 <= status_code < 500:
+            self.logger.info(f"No usable robots.txt ({error}); all paths are allowed.")
+            content = ""
+        elif error:
+            if cached is None:
+                cached = load_robots_txt(
+                    self.database_name, self.domain, logger=self.logger
+                )
+            if cached:
+                self.logger.warning(
+                    f"Failed to fetch robots.txt: {error}. Keeping the copy from "
+                    f"{cached['fetched_at']:%Y-%m-%d %H:%M:%S}."
+                )
+                self.rules = RobotsRules(cached["content"], self.user_agent)
+                self.fetched_at = None  # Retry soon rather than after a full ttl
+                return True
+            self.logger.warning(
+                f"Failed to fetch robots.txt: {error}. Disallowing all paths until "
+                f"it can be fetched."
+            )
+            self.rules = RobotsRules("", self.user_agent, disallow_all=True)
+            self.fetched_at = None
+            return False
+        self.rules = RobotsRules(content, self.user_agent)
+        self.fetched_at = datetime.now()
+        save_robots_txt(self.database_name, self.domain, content, logger=self.logger)
+        if self.rules.sitemaps:
+            self.logger.info(
+                f"robots.txt lists {len(self.rules.sitemaps)} sitemap(s): "
+                f"{', '.join(self.rules.sitemaps)}"
+            )
+        return True
+
+    def _seconds_until_refresh(self):
+        if self.fetched_at is None:
+            return min(self.ttl, FAILED_FETCH_RETRY_SECONDS)
+        age = (datetime.now() - self.fetched_at).total_seconds()
+        return max(0.0, self.ttl - age)
+
+    def start_refresh(self, shutdown_event):
+        """Re-fetch robots.txt whenever it is ``ttl`` seconds old, until shutdown."""
+        if self._thread is not None:
+            return
+
+        def refresh_loop():
+            while not shutdown_event.wait(self._seconds_until_refresh()):
+                started = time.monotonic()
+                try:
+                    self.refresh()
+                except Exception as e:
+                    self.logger.error(f"Failed to refresh robots.txt: {e}")
+                    self.fetched_at = None
+                    continue
+                self.logger.info(
+                    f"Refreshed robots.txt in {time.monotonic() - started:.2f}s."
+                )
+                if self.on_update is not None:
+                    self.on_update(self)
+
+        self._thread = threading.Thread(
+            target=refresh_loop, name=f"robots-{self.domain}", daemon=True
+        )
+        self._thread.start()
@@ -0,0 +1,284 @@
+"""Global scheduler for multi-site crawls (``--global-workers``).
+
+Without it, a ``--config`` crawl runs every site in a thread of its own, and
+each site starts its own feeder thread and worker pool. With 50 sites that is
+hundreds of threads, most of them waiting for their host's next fetch
+permit, and nothing bounds the total concurrency. ``GlobalScheduler`` drives
+all sites from one dispatcher thread and one worker pool instead:
+
+- Each site keeps a politeness queue of the URLs it claimed from its
+  database (the batch a site's feeder would have queued).
+- The dispatcher hands a site's next URL to the pool only once the site's
+  token bucket has a permit ready and fewer than ``workers`` of its fetches
+  (its AutoThrottle concurrency, if enabled) are in flight. Waiting out a
+  crawl delay never occupies a worker.
+- Sites are served round-robin, one URL at a time, so a site with a short
+  delay cannot starve the others.
+
+Every other setting (crawl delay, batch size, robots.txt, proxies,
+processors, ...) still comes from each site's merged ``CrawlerConfig``.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from database import close_thread_connections
+
+# Upper bound of the automatically sized pool (see default_worker_count).
+MAX_DEFAULT_WORKERS = 64
+
+# Seconds the dispatcher sleeps when nothing wakes it.
+DISPATCHER_IDLE_TIMEOUT = 5.0
+
+
+def default_worker_count(crawlers) -> int:
+    """Size the pool for the machine and the sites.
+
+    Fetches mostly wait on the network, so four threads per CPU keep the
+    cores busy parsing; there is no point in more threads than the sites'
+    combined ``workers``.
+    """
+    wanted = sum(max(1, crawler.workers) for crawler in crawlers)
+    return max(1, min(wanted, (os.cpu_count() or 1) * 4, MAX_DEFAULT_WORKERS))
+
+
+class _SiteState:
+    """The dispatcher's view of one site."""
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.queue = deque()  # Politeness queue: claimed URLs not yet dispatched
+        self.in_flight = 0
+        self.refill = True  # The frontier changed since the last claim
+        self.refilled_at = time.monotonic()
+        self.done = False
+        self.listener = None
+
+
+class GlobalScheduler:
+    """Crawls several sites with one dispatcher thread and one worker pool.
+
+    Args:
+        crawlers (list): ``SiteCrawler`` instances, not started yet.
+        workers (int): Pool size (None or 0: ``default_worker_count``).
+    """
+
+    def __init__(self, crawlers, workers=None):
+        self.crawlers = list(crawlers)
+        self.workers = workers or default_worker_count(self.crawlers)
+        self._sites = []
+        self._cond = threading.Condition()
+        self._woken = False
+        self._busy = 0  # Pool threads working on a URL
+        self._next_site = 0  # Round-robin start of the next dispatch pass
+        self.pages = 0
+
+    def run(self):
+        """Crawl every site until all of them complete or are shut down."""
+        executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="global-worker"
+        )
+        try:
+            self._start_sites(executor)
+            print(
+                f"\nGlobal scheduler: {len(self._sites)} site(s) served by "
+                f"{self.workers} worker thread(s)."
+            )
+            while self._dispatch_round(executor):
+                pass
+            executor.shutdown(wait=True)
+        except BaseException:
+            # Forced shutdown (second Ctrl+C): stop waiting for the workers.
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            for state in self._sites:
+                if not state.done:
+                    self._finish_site(state)
+            close_thread_connections()
+            print(
+                f"\nGlobal scheduler stopped after {self.pages} URL(s) from "
+                f"{len(self._sites)} site(s)."
+            )
+
+    def _start_sites(self, executor):
+        """Start the crawlers in the pool, since each fetches its robots.txt."""
+        futures = [
+            (crawler, executor.submit(crawler.start)) for crawler in self.crawlers
+        ]
+        for crawler, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Failed to crawl site {crawler.start_url}: {e}")
+                crawler.finish()
+                continue
+            if crawler.config.engine == "async":
+                crawler.logger.warning(
+                    "The global scheduler runs every site on its thread pool; "
+                    "the 'async' engine setting is ignored."
+                )
+            state = _SiteState(crawler)
+
+            def listener(state=state):
+                self._wake(state)
+
+            state.listener = listener
+            crawler.frontier_listeners.append(listener)
+            self._sites.append(state)
+
+    def _wake(self, state=None):
+        with self._cond:
+            if state is not None:
+                state.refill = True
+            self._woken = True
+            self._cond.notify()
+
+    def _dispatch_round(self, executor) -> bool:
+        """Refill the sites' queues, dispatch ready URLs, then sleep until woken.
+
+        Returns:
+            bool: False once every site is done.
+        """
+        active = [state for state in self._sites if not state.done]
+        if not active:
+            return False
+        timeout = DISPATCHER_IDLE_TIMEOUT
+        for state in active:
+            timeout = min(timeout, self._service(state))
+        timeout = min(timeout, self._dispatch(active, executor))
+        with self._cond:
+            if not self._woken:
+                self._cond.wait(max(timeout, 0.01))
+            self._woken = False
+        return True
+
+    def _service(self, state) -> float:
+        """Do a site's feeder work; returns the seconds until it is needed again."""
+        crawler = state.crawler
+        if crawler.shutdown_event.is_set():
+            # Hand the queued URLs back to the frontier, then wait for the
+            # fetches in flight before closing the site.
+            while state.queue:
+                crawler.release_url(state.queue.popleft())
+            with self._cond:
+                in_flight = state.in_flight
+            if not in_flight:
+                self._finish_site(state)
+            return DISPATCHER_IDLE_TIMEOUT
+
+        crawler.renew_leases()
+        crawler.requeue_due_links()
+        now = time.monotonic()
+        idle_timeout = crawler.feeder_idle_timeout()
+        if now - state.refilled_at >= idle_timeout:
+            # Rescan from the top, as after a timeout of the threaded feeder.
+            state.refilled_at = now
+            crawler.notify_frontier(rewind=True)
+        with self._cond:
+            refill = state.refill and len(state.queue) < crawler.batch_size
+            if refill:
+                state.refill = False
+        if refill:
+            state.refilled_at = now
+            new_urls = crawler.claim_pending_urls(
+                crawler.batch_size * 2 - len(state.queue)
+            )
+            if new_urls:
+                state.queue.extend(new_urls)
+                crawler.logger.info(
+                    f"Queued {len(new_urls)} new URLs. Queue size: {len(state.queue)}"
+                )
+            elif crawler.is_crawl_complete():
+                crawler.logger.info(
+                    "No pending links remaining and all workers finished. Crawl complete."
+                )
+                crawler.shutdown_event.set()
+                return 0.0
+        return max(0.0, idle_timeout - (time.monotonic() - state.refilled_at))
+
+    def _take_permit(self, state) -> float:
+        """Take a fetch permit for the site if it may fetch now.
+
+        Returns:
+            float: 0 if a permit was taken, else the seconds to wait for one.
+        """
+        crawler = state.crawler
+        if crawler.throttle is not None:
+            if not crawler.throttle.try_acquire_slot():
+                return DISPATCHER_IDLE_TIMEOUT  # A finishing fetch wakes the dispatcher
+        elif state.in_flight >= max(1, crawler.workers):
+            return DISPATCHER_IDLE_TIMEOUT
+        wait = crawler.rate_limiter.try_acquire()
+        if wait > 0:
+            crawler.release_fetch_permit()
+        return wait
+
+    def _dispatch(self, active, executor) -> float:
+        """Send ready URLs to the pool, one per site per pass.
+
+        Returns:
+            float: Seconds until the earliest site waiting for its rate limit
+            may fetch again.
+        """
+        wait = DISPATCHER_IDLE_TIMEOUT
+        progress = True
+        while progress:
+            progress = False
+            start = self._next_site % len(active)
+            for state in active[start:] + active[:start]:
+                with self._cond:
+                    if self._busy >= self.workers:
+                        return wait
+                crawler = state.crawler
+                if not state.queue or crawler.shutdown_event.is_set():
+                    continue
+                if not crawler.is_allowed_by_robots(state.queue[0]):
+                    crawler.release_url(state.queue.popleft())
+                    progress = True
+                    continue
+                delay = self._take_permit(state)
+                if delay > 0:
+                    wait = min(wait, delay)
+                    continue
+                url = state.queue.popleft()
+                with self._cond:
+                    state.in_flight += 1
+                    self._busy += 1
+                executor.submit(self._crawl_url, state, url)
+                progress = True
+            self._next_site += 1
+        return wait
+
+    def _crawl_url(self, state, url):
+        """Pool task: fetch and process one URL whose permit is held."""
+        crawler = state.crawler
+        try:
+            if crawler.shutdown_event.is_set():
+                crawler.release_fetch_permit()
+            else:
+                crawler.fetch_and_complete(url)
+        except Exception as e:
+            crawler.logger.error(
+                f"Critical error during crawl execution for {url}: {e}"
+            )
+        finally:
+            crawler.release_url(url)
+            with self._cond:
+                state.in_flight -= 1
+                self._busy -= 1
+                self.pages += 1
+                self._woken = True
+                self._cond.notify()
+
+    def _finish_site(self, state):
+        crawler = state.crawler
+        state.done = True
+        if state.listener in crawler.frontier_listeners:
+            crawler.frontier_listeners.remove(state.listener)
+        crawler.logger.info("Crawl execution halted or completed.")
+        crawler.finish()
+        print(f"\n=== Crawl finished for: {crawler.start_url} ===")
@@ -52,26 +52,9 @@ def run_comparison(
     for idx, (link, content) in enumerate(rows):
         print(f"[{idx+1}/{len(rows)}] Extracting: {link}")
 
-        # If binary/base64 encoded (which shouldn't be for html text but just in case)
-        if (
-            isinstance(content, str)
-            and content.startswith("ey")
-            or (
-                isinstance(content, str)
-                and len(content) % 4 == 0
-                and not content.strip().startswith("<")
-            )
-        ):
-            try:
-                import base64
-
-                decoded_content = base64.b64decode(content).decode(
-                    "utf-8", errors="ignore"
-                )
-            except Exception:
-                decoded_content = content
-        else:
-            decoded_content = content
+        # Text responses are stored as TEXT in `content`; binary ones go to the
+        # `content_blob` column, so no Base64 guessing is needed here.
+        decoded_content = content
 
         article_eval = {"link": link, "extractions": {}}
 
@@ -0,0 +1,213 @@
+"""Approximate "seen URL" filter in front of ``save_links_to_db``.
+
+Most links found on a page (navigation, footers, tag clouds) are already in
+``crawled_data``. ``SeenUrlFilter`` keeps a Bloom filter of every link in
+the domain database so those are dropped before they reach SQLite; only
+links the filter has not seen are upserted. A Bloom filter has no false
+negatives and a tunable false-positive rate (``DEFAULT_ERROR_RATE``), the
+chance that a new link is wrongly taken for a known one.
+
+The filter is saved next to the database (``<database>.seen``) together with
+the highest ``crawled_data`` id it covers. On startup the rows added since
+then (by an interrupted run or another crawler sharing the database) are
+folded in; a missing or unreadable file is rebuilt from the ``link`` column.
+A filter that is stale only lets known links through to the upsert, which
+handles them as before.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import struct
+import threading
+
+from database import get_max_link_id, iter_known_links
+
+DEFAULT_CAPACITY = 1_000_000
+DEFAULT_ERROR_RATE = 1e-6
+
+_MAGIC = b"SEENBLM1"
+# magic, bit count, hash count, capacity, items added, highest covered row id
+_HEADER = struct.Struct("<8sQIQQQ")
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter of strings.
+
+    Args:
+        capacity (int): Number of items the filter is sized for.
+        error_rate (float): False-positive rate once ``capacity`` items are in.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        self.capacity = max(1, int(capacity))
+        self.num_bits = max(
+            8,
+            int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)),
+        )
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing (Kirsch-Mitzenmacher): k positions from two 64-bit hashes.
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+    def add(self, item) -> bool:
+        """Add ``item``; returns False if it was (probably) already present."""
+        added = False
+        bits = self.bits
+        for p in self._positions(item):
+            mask = 1 << (p & 7)
+            if not bits[p >> 3] & mask:
+                bits[p >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+
+class SeenUrlFilter:
+    """The Bloom filter of the links in one domain database, persisted beside it.
+
+    Thread-safe. Use ``open`` to load (or rebuild) it.
+
+    Args:
+        database_name (str): Path to the domain's SQLite database.
+        capacity (int): Initial capacity; the filter is rebuilt twice as large
+                        from the database when it fills up.
+        error_rate (float): Target false-positive rate.
+        logger: Optional logger instance.
+    """
+
+    def __init__(
+        self,
+        database_name,
+        capacity=DEFAULT_CAPACITY,
+        error_rate=DEFAULT_ERROR_RATE,
+        logger=None,
+    ):
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.database_name = database_name
+        self.path = f"{database_name}.seen"
+        self.error_rate = error_rate
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.last_id = 0  # Every crawled_data row up to this id is in the filter
+        self.dropped = 0  # Links dropped as already known
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, database_name, capacity=DEFAULT_CAPACITY, logger=None):
+        """Load the saved filter of ``database_name`` and catch up with the database."""
+        seen = cls(database_name, capacity, logger=logger)
+        if seen._load():
+            seen._catch_up()
+        else:
+            seen.rebuild(capacity)
+        return seen
+
+    def _load(self) -> bool:
+        try:
+            with open(self.path, "rb") as f:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return False
+                fields = _HEADER.unpack(header)
+                bits = f.read()
+        except OSError:
+            return False
+        magic, num_bits, num_hashes, capacity, count, last_id = fields
+        if magic != _MAGIC or len(bits) != (num_bits + 7) // 8:
+            self.logger.warning(f"Ignoring unreadable seen-URL filter {self.path}.")
+            return False
+        bloom = BloomFilter.__new__(BloomFilter)
+        bloom.capacity = capacity
+        bloom.num_bits = num_bits
+        bloom.num_hashes = num_hashes
+        bloom.bits = bytearray(bits)
+        bloom.count = count
+        self.bloom, self.last_id = bloom, last_id
+        return True
+
+    def _catch_up(self):
+        added = 0
+        for row_id, link in iter_known_links(
+            self.database_name, after_id=self.last_id, logger=self.logger
+        ):
+            self.bloom.add(link)
+            self.last_id = max(self.last_id, row_id)
+            added += 1
+        self.logger.info(
+            f"Loaded seen-URL filter {self.path} ({self.bloom.count} links, "
+            f"{added} added since it was saved)."
+        )
+        if self.bloom.count >= self.bloom.capacity:
+            self.rebuild(self.bloom.capacity * 2)
+
+    def rebuild(self, capacity=None):
+        """Rebuild the filter from every link in the database."""
+        last_id = get_max_link_id(self.database_name, logger=self.logger)
+        capacity = max(capacity or self.bloom.capacity, 2 * last_id, 1)
+        bloom = BloomFilter(capacity, self.error_rate)
+        for _, link in iter_known_links(self.database_name, logger=self.logger):
+            bloom.add(link)
+        self.bloom, self.last_id = bloom, last_id
+        self.logger.info(
+            f"Built seen-URL filter from {bloom.count} known links "
+            f"(capacity {bloom.capacity}, {len(bloom.bits)} bytes)."
+        )
+
+    def filter_new(self, links) -> list:
+        """Return the links of ``links`` the filter has not seen, in order."""
+        with self._lock:
+            new_links = [link for link in links if link not in self.bloom]
+            self.dropped += len(links) - len(new_links)
+        return new_links
+
+    def update(self, links):
+        """Record links that are now stored in the database."""
+        with self._lock:
+            for link in links:
+                self.bloom.add(link)
+            full = self.bloom.count >= self.bloom.capacity
+        if full:
+            with self._lock:
+                self.rebuild(self.bloom.capacity * 2)
+
+    def save(self):
+        """Write the filter next to the database (atomically)."""
+        # Every link this crawler saved is in the filter. Rows other crawlers
+        # added meanwhile may not be; they only reach the upsert again.
+        last_id = get_max_link_id(self.database_name, logger=self.logger)
+        with self._lock:
+            self.last_id = max(self.last_id, last_id)
+            bloom = self.bloom
+            header = _HEADER.pack(
+                _MAGIC,
+                bloom.num_bits,
+                bloom.num_hashes,
+                bloom.capacity,
+                bloom.count,
+                self.last_id,
+            )
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(header)
+                    f.write(bloom.bits)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                self.logger.error(f"Failed to save seen-URL filter {self.path}: {e}")
+                return
+        self.logger.info(
+            f"Saved seen-URL filter ({bloom.count} links; "
+            f"{self.dropped} known links skipped this run)."
+        )
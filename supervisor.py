@@ -0,0 +1,278 @@
+"""Multi-process crawling of a configuration file (``--processes N``).
+
+Parsing (BeautifulSoup, newspaper3k, trafilatura, MinHash) holds the GIL, so
+one process crawling many sites keeps a single core busy. ``Supervisor``
+shards the sites across N worker processes, each running the usual
+multi-site crawl (``crawler_app.crawl_sites``) on its shard:
+
+- Sites are grouped by domain, so a host is only ever crawled by one
+  process and its rate limit (a per-process token bucket) holds.
+- A process that dies (an exception, a crash, the OOM killer) has its
+  leases released and is started again with ``resume``, after a backoff,
+  at most ``MAX_RESTARTS`` times.
+- Progress (links per status, responses, bytes) is read from the sites'
+  databases, so it covers crashed processes too, and is printed for all
+  shards every ``PROGRESS_INTERVAL`` seconds and when the crawl ends.
+- Ctrl+C keeps its meaning: the first shuts every process down gracefully,
+  the second forces them to exit.
+"""
+
+import multiprocessing
+import os
+import signal
+import time
+from urllib.parse import urlparse
+
+from database import (
+    close_thread_connections,
+    count_links_by_status,
+    get_database_name,
+    get_transfer_stats,
+    release_owner_leases,
+)
+
+# Restarts of one shard's process before it is given up.
+MAX_RESTARTS = 5
+
+# Seconds between progress reports.
+PROGRESS_INTERVAL = 60
+
+# Seconds processes get to exit after a forced shutdown before they are killed.
+FORCED_EXIT_TIMEOUT = 5.0
+
+# Link statuses shown in the progress report, in lifecycle order.
+_STATUSES = ("pending", "in_progress", "crawled", "parked")
+
+
+def shard_sites(sites, processes) -> list:
+    """Split site dicts into at most ``processes`` shards.
+
+    Sites of the same domain stay together; domains go to the shard with
+    the fewest sites so far, largest groups first.
+    """
+    groups = {}
+    for site in sites:
+        groups.setdefault(urlparse(site["url"]).netloc, []).append(site)
+    shards = [[] for _ in range(min(processes, len(groups)))]
+    for group in sorted(groups.values(), key=len, reverse=True):
+        min(shards, key=len).extend(group)
+    return shards
+
+
+def _run_shard(sites, base_config, global_workers):
+    """Worker process entry point: crawl one shard of the sites."""
+    if hasattr(os, "setpgrp"):
+        # Leave the terminal's process group: Ctrl+C reaches the supervisor
+        # only, which passes it on, so each press arrives here once.
+        os.setpgrp()
+    import crawler_app
+    from similarity import SimilarityIndexer
+
+    crawler_app.install_sigint_handler()
+    try:
+        crawler_app.crawl_sites(sites, base_config, global_workers=global_workers)
+    finally:
+        SimilarityIndexer.shutdown()
+
+
+class _Shard:
+    """One worker process and the sites it crawls."""
+
+    def __init__(self, number, sites, base_config):
+        self.number = number
+        self.sites = sites
+        self.process = None
+        self.restarts = 0
+        self.restart_at = None
+        self.done = False
+        self.databases = []  # (url, domain, database name) of each site
+        for site in sites:
+            domain = urlparse(site["url"]).netloc
+            db_dir = base_config.merge_with_dict(site).db_dir
+            self.databases.append(
+                (site["url"], domain, get_database_name(domain, db_dir))
+            )
+
+    @property
+    def state(self) -> str:
+        if self.process is not None:
+            return f"pid {self.process.pid}"
+        return "finished" if self.done else "restarting"
+
+
+class Supervisor:
+    """Runs the sites of a configuration file in several worker processes.
+
+    Args:
+        sites (list): Site dicts from the configuration file.
+        base_config (CrawlerConfig): Defaults the site dicts are merged into.
+        processes (int): Number of worker processes (at most one per domain).
+        global_workers (int): Passed on to each process (see scheduler.py).
+    """
+
+    def __init__(self, sites, base_config, processes, global_workers=None):
+        self.base_config = base_config
+        self.global_workers = global_workers
+        self.shards = [
+            _Shard(number, shard, base_config)
+            for number, shard in enumerate(shard_sites(sites, processes), start=1)
+        ]
+        self.stopping = False
+        # Without process groups (Windows) Ctrl+C reaches every process of
+        # the console directly and must not be passed on a second time.
+        self._forward_sigint = hasattr(os, "setpgrp")
+        self._original_sigint_handler = None
+        self._progress_at = time.monotonic()
+
+    def run(self):
+        """Crawl until every shard has finished (or Ctrl+C)."""
+        self._original_sigint_handler = signal.signal(
+            signal.SIGINT, self._handle_sigint
+        )
+        print(
+            f"\nLaunching {len(self.shards)} worker process(es) for "
+            f"{sum(len(shard.sites) for shard in self.shards)} site(s)..."
+        )
+        try:
+            for shard in self.shards:
+                self._start(shard)
+            while not all(shard.done for shard in self.shards):
+                self._check_shards()
+                if time.monotonic() - self._progress_at >= PROGRESS_INTERVAL:
+                    self.print_progress()
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            # Forced shutdown: the processes got their second Ctrl+C; kill
+            # those that do not exit in time.
+            for shard in self.shards:
+                if shard.process is not None:
+                    shard.process.join(FORCED_EXIT_TIMEOUT)
+                    if shard.process.is_alive():
+                        shard.process.kill()
+            raise
+        finally:
+            signal.signal(signal.SIGINT, self._original_sigint_handler)
+            self.print_progress()
+            close_thread_connections()
+
+    def _handle_sigint(self, signum, frame):
+        """Graceful shutdown on the first Ctrl+C, forced on the second
+        (see ``crawler_app._handle_sigint``)."""
+        self._signal_processes()
+        if self.stopping:
+            signal.signal(signal.SIGINT, self._original_sigint_handler)
+            print("\nForced shutdown. Exiting immediately.")
+            raise KeyboardInterrupt
+        self.stopping = True
+        print(
+            "\nShutdown requested (Ctrl+C). Finishing in-flight pages … press "
+            "Ctrl+C again to force quit."
+        )
+
+    def _signal_processes(self):
+        if not self._forward_sigint:
+            return
+        for shard in self.shards:
+            if shard.process is not None and shard.process.is_alive():
+                try:
+                    os.kill(shard.process.pid, signal.SIGINT)
+                except OSError:
+                    pass
+
+    def _start(self, shard):
+        base_config, sites = self.base_config, shard.sites
+        if shard.restarts:
+            # Continue from the shard's databases instead of starting over.
+            base_config = base_config.merge_with_dict({"resume": True})
+            sites = [dict(site, resume=True) for site in sites]
+        shard.process = multiprocessing.Process(
+            target=_run_shard,
+            args=(sites, base_config, self.global_workers),
+            name=f"crawler-shard-{shard.number}",
+        )
+        shard.process.start()
+        shard.restart_at = None
+        print(
+            f"Shard {shard.number} ({shard.state}): "
+            f"{', '.join(site['url'] for site in shard.sites)}"
+        )
+
+    def _check_shards(self):
+        """Note processes that exited; restart crashed ones when their backoff ends."""
+        now = time.monotonic()
+        for shard in self.shards:
+            if shard.done:
+                continue
+            process = shard.process
+            if process is None:
+                if self.stopping:
+                    shard.done = True
+                elif now >= shard.restart_at:
+                    self._start(shard)
+                continue
+            if process.is_alive():
+                continue
+            shard.process = None
+            # Hand the URLs it still claimed back now instead of when their
+            # leases expire (a crash, or a shutdown with URLs still queued).
+            from crawler_app import lease_owner_prefix
+
+            released = sum(
+                release_owner_leases(database_name, lease_owner_prefix(process.pid))
+                for _, _, database_name in shard.databases
+            )
+            if process.exitcode == 0 or self.stopping:
+                shard.done = True
+                print(
+                    f"Shard {shard.number} finished (exit code {process.exitcode}, "
+                    f"{released} lease(s) released)."
+                )
+                continue
+            if shard.restarts >= MAX_RESTARTS:
+                shard.done = True
+                print(
+                    f"Shard {shard.number} exited with code {process.exitcode} "
+                    f"{shard.restarts + 1} times; giving up on it."
+                )
+                continue
+            shard.restarts += 1
+            delay = min(60, 2**shard.restarts)
+            shard.restart_at = now + delay
+            print(
+                f"Shard {shard.number} exited with code {process.exitcode} "
+                f"({released} lease(s) released); restarting it with resume in "
+                f"{delay}s."
+            )
+
+    def print_progress(self):
+        """Print each site's link counts and transfers, and the totals."""
+        self._progress_at = time.monotonic()
+        totals = dict.fromkeys(_STATUSES, 0)
+        responses = wire_bytes = 0
+        lines = []
+        for shard in self.shards:
+            for url, domain, database_name in shard.databases:
+                if not os.path.exists(database_name):
+                    continue
+                counts = count_links_by_status(database_name)
+                transfers = get_transfer_stats(database_name, domain)
+                for status in _STATUSES:
+                    totals[status] += counts.get(status, 0)
+                responses += transfers["responses"]
+                wire_bytes += transfers["wire_bytes"]
+                lines.append(
+                    f"  [shard {shard.number}, {shard.state}] {url}: "
+                    + ", ".join(
+                        f"{counts.get(status, 0)} {status}" for status in _STATUSES
+                    )
+                    + f"; {transfers['responses']} responses"
+                )
+        restarts = sum(shard.restarts for shard in self.shards)
+        running = sum(shard.process is not None for shard in self.shards)
+        print(
+            f"\nProgress: {running}/{len(self.shards)} process(es) running, "
+            f"{restarts} restart(s). "
+            + ", ".join(f"{totals[status]} {status}" for status in _STATUSES)
+            + f"; {responses} responses, {wire_bytes} bytes on the wire."
+        )
+        print("\n".join(lines))
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import threading
+
+# Status codes with which a server asks the crawler to slow down.
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+class AutoThrottle:
+    """Adapts a site's crawl delay and fetch concurrency to how the server copes.
+
+    Every fetch reports its latency and outcome. An exponentially weighted
+    moving average (EWMA) of the latency and of the error rate is kept for the
+    domain:
+
+    * While the site is healthy (few errors, latency close to the best seen),
+      one more concurrent fetch is allowed per round of successful responses
+      and the delay converges towards ``latency / concurrency``, i.e. the rate
+      at which the allowed number of requests would be in flight.
+    * On an error, or when latency climbs to twice the best seen, the
+      concurrency is cut by one and the delay grows by half. Neither is
+      raised again until the error rate has decayed below ``error_threshold``.
+    * A 429 or 503 halves the concurrency, doubles the delay and, if the
+      response carries ``Retry-After``, pauses the host's rate limiter for
+      that long.
+
+    The delay stays between ``min_delay`` and ``max_delay`` and the
+    concurrency between ``min_concurrency`` and ``max_concurrency``.
+
+    Args:
+        set_delay (callable): Applies a new delay (e.g. ``SiteCrawler.set_crawl_delay``).
+        rate_limiter: The host's ``TokenBucket``, paused on ``Retry-After``.
+        start_delay (float): Delay to start from.
+        min_delay (float): Lower bound for the delay.
+        max_delay (float): Upper bound for the delay.
+        max_concurrency (int): Upper bound for concurrent fetches (the worker count).
+        min_concurrency (int): Lower bound for concurrent fetches.
+        smoothing (float): EWMA weight of the newest sample (0 < smoothing <= 1).
+        error_threshold (float): Error rate above which the site is backed off.
+        logger: Optional logger instance.
+    """
+
+    def __init__(
+        self,
+        set_delay,
+        rate_limiter,
+        start_delay,
+        min_delay,
+        max_delay,
+        max_concurrency,
+        min_concurrency=1,
+        smoothing=0.3,
+        error_threshold=0.2,
+        logger=None,
+    ):
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self._set_delay = set_delay
+        self.rate_limiter = rate_limiter
+        self.min_delay = max(0.0, float(min_delay))
+        self.max_delay = max(self.min_delay, float(max_delay))
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.min_concurrency = min(max(1, int(min_concurrency)), self.max_concurrency)
+        self.smoothing = smoothing
+        self.error_threshold = error_threshold
+
+        self.delay = self._clamp_delay(start_delay)
+        self.concurrency = self.min_concurrency
+        self.latency = None  # EWMA of the response latency in seconds
+        self.best_latency = None  # Lowest latency EWMA seen, the site's baseline
+        self.error_rate = 0.0  # EWMA of failed responses (0.0 - 1.0)
+        self._successes = 0
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._set_delay(self.delay)
+
+    def _clamp_delay(self, delay):
+        return min(self.max_delay, max(self.min_delay, float(delay)))
+
+    def try_acquire_slot(self) -> bool:
+        """Take a concurrency slot if one is free, without waiting."""
+        with self._cond:
+            if self._in_flight < self.concurrency:
+                self._in_flight += 1
+                return True
+            return False
+
+    def acquire_slot(self, shutdown_event=None) -> bool:
+        """Block until fewer than ``concurrency`` fetches are in flight.
+
+        Returns:
+            bool: False if ``shutdown_event`` was set while waiting.
+        """
+        with self._cond:
+            while self._in_flight >= self.concurrency:
+                if shutdown_event is not None and shutdown_event.is_set():
+                    return False
+                self._cond.wait(timeout=0.5)
+            self._in_flight += 1
+        return True
+
+    async def acquire_slot_async(self, shutdown_event=None) -> bool:
+        """Asyncio counterpart of ``acquire_slot``."""
+        while not self.try_acquire_slot():
+            if shutdown_event is not None and shutdown_event.is_set():
+                return False
+            await asyncio.sleep(0.1)
+        return True
+
+    def release_slot(self):
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._cond.notify()
+
+    def record_response(
+        self, latency, status_code=None, failed=False, retry_after=None
+    ):
+        """Feed one fetch outcome into the averages and adjust delay and concurrency.
+
+        Args:
+            latency (float): Seconds the fetch took.
+            status_code (int): HTTP status of the response, if one was received.
+            failed (bool): The fetch failed (timeout, connection error, 5xx...).
+            retry_after (float): Seconds from a ``Retry-After`` header, if any.
+        """
+        with self._cond:
+            a = self.smoothing
+            self.latency = (
+                latency
+                if self.latency is None
+                else a * latency + (1 - a) * self.latency
+            )
+            if self.best_latency is None or self.latency < self.best_latency:
+                self.best_latency = self.latency
+            self.error_rate = a * (1.0 if failed else 0.0) + (1 - a) * self.error_rate
+
+            old_delay, old_concurrency = self.delay, self.concurrency
+            if status_code in THROTTLE_STATUS_CODES:
+                self._successes = 0
+                self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+                self.delay = self._clamp_delay(max(self.delay * 2, retry_after or 0))
+                reason = f"HTTP {status_code}"
+            elif failed or self.latency > 2 * self.best_latency:
+                self._successes = 0
+                self.concurrency = max(self.min_concurrency, self.concurrency - 1)
+                self.delay = self._clamp_delay(self.delay * 1.5)
+                reason = (
+                    f"error rate {self.error_rate:.0%}"
+                    if failed
+                    else f"latency {self.latency:.2f}s"
+                )
+            elif self.error_rate > self.error_threshold:
+                # Recovering from recent errors: hold until the error rate decays.
+                self._successes = 0
+                reason = f"error rate {self.error_rate:.0%}"
+            else:
+                self._successes += 1
+                if self._successes >= self.concurrency:
+                    # One more parallel fetch per healthy round of responses.
+                    self._successes = 0
+                    self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+                target = self.latency / self.concurrency
+                self.delay = self._clamp_delay((self.delay + target) / 2)
+                reason = f"healthy, latency {self.latency:.2f}s"
+
+            if self.concurrency > old_concurrency:
+                self._cond.notify(self.concurrency - old_concurrency)
+            delay_changed = abs(self.delay - old_delay) >= 0.1 * max(old_delay, 0.01)
+            concurrency_changed = self.concurrency != old_concurrency
+            new_delay, new_concurrency = self.delay, self.concurrency
+
+        if new_delay != old_delay:
+            self._set_delay(new_delay)
+        if retry_after and status_code in THROTTLE_STATUS_CODES:
+            self.rate_limiter.defer(retry_after)
+            self.logger.warning(
+                f"AutoThrottle: server sent Retry-After {retry_after:.0f}s, "
+                f"pausing requests."
+            )
+        if delay_changed or concurrency_changed:
+            self.logger.info(
+                f"AutoThrottle ({reason}): delay {old_delay:.2f}s -> {new_delay:.2f}s, "
+                f"concurrency {old_concurrency} -> {new_concurrency}."
+            )
@@ -0,0 +1,238 @@
+import logging
+import re
+import threading
+from collections import Counter
+from typing import Optional
+from urllib.parse import urlsplit
+
+from database import (
+    count_template_links,
+    fill_link_templates,
+    get_parked_templates,
+    load_parked_links,
+    unpark_links,
+)
+
+# URLs admitted to the frontier per URL template before further ones are
+# parked. None means no limit.
+DEFAULT_TRAP_BUDGET = 10000
+
+# Trap rules used when a site configures none. "budgets" is a list of
+# ``[regex, budget]`` pairs matched against URL templates (the first match
+# wins; a budget of null means no limit). URLs deeper than
+# "max_path_segments", with a path segment repeated more than
+# "max_repeated_segments" times or with more than "max_query_params" query
+# parameters are parked whatever their template's budget.
+DEFAULT_TRAP_RULES = {
+    "budgets": [],
+    "max_path_segments": 20,
+    "max_repeated_segments": 3,
+    "max_query_params": 8,
+}
+
+# Template link counts cached before the cache is cleared and refilled.
+MAX_CACHED_TEMPLATES = 100000
+
+_NUMBER_RE = re.compile(r"\d+")
+# Hashes, UUIDs and session tokens: long runs of letters and digits.
+_ID_RE = re.compile(r"^(?=.*\d)(?:[0-9a-fA-F-]{16,}|(?=.*[A-Za-z])[A-Za-z0-9_]{16,})$")
+
+
+def _segment_template(segment):
+    segment, _, matrix = segment.partition(";")
+    if _ID_RE.match(segment):
+        segment = "{id}"
+    else:
+        segment = _NUMBER_RE.sub("{n}", segment)
+    if matrix:
+        # Path parameters (';jsessionid=...') keep their names only.
+        names = sorted({param.split("=", 1)[0] for param in matrix.split(";") if param})
+        segment += "".join(f";{name}=*" for name in names)
+    return segment
+
+
+def url_template(url) -> str:
+    """Return the path/query template of ``url``.
+
+    Numbers in the path become ``{n}``, ids and tokens ``{id}``, and query
+    and path parameters keep their names only, so
+    ``/calendar/2024/10/15?view=day`` is ``/calendar/{n}/{n}/{n}?view=*``.
+    """
+    parts = urlsplit(url)
+    path = "/".join(_segment_template(s) for s in (parts.path or "/").split("/"))
+    names = sorted({pair.split("=", 1)[0] for pair in parts.query.split("&") if pair})
+    if names:
+        path += "?" + "&".join(f"{name}=*" for name in names)
+    return path
+
+
+class TrapDetector:
+    """Caps how many URLs of one path/query template enter the frontier.
+
+    Infinite URL spaces (calendars, endless pagination, session ids, faceted
+    search) produce URLs that differ only in numbers, ids or parameter
+    values. Each new URL is grouped under its ``url_template`` and counted;
+    once a template has ``budget`` URLs (pending, in progress or crawled)
+    further ones are saved as 'parked': known, but never claimed. The
+    template is logged as a possible trap the first time it overflows.
+
+    Counts are read from the crawler database, so they cover earlier runs.
+
+    Args:
+        database_name (str): Path to the domain's SQLite database.
+        budget (int): URLs admitted per template (None: no limit).
+        rules (dict): Overrides of ``DEFAULT_TRAP_RULES``.
+        logger: Optional logger instance.
+    """
+
+    def __init__(
+        self,
+        database_name,
+        budget: Optional[int] = DEFAULT_TRAP_BUDGET,
+        rules: Optional[dict] = None,
+        logger=None,
+    ):
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        rules = dict(rules or {})
+        self.database_name = database_name
+        self.budget = budget
+        self.budgets = [
+            (re.compile(pattern), value)
+            for pattern, value in rules.get("budgets", DEFAULT_TRAP_RULES["budgets"])
+        ]
+        self.max_path_segments = rules.get(
+            "max_path_segments", DEFAULT_TRAP_RULES["max_path_segments"]
+        )
+        self.max_repeated_segments = rules.get(
+            "max_repeated_segments", DEFAULT_TRAP_RULES["max_repeated_segments"]
+        )
+        self.max_query_params = rules.get(
+            "max_query_params", DEFAULT_TRAP_RULES["max_query_params"]
+        )
+        self._counts = {}  # template -> [admitted, parked], cached from the database
+        self._budgets = {}  # template -> budget
+        self.flagged = {}  # template -> [reason, URLs parked this run]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, database_name, config, logger=None) -> "TrapDetector":
+        """Build a detector from a CrawlerConfig."""
+        return cls(database_name, config.trap_budget, config.trap_rules, logger=logger)
+
+    def budget_for(self, template) -> Optional[int]:
+        """Return the budget of ``template`` (None: no limit)."""
+        if template not in self._budgets:
+            if len(self._budgets) >= MAX_CACHED_TEMPLATES:
+                self._budgets.clear()
+            self._budgets[template] = next(
+                (value for regex, value in self.budgets if regex.search(template)),
+                self.budget,
+            )
+        return self._budgets[template]
+
+    def trap_reason(self, url) -> Optional[str]:
+        """Return why the shape of ``url`` alone marks it as a trap, or None."""
+        parts = urlsplit(url)
+        segments = [segment for segment in parts.path.split("/") if segment]
+        if self.max_path_segments and len(segments) > self.max_path_segments:
+            return f"more than {self.max_path_segments} path segments"
+        if self.max_repeated_segments and segments:
+            segment, repeats = Counter(segments).most_common(1)[0]
+            if repeats > self.max_repeated_segments:
+                return f"path segment '{segment}' repeated {repeats} times"
+        params = [pair for pair in parts.query.split("&") if pair]
+        if self.max_query_params and len(params) > self.max_query_params:
+            return f"more than {self.max_query_params} query parameters"
+        return None
+
+    def _template_counts(self, template):
+        counts = self._counts.get(template)
+        if counts is None:
+            counts = list(
+                count_template_links(self.database_name, template, logger=self.logger)
+            )
+            if len(self._counts) >= MAX_CACHED_TEMPLATES:
+                self._counts.clear()
+            self._counts[template] = counts
+        return counts
+
+    def admit(self, url):
+        """Count a newly discovered URL against its template's budget.
+
+        Returns:
+            tuple: ``(template, parked)``; ``parked`` is True if the URL must
+            be held back from the frontier.
+        """
+        template = url_template(url)
+        reason = self.trap_reason(url)
+        with self._lock:
+            counts = self._template_counts(template)
+            if reason is None:
+                budget = self.budget_for(template)
+                if budget is None or counts[0] < budget:
+                    counts[0] += 1
+                    return template, False
+                reason = f"over its budget of {budget} URLs"
+            counts[1] += 1
+            first = template not in self.flagged
+            if first:
+                self.flagged[template] = [reason, 0]
+            self.flagged[template][1] += 1
+        if first:
+            self.logger.warning(
+                f"Possible crawler trap: {template} ({reason}). Parking its "
+                f"URLs, e.g. {url}"
+            )
+        return template, True
+
+    def load(self):
+        """Prepare the database: template links saved without one and release
+        parked links whose template has room again (e.g. a raised budget)."""
+        filled = fill_link_templates(
+            self.database_name, url_template, logger=self.logger
+        )
+        if filled:
+            self.logger.info(f"Grouped {filled} known link(s) into URL templates.")
+        for template in get_parked_templates(self.database_name, logger=self.logger):
+            admitted, _ = count_template_links(
+                self.database_name, template, logger=self.logger
+            )
+            budget = self.budget_for(template)
+            room = None if budget is None else budget - admitted
+            if room is not None and room <= 0:
+                continue
+            links = [
+                link
+                for link in load_parked_links(
+                    self.database_name, template, logger=self.logger
+                )
+                if self.trap_reason(link) is None
+            ][:room]
+            released = unpark_links(self.database_name, links, logger=self.logger)
+            if released:
+                self.logger.info(
+                    f"Unparked {released} link(s) of {template}, which is under "
+                    f"its budget again."
+                )
+
+    def stats(self) -> dict:
+        """Return the templates flagged and the URLs parked during this run."""
+        with self._lock:
+            return {
+                "flagged_templates": len(self.flagged),
+                "parked": sum(parked for _, parked in self.flagged.values()),
+            }
+
+    def summary(self, limit=10) -> str:
+        """Describe the flagged templates, those that parked most URLs first."""
+        with self._lock:
+            flagged = sorted(
+                self.flagged.items(), key=lambda item: item[1][1], reverse=True
+            )
+        lines = [
+            f"{template}: {parked} parked ({reason})"
+            for template, (reason, parked) in flagged[:limit]
+        ]
+        if len(flagged) > limit:
+            lines.append(f"... and {len(flagged) - limit} more template(s)")
+        return "; ".join(lines)
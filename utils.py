@@ -5,11 +5,12 @@ from urllib.parse import urljoin, urlparse, urldefrag
 import hashlib
 import logging
 from config import CrawlerConfig
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 import os
-import base64
-import certifi
 
 from extractors import get_extractor
+from fetchers import RequestsFetcher
 
 
 def detects_javascript_required(html_content: str, logger=None) -> bool:
@@ -59,6 +60,152 @@ def detects_javascript_required(html_content: str, logger=None) -> bool:
     return False
 
 
+def is_text_content_type(content_type) -> bool:
+    """Return True if the Content-Type describes a textual body (HTML, XML, JSON, plain text)."""
+    if not content_type:
+        return False
+    content_type = content_type.lower()
+    return "text/" in content_type or "xml" in content_type or "json" in content_type
+
+
+# HTTP statuses worth retrying, with the label used in retry logs and errors.
+RETRIABLE_STATUS_CODES = {
+    429: "429 Too Many Requests",
+    503: "503 Service Unavailable",
+    504: "504 Gateway Timeout",
+}
+
+
+def build_request_headers(etag=None, last_modified=None, accept_encoding=None) -> dict:
+    """Build the request headers, adding conditional-GET validators when known."""
+    headers = {"User-Agent": CrawlerConfig.user_agent}
+    if accept_encoding:
+        headers["Accept-Encoding"] = accept_encoding
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def parse_retry_after(value):
+    """Return the delay in seconds requested by a ``Retry-After`` header, or None.
+
+    The header is either a number of seconds or an HTTP date.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def record_validators(response_headers, response_meta) -> None:
+    """Copy the ETag / Last-Modified response headers into ``response_meta``."""
+    if response_meta is None:
+        return
+    response_meta["etag"] = response_headers.get("ETag")
+    response_meta["last_modified"] = response_headers.get("Last-Modified")
+
+
+def render_if_javascript_required(
+    url, html_text, js_driver="auto", timeout_secs=60, proxies=None, logger=None
+):
+    """Re-render a static HTML page in a headless browser if it appears JS-dependent.
+
+    Returns:
+        str | None: The rendered HTML, or None if rendering was not needed or failed
+        (in which case the caller should keep the static text).
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+    if not detects_javascript_required(html_text, logger=logger):
+        return None
+    logger.info(
+        f"Upgrading to dynamic rendering for {url} due to detected JS requirement."
+    )
+    try:
+        from rendering import render_page
+
+        return render_page(
+            url,
+            driver_type=js_driver,
+            timeout_secs=timeout_secs,
+            proxies=proxies,
+        )
+    except Exception as render_err:
+        logger.warning(
+            f"Dynamic rendering upgrade failed for {url}, falling back to static text. Error: {render_err}"
+        )
+        return None
+
+
+def read_response_body(response, content_type, content_policy=None, chunks=None):
+    """Read a streamed requests response, enforcing the content policy.
+
+    Peak memory is bounded by the applicable byte cap rather than by the size
+    of whatever the server decides to send. ``chunks`` optionally supplies the
+    decoded body chunks (defaults to ``response.iter_content()``).
+
+    Returns:
+        tuple: (body, rejection) — the raw body bytes, or None and a rejection reason.
+    """
+    if content_policy is not None:
+        rejection = content_policy.check_headers(response.headers)
+        if rejection:
+            return None, rejection
+
+    if chunks is None:
+        chunks = response.iter_content(chunk_size=65536)
+
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        if content_policy is not None:
+            rejection = content_policy.check_size(content_type, len(buffer))
+            if rejection:
+                return None, rejection
+    return bytes(buffer), None
+
+
+def decode_response_text(body, encoding):
+    """Decode a text body the same way ``requests.Response.text`` does.
+
+    Uses the charset from the headers and falls back to charset detection.
+    """
+    if encoding is None:
+        from charset_normalizer import from_bytes
+
+        best_match = from_bytes(body).best()
+        encoding = best_match.encoding if best_match else "utf-8"
+    try:
+        return str(body, encoding, errors="replace")
+    except (LookupError, TypeError):
+        return str(body, errors="replace")
+
+
+def _probe_with_head(fetcher, url, headers, timeout, proxies, content_policy, logger):
+    """Send a HEAD request and return a rejection reason if the body should not be fetched.
+
+    Probe failures are ignored: the GET then proceeds and is checked as usual.
+    """
+    try:
+        response = fetcher.head(url, headers=headers, timeout=timeout, proxies=proxies)
+    except requests.exceptions.RequestException as e:
+        logger.info(f"HEAD probe failed for {url}, falling back to GET: {e}")
+        return None
+    if not response.ok:
+        return None
+    return content_policy.check_headers(response.headers)
+
+
 def fetch_page(
     url,
     max_retries=3,
@@ -69,6 +216,12 @@ def fetch_page(
     js_rendering=False,
     js_driver="auto",
     auto_detect_js=True,
+    defer_retries=False,
+    response_meta=None,
+    etag=None,
+    last_modified=None,
+    content_policy=None,
+    fetcher=None,
 ):
     """
     Fetch the content of a web page with retries and exponential backoff.
@@ -84,10 +237,28 @@ def fetch_page(
         js_rendering (bool): Force rendering with JavaScript.
         js_driver (str): Browser engine to use if js_rendering is True.
         auto_detect_js (bool): Dynamically upgrade to JS rendering if page appears JS-dependent.
+        defer_retries (bool): Return retriable failures (429, 503, 504, timeout, SSL and connection
+                              errors) immediately instead of sleeping and retrying inline,
+                              so the caller can reschedule the URL.
+        response_meta (dict): Optional dict filled with details about the response that do
+                              not fit the return tuple (``retriable``, ``not_modified``,
+                              ``rejected``, ``etag``, ``last_modified``, the HTTP
+                              ``status_code``, ``retry_after`` (seconds, from a 429/503),
+                              and the body's ``wire_bytes`` (as received, possibly
+                              compressed) and ``decoded_bytes``).
+        etag (str): ETag of the stored copy; sent as If-None-Match.
+        last_modified (str): Last-Modified of the stored copy; sent as If-Modified-Since.
+        content_policy: Optional ContentPolicy. Bodies whose Content-Type is denied or
+                        whose size exceeds the per-MIME cap are not downloaded; the call
+                        returns (None, content_type, reason) with ``rejected`` set.
+        fetcher: Optional Fetcher backend (see ``fetchers.py``) that issues the requests.
+                 Defaults to a ``RequestsFetcher`` over ``session``.
 
     Returns:
         tuple: (content, content_type, error_description) where content is the page content or None,
                content_type is the MIME type or None, and error_description is an error message or None.
+               Text bodies are returned as str, binary bodies as raw bytes. A 304 Not Modified answer to a conditional request returns (None, None, None)
+               with ``response_meta["not_modified"]`` set.
     """
     if logger is None:
         logger = logging.getLogger(__name__)
@@ -109,125 +280,112 @@ def fetch_page(
             logger.error(f"Dynamic browser rendering failed for {url}: {e}")
             return None, None, str(e)
 
-    headers = {"User-Agent": CrawlerConfig().user_agent}
+    if fetcher is None:
+        fetcher = RequestsFetcher(session)
+    headers = build_request_headers(
+        etag=etag,
+        last_modified=last_modified,
+        accept_encoding=fetcher.accept_encoding,
+    )
     retry_count = 0
     timeout = initial_timeout
 
-    client = session if session is not None else requests
+    if content_policy is not None and content_policy.should_probe(url):
+        rejection = _probe_with_head(
+            fetcher, url, headers, initial_timeout, proxies, content_policy, logger
+        )
+        if rejection:
+            logger.info(f"Skipping download of {url}: {rejection}")
+            if response_meta is not None:
+                response_meta["rejected"] = True
+            return None, None, rejection
 
     while retry_count < max_retries:
+        retry_after = None
         try:
-            response = client.get(
-                url,
-                headers=headers,
-                timeout=timeout,
-                verify=certifi.where(),
-                proxies=proxies,
-            )
-            response.raise_for_status()
-
-            # Check the Content-Type header
-            content_type = response.headers.get("Content-Type", "").lower()
-
-            if (
-                "text/" in content_type
-                or "xml" in content_type
-                or "json" in content_type
-            ):
-                html_text = response.text
-                if auto_detect_js and "text/html" in content_type:
-                    if detects_javascript_required(html_text, logger=logger):
-                        logger.info(
-                            f"Upgrading to dynamic rendering for {url} due to detected JS requirement."
-                        )
-                        try:
-                            from rendering import render_page
-
-                            rendered_content = render_page(
-                                url,
-                                driver_type=js_driver,
-                                timeout_secs=initial_timeout,
-                                proxies=proxies,
-                            )
-                            return rendered_content, "text/html", None
-                        except Exception as render_err:
-                            logger.warning(
-                                f"Dynamic rendering upgrade failed for {url}, falling back to static text. Error: {render_err}"
-                            )
-                return html_text, content_type, None
-            else:
-                # Return binary content as Base64-encoded string
-                return (
-                    base64.b64encode(response.content).decode("utf-8"),
+            # Stream the body so the content policy can reject it from the headers
+            # and cap it while reading, instead of buffering whatever the server sends.
+            with fetcher.get(
+                url, headers=headers, timeout=timeout, proxies=proxies
+            ) as response:
+                if response_meta is not None:
+                    response_meta["status_code"] = response.status_code
+                if response.status_code == 304:
+                    # Conditional GET: the stored copy is still current, no body was sent.
+                    logger.info(f"Not modified since last crawl: {url}")
+                    if response_meta is not None:
+                        response_meta["not_modified"] = True
+                    return None, None, None
+
+                response.raise_for_status()
+                record_validators(response.headers, response_meta)
+
+                # Check the Content-Type header
+                content_type = response.headers.get("Content-Type", "").lower()
+
+                body, rejection = read_response_body(
+                    response,
                     content_type,
-                    None,
+                    content_policy,
+                    chunks=fetcher.iter_body(response),
                 )
+                if rejection:
+                    logger.info(f"Skipping download of {url}: {rejection}")
+                    if response_meta is not None:
+                        response_meta["rejected"] = True
+                    return None, content_type, rejection
+
+                # Body bytes as received (possibly compressed) vs. after decoding
+                if response_meta is not None:
+                    response_meta["wire_bytes"] = fetcher.wire_bytes(response)
+                    response_meta["decoded_bytes"] = len(body)
+
+                if is_text_content_type(content_type):
+                    html_text = decode_response_text(body, response.encoding)
+                    body = None
+                    if auto_detect_js and "text/html" in content_type:
+                        rendered_content = render_if_javascript_required(
+                            url,
+                            html_text,
+                            js_driver=js_driver,
+                            timeout_secs=initial_timeout,
+                            proxies=proxies,
+                            logger=logger,
+                        )
+                        if rendered_content is not None:
+                            return rendered_content, "text/html", None
+                    return html_text, content_type, None
+                else:
+                    # Return binary content as raw bytes (stored as a BLOB)
+                    return body, content_type, None
 
         except requests.exceptions.HTTPError as e:
             status_code = e.response.status_code if e.response is not None else None
-            if status_code == 504:  # Handle 504 Gateway Timeout
-                retry_count += 1
-                if retry_count < max_retries:
-                    logger.warning(
-                        f"504 Gateway Timeout for {url}. Retrying in {timeout} seconds... (Attempt {retry_count}/{max_retries})"
-                    )
-                    time.sleep(timeout)  # Wait before retrying
-                    timeout *= 2  # Exponential backoff
-                else:
-                    error_description = (
-                        f"504 Gateway Timeout after {max_retries} retries: {e}"
-                    )
-                    logger.error(f"Failed to fetch {url}: {error_description}")
-                    return None, None, error_description
-            else:
+            if status_code not in RETRIABLE_STATUS_CODES:
                 error_description = f"HTTP Error {status_code}: {e}"
                 logger.error(f"Failed to fetch {url}: {error_description}")
                 return None, None, error_description
+            # Handle 504 Gateway Timeout, and 429 / 503 with an optional Retry-After
+            retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
+            if response_meta is not None and retry_after is not None:
+                response_meta["retry_after"] = retry_after
+            label = RETRIABLE_STATUS_CODES[status_code]
+            retry_label, error_label, error = label, label, e
 
         except requests.exceptions.Timeout as e:
-            retry_count += 1
-            if retry_count < max_retries:
-                logger.warning(
-                    f"Timeout occurred for {url}. Retrying in {timeout} seconds... (Attempt {retry_count}/{max_retries})"
-                )
-                time.sleep(timeout)  # Wait before retrying
-                timeout *= 2  # Exponential backoff
-            else:
-                error_description = f"Timeout after {max_retries} retries: {e}"
-                logger.error(f"Failed to fetch {url}: {error_description}")
-                return None, None, error_description
+            retry_label, error_label, error = "Timeout occurred", "Timeout", e
 
         except requests.exceptions.SSLError as e:
             # Transient SSL failures (e.g. UNEXPECTED_EOF_WHILE_READING) — the
             # server dropped the connection during the TLS handshake or transfer.
             # These are retriable; hard certificate errors also surface here but
             # are unlikely to succeed on retry, so we still cap at max_retries.
-            retry_count += 1
-            if retry_count < max_retries:
-                logger.warning(
-                    f"SSL error for {url}. Retrying in {timeout} seconds... (Attempt {retry_count}/{max_retries})"
-                )
-                time.sleep(timeout)
-                timeout *= 2
-            else:
-                error_description = f"SSL error after {max_retries} retries: {e}"
-                logger.error(f"Failed to fetch {url}: {error_description}")
-                return None, None, error_description
+            retry_label, error_label, error = "SSL error", "SSL error", e
 
         except requests.exceptions.ConnectionError as e:
             # Server reset the connection, refused it, or the network dropped.
             # Typically transient — worth a few retries with backoff.
-            retry_count += 1
-            if retry_count < max_retries:
-                logger.warning(
-                    f"Connection error for {url}. Retrying in {timeout} seconds... (Attempt {retry_count}/{max_retries})"
-                )
-                time.sleep(timeout)
-                timeout *= 2
-            else:
-                error_description = f"Connection error after {max_retries} retries: {e}"
-                logger.error(f"Failed to fetch {url}: {error_description}")
-                return None, None, error_description
+            retry_label, error_label, error = "Connection error", "Connection error", e
 
         except requests.exceptions.RequestException as e:
             # Non-retriable errors (e.g. invalid URL, DNS resolution failure).
@@ -235,41 +393,145 @@ def fetch_page(
             logger.error(f"Failed to fetch {url}: {error_description}")
             return None, None, error_description
 
+        # Retriable failure from here on.
+        if defer_retries:
+            # Hand the retry back to the caller's scheduler instead of blocking
+            # this thread in time.sleep() for the whole backoff period.
+            error_description = f"{error_label}: {error}"
+            if response_meta is not None:
+                response_meta["retriable"] = True
+            logger.warning(
+                f"{retry_label} for {url}. Deferring retry to the scheduler."
+            )
+            return None, None, error_description
+
+        retry_count += 1
+        if retry_count < max_retries:
+            logger.warning(
+                f"{retry_label} for {url}. Retrying in {timeout} seconds... (Attempt {retry_count}/{max_retries})"
+            )
+            # Wait before retrying, at least as long as the server asked to
+            time.sleep(max(timeout, retry_after or 0))
+            timeout *= 2  # Exponential backoff
+        else:
+            error_description = f"{error_label} after {max_retries} retries: {error}"
+            logger.error(f"Failed to fetch {url}: {error_description}")
+            return None, None, error_description
+
     return None, None, "Max retries reached without success"
 
 
-def extract_links(base_url, html_content, robots_parser, soup=None, logger=None):
+class LinkSet(set):
+    """The links found on a page, with how each one was found.
+
+    A plain ``set`` of URLs to existing callers. ``hints`` maps each link to
+    ``(source, lastmod)``: source is 'sitemap', 'feed', 'anchor', 'link' or
+    'script', and lastmod the sitemap / feed date of the entry (or None).
+    The frontier uses them to prioritize the links. ``feeds`` holds the
+    links that are themselves feeds or sitemaps: RSS / Atom feeds advertised
+    with ``<link rel="alternate">`` and the sitemaps of a sitemap index.
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.hints = {}
+        self.feeds = set()
+
+    def add_link(self, link, source, lastmod=None):
+        self.add(link)
+        if link not in self.hints:
+            self.hints[link] = (source, lastmod)
+
+
+# <link rel="alternate"> types that announce a feed.
+_FEED_TYPES = ("application/rss+xml", "application/atom+xml")
+
+# Sitemap / feed elements holding one entry, and the children dating it.
+_XML_ENTRY_TAGS = ("url", "sitemap", "item", "entry")
+_XML_DATE_TAGS = ("lastmod", "publication_date", "pubDate", "updated", "published")
+
+
+def parse_feed_date(value):
+    """Parse a sitemap (W3C/ISO 8601) or RSS (RFC 822) date; None if unparseable."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def _xml_entry_dates(root):
+    """Map each sitemap / feed entry's link to its date (when it has one)."""
+    dates = {}
+    for entry in root.iter():
+        if entry.tag.split("}")[-1] not in _XML_ENTRY_TAGS:
+            continue
+        raw_link = date = None
+        for child in entry.iter():
+            tag_local = child.tag.split("}")[-1]
+            if tag_local == "loc" and raw_link is None:
+                raw_link = child.text
+            elif tag_local == "link" and raw_link is None:
+                raw_link = child.attrib.get("href") or child.text
+            elif tag_local in _XML_DATE_TAGS and date is None:
+                date = parse_feed_date(child.text)
+        if raw_link and date is not None:
+            dates[raw_link.strip()] = date
+    return dates
+
+
+def is_xml_feed(content) -> bool:
+    """Return True if ``content`` looks like a sitemap or an RSS / Atom feed."""
+    return isinstance(content, str) and content.lstrip().startswith(
+        ("<?xml", "<urlset", "<sitemapindex", "<rss", "<feed")
+    )
+
+
+def extract_links(
+    base_url, html_content, robots_parser, soup=None, canonicalize=None, logger=None
+):
     """Extract all links from the HTML content, sitemaps, or RSS feeds that belong to the same domain and are allowed by robots.txt.
 
+    Returns a ``LinkSet``: a set of URLs whose ``hints`` tell how each was
+    found (and its sitemap / feed date), for prioritizing the frontier.
+
     Args:
         soup: Optional pre-parsed BeautifulSoup object.  When provided,
               ``html_content`` is not parsed again, eliminating a redundant
               pass through the HTML parser.
+        canonicalize: Optional ``canonicalize(url) -> str`` applied to every
+                      link (see ``canonical.UrlCanonicalizer``).
     """
     if logger is None:
         logger = logging.getLogger(__name__)
 
+    def resolve(href):
+        link = urldefrag(urljoin(base_url, href))[0]
+        return canonicalize(link) if canonicalize is not None else link
+
     base_netloc = urlparse(
-        base_url
+        resolve(base_url)
     ).netloc  # hoisted outside the loop — urlparse is not free
-    links = set()
+    links = LinkSet()
 
     if not html_content:
         return links
 
     # 1. Detect and parse XML (Sitemaps, RSS, and Atom feeds)
-    trimmed_content = html_content.strip()
-    if (
-        trimmed_content.startswith("<?xml")
-        or trimmed_content.startswith("<urlset")
-        or trimmed_content.startswith("<sitemapindex")
-        or trimmed_content.startswith("<rss")
-        or trimmed_content.startswith("<feed")
-    ):
+    if is_xml_feed(html_content):
         try:
             import xml.etree.ElementTree as ET
 
             root = ET.fromstring(html_content.encode("utf-8", errors="ignore"))
+            root_tag = root.tag.split("}")[-1]
+            source = "sitemap" if root_tag in ("urlset", "sitemapindex") else "feed"
+            entry_dates = _xml_entry_dates(root)
             for elem in root.iter():
                 tag_local = elem.tag.split("}")[-1]
                 raw_link = None
@@ -282,12 +544,12 @@ def extract_links(base_url, html_content, robots_parser, soup=None, logger=None)
                 if raw_link:
                     raw_link = raw_link.strip()
                     try:
-                        link = urldefrag(urljoin(base_url, raw_link))[0]
+                        link = resolve(raw_link)
                         if urlparse(link).netloc == base_netloc:
-                            if not robots_parser or robots_parser.can_fetch(
-                                CrawlerConfig().user_agent, link
-                            ):
-                                links.add(link)
+                            if not robots_parser or robots_parser.is_allowed(link):
+                                links.add_link(link, source, entry_dates.get(raw_link))
+                                if root_tag == "sitemapindex" and tag_local == "loc":
+                                    links.feeds.add(link)
                             else:
                                 logger.info(f"Skipping disallowed link: {link}")
                     except ValueError as e:
@@ -307,12 +569,10 @@ def extract_links(base_url, html_content, robots_parser, soup=None, logger=None)
     # Extract standard anchor tags
     for a_tag in soup.find_all("a", href=True):
         try:
-            link = urldefrag(urljoin(base_url, a_tag["href"]))[0]
+            link = resolve(a_tag["href"])
             if urlparse(link).netloc == base_netloc:
-                if not robots_parser or robots_parser.can_fetch(
-                    CrawlerConfig().user_agent, link
-                ):
-                    links.add(link)
+                if not robots_parser or robots_parser.is_allowed(link):
+                    links.add_link(link, "anchor")
                 else:
                     logger.info(f"Skipping disallowed link: {link}")
         except ValueError as e:
@@ -330,12 +590,15 @@ def extract_links(base_url, html_content, robots_parser, soup=None, logger=None)
         ):
             continue
         try:
-            link = urldefrag(urljoin(base_url, link_tag["href"]))[0]
+            link = resolve(link_tag["href"])
             if urlparse(link).netloc == base_netloc:
-                if not robots_parser or robots_parser.can_fetch(
-                    CrawlerConfig().user_agent, link
-                ):
-                    links.add(link)
+                if not robots_parser or robots_parser.is_allowed(link):
+                    links.add_link(link, "link")
+                    if (
+                        "alternate" in (r.lower() for r in rel)
+                        and (link_tag.get("type") or "").lower() in _FEED_TYPES
+                    ):
+                        links.feeds.add(link)
                 else:
                     logger.info(f"Skipping disallowed link: {link}")
         except ValueError as e:
@@ -344,12 +607,10 @@ def extract_links(base_url, html_content, robots_parser, soup=None, logger=None)
     # Extract scripts (<script src="...">)
     for script_tag in soup.find_all("script", src=True):
         try:
-            link = urldefrag(urljoin(base_url, script_tag["src"]))[0]
+            link = resolve(script_tag["src"])
             if urlparse(link).netloc == base_netloc:
-                if not robots_parser or robots_parser.can_fetch(
-                    CrawlerConfig().user_agent, link
-                ):
-                    links.add(link)
+                if not robots_parser or robots_parser.is_allowed(link):
+                    links.add_link(link, "script")
                 else:
                     logger.info(f"Skipping disallowed link: {link}")
         except ValueError as e:
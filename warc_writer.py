@@ -0,0 +1,297 @@
+"""Streaming WARC/1.1 archive of the fetched pages (``--warc-dir``).
+
+Each fetched URL is written as a ``request`` / ``response`` record pair. Every
+record is its own gzip member, so a record can be read on its own by seeking
+to its offset, and files are rotated once they reach a size limit. The
+location of each response is indexed in the crawler database
+(``warc_records``: link + date -> file + offset), which gives random access
+to every capture of a page, not only the latest copy kept in ``crawled_data``.
+"""
+
+import base64
+import contextlib
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import uuid
+import zlib
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from database import record_warc_location
+from fetchers import Fetcher, RecordingResponse
+from utils import ensure_directory_exists
+
+WARC_VERSION = "WARC/1.1"
+DEFAULT_MAX_FILE_SIZE = 1024**3  # 1 GiB, the size the WARC spec recommends
+
+# Hop-by-hop framing of the original transfer. The archived body is the
+# decoded payload, so these headers no longer describe it.
+_TRANSFER_HEADERS = ("content-encoding", "transfer-encoding", "content-length")
+
+_HTTP_VERSIONS = {10: "HTTP/1.0", 11: "HTTP/1.1", 20: "HTTP/2"}
+
+
+def _warc_date():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _sha1_digest(data):
+    return "sha1:" + base64.b32encode(hashlib.sha1(data).digest()).decode("ascii")
+
+
+def _http_version(response):
+    """Return the HTTP version of a requests or httpx response ("HTTP/1.1" if unknown)."""
+    version = getattr(response, "http_version", None)
+    if isinstance(version, str) and version:
+        return version
+    raw_version = getattr(getattr(response, "raw", None), "version", None)
+    return _HTTP_VERSIONS.get(raw_version, "HTTP/1.1")
+
+
+def _format_header_lines(start_line, headers):
+    lines = [start_line]
+    lines.extend(f"{name}: {value}" for name, value in headers)
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8", errors="replace")
+
+
+def build_http_request(url, headers):
+    """Return the request block (request line + headers) for ``url``."""
+    parts = urlsplit(url)
+    target = parts.path or "/"
+    if parts.query:
+        target += f"?{parts.query}"
+    request_headers = [("Host", parts.netloc)]
+    request_headers.extend((headers or {}).items())
+    return _format_header_lines(f"GET {target} HTTP/1.1", request_headers)
+
+
+def build_http_response(http_version, status_code, reason, headers, body):
+    """Return the response block (status line, headers, body) for a decoded body."""
+    response_headers = [
+        (name, value)
+        for name, value in headers.items()
+        if name.lower() not in _TRANSFER_HEADERS
+    ]
+    response_headers.append(("Content-Length", str(len(body))))
+    status_line = f"{http_version} {status_code} {reason or ''}".rstrip()
+    return _format_header_lines(status_line, response_headers) + body
+
+
+def read_warc_record(path, offset):
+    """Read the record starting at ``offset`` of a ``.warc.gz`` file.
+
+    Returns:
+        tuple: ``(headers, block)``: the WARC headers as a dict and the record
+        block (for a response record, the HTTP status line, headers and body).
+    """
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    data = b""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while not decompressor.eof:
+            chunk = f.read(65536)
+            if not chunk:
+                break
+            data += decompressor.decompress(chunk)
+    head, _, rest = data.partition(b"\r\n\r\n")
+    lines = head.decode("utf-8", errors="replace").split("\r\n")
+    headers = dict(line.split(": ", 1) for line in lines[1:] if ": " in line)
+    length = int(headers.get("Content-Length", len(rest)))
+    return headers, rest[:length]
+
+
+class WarcWriter:
+    """Appends gzip-compressed WARC/1.1 records to size-rotated files.
+
+    Files are named ``<prefix>-<timestamp>-<serial>.warc.gz`` and each starts
+    with a ``warcinfo`` record. A new file is started once the current one has
+    reached ``max_file_size`` bytes. Safe to use from several threads.
+
+    Args:
+        directory (str): Directory of the WARC files (created if absent).
+        prefix (str): Filename prefix, e.g. the crawled domain.
+        max_file_size (int): Rotation threshold in bytes.
+        logger: Optional logger instance.
+    """
+
+    def __init__(
+        self, directory, prefix, max_file_size=DEFAULT_MAX_FILE_SIZE, logger=None
+    ):
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        ensure_directory_exists(directory, logger=self.logger)
+        self.directory = directory
+        # ':' (host:port) is not allowed in Windows filenames.
+        self.prefix = prefix.replace(":", "_")
+        self.max_file_size = max(1, int(max_file_size))
+        self.path = None
+        self._file = None
+        self._serial = 0
+        self._lock = threading.Lock()
+
+    def _open_next_file(self):
+        if self._file is not None:
+            self._file.close()
+        self._serial += 1
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+        filename = f"{self.prefix}-{timestamp}-{self._serial:05d}.warc.gz"
+        self.path = os.path.join(self.directory, filename)
+        self._file = open(self.path, "ab")
+        self.logger.info(f"Writing WARC records to {self.path}")
+        info = (
+            "software: crawler\r\n"
+            "format: WARC File Format 1.1\r\n"
+            "conformsTo: https://iipc.github.io/warc-specifications/specifications/warc-format/warc-1.1/\r\n"
+        ).encode("utf-8")
+        self._append(
+            {"WARC-Type": "warcinfo", "WARC-Filename": filename},
+            "application/warc-fields",
+            info,
+        )
+
+    def _append(self, headers, content_type, block):
+        """Write one record as its own gzip member and return ``(offset, length)``."""
+        warc_headers = {
+            "WARC-Record-ID": f"<urn:uuid:{uuid.uuid4()}>",
+            "WARC-Date": _warc_date(),
+            **headers,
+            "Content-Type": content_type,
+            "Content-Length": str(len(block)),
+        }
+        record = _format_header_lines(WARC_VERSION, warc_headers.items())
+        record += block + b"\r\n\r\n"
+        data = gzip.compress(record)
+        offset = self._file.tell()
+        self._file.write(data)
+        return offset, len(data)
+
+    def write_exchange(self, url, request_block, response_block, payload):
+        """Write a request/response record pair for ``url``.
+
+        Returns:
+            tuple: ``(path, offset, length, date)`` of the response record.
+        """
+        with self._lock:
+            if self._file is None or self._file.tell() >= self.max_file_size:
+                self._open_next_file()
+            response_id = f"<urn:uuid:{uuid.uuid4()}>"
+            date = _warc_date()
+            offset, length = self._append(
+                {
+                    "WARC-Type": "response",
+                    "WARC-Record-ID": response_id,
+                    "WARC-Date": date,
+                    "WARC-Target-URI": url,
+                    "WARC-Block-Digest": _sha1_digest(response_block),
+                    "WARC-Payload-Digest": _sha1_digest(payload),
+                },
+                "application/http;msgtype=response",
+                response_block,
+            )
+            self._append(
+                {
+                    "WARC-Type": "request",
+                    "WARC-Date": date,
+                    "WARC-Target-URI": url,
+                    "WARC-Concurrent-To": response_id,
+                    "WARC-Block-Digest": _sha1_digest(request_block),
+                },
+                "application/http;msgtype=request",
+                request_block,
+            )
+            self._file.flush()
+            return self.path, offset, length, date
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class WarcFetcher(Fetcher):
+    """Fetcher wrapper that archives every response it reads into a ``WarcWriter``.
+
+    A response is archived once its body has been read in full, or when it
+    was never read (an HTTP error, a redirect or a body rejected from its
+    headers). ``304 Not Modified`` answers carry no new content and are not
+    archived, nor are bodies abandoned part-way (e.g. over the size cap).
+    The location of each response is indexed in the crawler database.
+
+    Args:
+        fetcher (Fetcher): The wrapped backend.
+        writer (WarcWriter): Where records are written.
+        database_name (str): Crawler database holding the ``warc_records`` index.
+        logger: Optional logger instance.
+    """
+
+    def __init__(self, fetcher, writer, database_name, logger=None):
+        self.fetcher = fetcher
+        self.writer = writer
+        self.database_name = database_name
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.name = fetcher.name
+        self.accept_encoding = fetcher.accept_encoding
+
+    def _archive(self, url, request_headers, recording):
+        if recording.status_code == 304:
+            return
+        if recording.started and not recording.complete:
+            return
+        payload = b"".join(recording.chunks)
+        try:
+            path, offset, length, date = self.writer.write_exchange(
+                url,
+                build_http_request(url, request_headers),
+                build_http_response(
+                    _http_version(recording.response),
+                    recording.status_code,
+                    getattr(recording.response, "reason", None),
+                    recording.headers,
+                    payload,
+                ),
+                payload,
+            )
+        except OSError as e:
+            self.logger.error(f"Failed to write WARC records for {url}: {e}")
+            return
+        record_warc_location(
+            self.database_name,
+            url,
+            date,
+            os.path.basename(path),
+            offset,
+            length,
+            status_code=recording.status_code,
+            logger=self.logger,
+        )
+
+    @contextlib.contextmanager
+    def get(self, url, headers=None, timeout=None, proxies=None):
+        with self.fetcher.get(
+            url, headers=headers, timeout=timeout, proxies=proxies
+        ) as response:
+            recording = RecordingResponse(response)
+            try:
+                yield recording
+            finally:
+                self._archive(url, headers, recording)
+
+    def head(self, url, headers=None, timeout=None, proxies=None):
+        return self.fetcher.head(url, headers=headers, timeout=timeout, proxies=proxies)
+
+    def iter_body(self, response, chunk_size=65536):
+        response.started = True
+        for chunk in self.fetcher.iter_body(response.response, chunk_size=chunk_size):
+            response.chunks.append(chunk)
+            yield chunk
+        response.complete = True
+
+    def wire_bytes(self, response):
+        return self.fetcher.wire_bytes(response.response)
+
+    def close(self):
+        self.fetcher.close()
+        self.writer.close()